@@ -16,16 +16,7 @@ from constants import ADMIN_MESSAGE, MAIN_MENU, SELECT_MONTH_RANGE
 from models import User, AdminMessage
 from bot_keyboards import create_admin_keyboard
 from sqlalchemy import text
-
-try:
-    from openpyxl.styles import Font
-except RuntimeError:  # Для окружений без GUI
-    class Font:
-        def __init__(self, bold=False):
-            self.bold = bold
 import os
-from openpyxl import Workbook
-from openpyxl.styles import Font
 
 logging.basicConfig(
     level=logging.INFO,
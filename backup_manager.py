@@ -3,32 +3,97 @@
 с загрузкой на Яндекс.Диск и ротацией бекапов по дням недели.
 """
 import os
+import io
+import gzip
+import json
+import lzma
+import shutil
 import subprocess
 import logging
+import time
 from pathlib import Path
 from datetime import datetime, timedelta, date
+from decimal import Decimal
 import tempfile
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 import yadisk
 from database import db
+from yadisk_uploader import YandexDiskUploader
 from models import Order, User, Holiday, Menu, AdminMessage, FeedbackMessage, BotSetting
 from sqlalchemy import and_
 
 logger = logging.getLogger(__name__)
 
+# Кодеки сжатия дампа: расширение файла, сигнатура (magic bytes) и уровень по умолчанию.
+# Кодек определяется по сигнатуре, поэтому переименованный файл тоже восстановится.
+BACKUP_CODECS = {
+    'gzip': {'ext': '.sql.gz', 'magic': b'\x1f\x8b', 'default_level': 3},
+    'zstd': {'ext': '.sql.zst', 'magic': b'\x28\xb5\x2f\xfd', 'default_level': 3},
+    'lzma': {'ext': '.sql.xz', 'magic': b'\xfd7zXZ\x00', 'default_level': 1},
+}
+BACKUP_SUFFIXES = tuple(codec['ext'] for codec in BACKUP_CODECS.values())
+
+
+def _import_zstd():
+    """zstandard — необязательная зависимость"""
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        return None
+
+
+def is_backup_file(name: str) -> bool:
+    return name.endswith(BACKUP_SUFFIXES)
+
+
+def backup_stem(name: str) -> str:
+    """Имя бекапа без расширения кодека"""
+    for suffix in BACKUP_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def detect_codec(path: Path) -> str:
+    """Кодек файла по сигнатуре, для неизвестной — по расширению"""
+    with open(path, 'rb') as f:
+        head = f.read(8)
+    for codec, spec in BACKUP_CODECS.items():
+        if head.startswith(spec['magic']):
+            return codec
+    for codec, spec in BACKUP_CODECS.items():
+        if path.name.endswith(spec['ext']):
+            return codec
+    raise ValueError(f"Неизвестный формат бекапа: {path.name}")
+
+
 class BackupManager:
     """Управление резервным копированием базы данных"""
 
     # Дни недели для ротации
     WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
 
+    # Размер блока при стриминге дампа
+    COPY_CHUNK_SIZE = 1024 * 1024
+
     def __init__(self):
         """Инициализация менеджера бекапов"""
         self.yandex_token = os.getenv('YANDEX_DISK_TOKEN')
         self.yandex_folder = os.getenv('YANDEX_DISK_FOLDER', '/lunch_bot_backups')
         self.db_url = os.getenv('DATABASE_URL')
         self.backup_months = int(os.getenv('BACKUP_MONTHS', '3'))
+        # Сколько таблиц выгружать одновременно (каждая — отдельное соединение из пула)
+        self.parallel_jobs = max(1, int(os.getenv('BACKUP_PARALLEL_JOBS', '4')))
+        # full — каждую ночь полный дамп; incremental — полная база раз в N дней + дневные дельты
+        self.backup_mode = os.getenv('BACKUP_MODE', 'incremental')
+        self.full_interval_days = int(os.getenv('BACKUP_FULL_INTERVAL_DAYS', '7'))
+        # Кодек и уровень сжатия дампа
+        self.codec, self.compress_level = self._resolve_codec(
+            os.getenv('BACKUP_CODEC', 'zstd'), os.getenv('BACKUP_COMPRESS_LEVEL')
+        )
         self.local_backup_dir = Path('data/backups')
         self.local_backup_dir.mkdir(parents=True, exist_ok=True)
 
@@ -80,19 +145,138 @@ class BackupManager:
             logger.error(f"❌ Ошибка парсинга DATABASE_URL: {e}")
             raise
 
+    @staticmethod
+    def _resolve_codec(codec: str, level: Optional[str]) -> tuple:
+        codec = codec.lower()
+        if codec not in BACKUP_CODECS:
+            logger.warning(f"⚠️ Неизвестный BACKUP_CODEC={codec}, используется gzip")
+            codec = 'gzip'
+        if codec == 'zstd' and _import_zstd() is None:
+            logger.warning("⚠️ Пакет zstandard не установлен, используется gzip")
+            codec = 'gzip'
+            level = None
+        return codec, int(level) if level else BACKUP_CODECS[codec]['default_level']
+
+    def _local_backup_files(self) -> list:
+        """Локальные полные бекапы любого кодека, новые первыми"""
+        return sorted(
+            (p for p in self.local_backup_dir.iterdir() if is_backup_file(p.name)),
+            key=lambda x: x.stat().st_mtime,
+            reverse=True
+        )
+
     def _get_weekday_name(self, date: datetime = None) -> str:
         """Возвращает название дня недели на английском"""
         if date is None:
             date = datetime.now()
         return self.WEEKDAYS[date.weekday()]
 
-    def _create_temp_dump(self) -> Optional[Path]:
-        """Создает временный дамп базы данных с фильтрацией по датам"""
+    # Таблицы в порядке загрузки (FK: users раньше orders и сообщений).
+    # Значение — условие выборки; None означает всю таблицу.
+    DUMP_TABLES = [
+        ('users', None),
+        ('menu', None),
+        ('holidays', None),
+        ('bot_settings', None),
+        ('bitrix_mapping', None),
+        ('production_calendar', None),
+        ('orders', 'target_date >= %(cutoff_date)s'),
+        ('admin_messages', None),
+        ('feedback_messages', None),
+        ('sync_runs', 'started_at >= %(cutoff_date)s'),
+    ]
+
+    # Инкрементальный режим: колонка-водяной знак и первичный ключ каждой таблицы.
+    # Строка попадает в дельту, если водяной знак не старше предыдущего бекапа;
+    # None — таблица маленькая и без updated_at, в каждую дельту идёт целиком.
+    INCREMENTAL_TABLES = {
+        'users': ('updated_at', ('id',)),
+        'menu': ('updated_at', ('id',)),
+        'holidays': (None, ('id',)),
+        'bot_settings': ('updated_at', ('id',)),
+        'bitrix_mapping': ('last_sync', ('local_id', 'local_type')),
+        'orders': ('updated_at', ('id',)),
+        'admin_messages': ('created_at', ('id',)),
+        'feedback_messages': ('sent_at', ('id',)),
+    }
+
+    # Перекрытие окон дельт: транзакция, начатая до водяного знака и закоммиченная
+    # после снимка, попадёт в следующую дельту (upsert идемпотентен)
+    WATERMARK_OVERLAP = timedelta(minutes=10)
+
+    # Части дампа меньше этого размера держим в памяти, крупнее — во временном файле
+    SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+    def _dump_schema(self, env: dict, out) -> None:
+        """Стримит pg_dump --schema-only в файловый объект out"""
+        schema_dump_cmd = [
+            'pg_dump',
+            '-h', self.db_host,
+            '-p', self.db_port,
+            '-U', self.db_user,
+            '-d', self.db_name,
+            '--schema-only',  # Только структура
+        ]
+        proc = subprocess.Popen(schema_dump_cmd, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            shutil.copyfileobj(proc.stdout, out, self.COPY_CHUNK_SIZE)
+            stderr = proc.stderr.read()
+            returncode = proc.wait(timeout=300)
+        except Exception:
+            proc.kill()
+            raise
+        if returncode != 0:
+            raise RuntimeError(f"pg_dump (схема): {stderr.decode('utf-8', 'replace')}")
+
+    def _dump_table(self, table: str, where: Optional[str], params: dict, snapshot_id: str, out) -> int:
+        """Выгружает таблицу через COPY TO STDOUT в рамках общего снимка БД.
+
+        Пишет в out готовый блок ``COPY ... FROM stdin; ... \\.``, который psql
+        восстанавливает без построчных INSERT. Возвращает размер данных в байтах.
+        """
+        conn = db.engine.raw_connection()
+        try:
+            conn.rollback()  # SET TRANSACTION должен быть первым запросом транзакции
+            cursor = conn.cursor()
+            # Все воркеры читают один и тот же снимок — дамп консистентен, как у pg_dump -j
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+            cursor.execute("SET TRANSACTION SNAPSHOT %s", (snapshot_id,))
+
+            select_sql = f"SELECT * FROM public.{table}"
+            if where:
+                select_sql += f" WHERE {where}"
+            copy_sql = cursor.mogrify(f"COPY ({select_sql}) TO STDOUT", params).decode('utf-8')
+
+            out.write(f"\n-- Таблица: {table}\n".encode('utf-8'))
+            out.write(f"COPY public.{table} FROM stdin;\n".encode('utf-8'))
+            start = out.tell()
+            cursor.copy_expert(copy_sql, out, size=self.COPY_CHUNK_SIZE)
+            size = out.tell() - start
+            out.write(b"\\.\n")
+            conn.rollback()
+            return size
+        finally:
+            conn.close()
+
+    def _create_temp_dump(self, snapshot_state: Optional[dict] = None) -> Optional[Path]:
+        """Создает сжатый дамп базы данных с фильтрацией по датам.
+
+        Схема стримится из pg_dump, данные таблиц выгружаются параллельно через
+        COPY TO STDOUT из одного экспортированного снимка. Каждая часть
+        буферизуется несжатой (в памяти до SPOOL_MAX_BYTES, крупнее — во
+        временном файле), затем части по очереди стримятся в компрессор:
+        на диске может оказаться несжатая копия крупных таблиц.
+
+        Если передан snapshot_state, в него записываются водяной знак и ключи
+        строк того же снимка — от них считается первая дельта.
+        """
+        temp_path = None
+        snapshot_conn = None
+        parts = {}
         try:
-            # Создаем временный файл для дампа
             temp_file = tempfile.NamedTemporaryFile(
                 mode='w+b',
-                suffix='.sql',
+                suffix='.dump.tmp',
                 delete=False,
                 dir=self.local_backup_dir
             )
@@ -104,144 +288,54 @@ class BackupManager:
             # Дата для фильтрации (последние N месяцев)
             cutoff_date = (datetime.now() - timedelta(days=self.backup_months * 30)).date()
             logger.info(f"📅 Бекап данных с {cutoff_date.strftime('%Y-%m-%d')}")
+            params = {'cutoff_date': cutoff_date}
 
             # Формируем переменные окружения для pg_dump
             env = os.environ.copy()
             env['PGPASSWORD'] = self.db_password
 
-            # 1. Создаем дамп структуры (схемы)
-            schema_dump_cmd = [
-                'pg_dump',
-                '-h', self.db_host,
-                '-p', self.db_port,
-                '-U', self.db_user,
-                '-d', self.db_name,
-                '--schema-only',  # Только структура
-                '-f', str(temp_path)
-            ]
-
-            logger.info(f"🔧 Экспорт структуры БД...")
-            result = subprocess.run(
-                schema_dump_cmd,
-                env=env,
-                capture_output=True,
-                text=True,
-                timeout=300
-            )
-
-            if result.returncode != 0:
-                logger.error(f"❌ Ошибка pg_dump (схема): {result.stderr}")
-                temp_path.unlink()
-                return None
-
-            # 2. Экспортируем данные с фильтрацией
-            with temp_path.open('a', encoding='utf-8') as f:
-                f.write("\n-- ========================================\n")
-                f.write("-- Данные таблиц (последние 3 месяца)\n")
-                f.write("-- ========================================\n\n")
-
-            # Экспортируем все данные из справочных таблиц (без фильтрации по дате)
-            reference_tables = ['users', 'menu', 'holidays', 'bot_settings', 'bitrix_mapping']
-
-            for table in reference_tables:
-                data_dump_cmd = [
-                    'pg_dump',
-                    '-h', self.db_host,
-                    '-p', self.db_port,
-                    '-U', self.db_user,
-                    '-d', self.db_name,
-                    '--data-only',  # Только данные
-                    '-t', table,
-                    '--column-inserts'  # Для читаемости
-                ]
-
-                logger.info(f"📋 Экспорт данных таблицы {table}...")
-                result = subprocess.run(
-                    data_dump_cmd,
-                    env=env,
-                    capture_output=True,
-                    text=True,
-                    timeout=300
-                )
-
-                if result.returncode == 0:
-                    with temp_path.open('a', encoding='utf-8') as f:
-                        f.write(f"\n-- Таблица: {table}\n")
-                        f.write(result.stdout)
-                else:
-                    logger.warning(f"⚠️ Ошибка экспорта {table}: {result.stderr}")
-
-            # 3. Экспортируем orders с фильтрацией через SQLAlchemy
-            logger.info(f"📋 Экспорт заказов за последние {self.backup_months} месяцев...")
-
-            from sqlalchemy import text
-
-            with temp_path.open('a', encoding='utf-8') as f:
-                f.write(f"\n-- Таблица: orders (за последние {self.backup_months} месяцев)\n")
-                f.write(f"-- Данные с {cutoff_date.strftime('%Y-%m-%d')}\n\n")
-                
-                # Выгружаем через базу данных
-                query = text("""
-                    SELECT * FROM orders 
-                    WHERE target_date >= :cutoff_date 
-                    ORDER BY created_at
-                """)
-                
-                db_result = db.session.execute(query, {"cutoff_date": cutoff_date})
-                orders = db_result.fetchall()
-                columns = list(db_result.keys())
-                
-                logger.info(f"📦 Найдено {len(orders)} заказов для экспорта")
-                
-                for order in orders:
-                    # Правильное форматирование значений
-                    formatted_values = []
-                    for v in order:
-                        if v is None:
-                            formatted_values.append('NULL')
-                        elif isinstance(v, bool):
-                            formatted_values.append(str(v).upper())  # TRUE/FALSE
-                        elif isinstance(v, (int, float)):
-                            formatted_values.append(str(v))
-                        elif isinstance(v, (datetime, date)):
-                            formatted_values.append(f"'{v}'")
-                        else:
-                            # Экранируем одинарные кавычки (вынесли за f-string)
-                            escaped_value = str(v).replace("'", "''")
-                            formatted_values.append(f"'{escaped_value}'")
-                    
-                    insert_sql = f"INSERT INTO public.orders ({', '.join(columns)}) VALUES ({', '.join(formatted_values)});\n"
-                    f.write(insert_sql)
-
-            # 4. Экспортируем сообщения за последние 3 месяца
-            message_tables = ['admin_messages', 'feedback_messages']
-            cutoff_timestamp = datetime.now() - timedelta(days=self.backup_months * 30)
-
-            for table in message_tables:
-                data_dump_cmd = [
-                    'pg_dump',
-                    '-h', self.db_host,
-                    '-p', self.db_port,
-                    '-U', self.db_user,
-                    '-d', self.db_name,
-                    '--data-only',
-                    '-t', table,
-                    '--column-inserts'
-                ]
-
-                logger.info(f"📋 Экспорт данных таблицы {table}...")
-                msg_result = subprocess.run(  # Переименовал в msg_result
-                    data_dump_cmd,
-                    env=env,
-                    capture_output=True,
-                    text=True,
-                    timeout=300
-                )
-
-                if msg_result.returncode == 0:
-                    with temp_path.open('a', encoding='utf-8') as f:
-                        f.write(f"\n-- Таблица: {table} (последние {self.backup_months} месяцев)\n")
-                        f.write(msg_result.stdout)
+            # 1. Экспортируем снимок: соединение держит транзакцию, пока воркеры не закончат
+            snapshot_conn = db.engine.raw_connection()
+            snapshot_conn.rollback()
+            snapshot_cursor = snapshot_conn.cursor()
+            snapshot_cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+            snapshot_cursor.execute("SELECT pg_export_snapshot()")
+            snapshot_id = snapshot_cursor.fetchone()[0]
+            if snapshot_state is not None:
+                snapshot_state.update(self._read_watermark_state(snapshot_cursor))
+
+            # 2. Схема и таблицы выгружаются параллельно, каждая в свой буфер
+            schema_part = tempfile.SpooledTemporaryFile(max_size=self.SPOOL_MAX_BYTES, dir=self.local_backup_dir)
+            for table, _ in self.DUMP_TABLES:
+                parts[table] = tempfile.SpooledTemporaryFile(max_size=self.SPOOL_MAX_BYTES, dir=self.local_backup_dir)
+
+            logger.info(f"🔧 Экспорт структуры и {len(self.DUMP_TABLES)} таблиц ({self.parallel_jobs} потоков)...")
+            with ThreadPoolExecutor(max_workers=self.parallel_jobs + 1) as executor:
+                schema_future = executor.submit(self._dump_schema, env, schema_part)
+                table_futures = {
+                    table: executor.submit(self._dump_table, table, where, params, snapshot_id, parts[table])
+                    for table, where in self.DUMP_TABLES
+                }
+
+                # Без схемы дамп бесполезен
+                schema_future.result()
+
+                for table, future in table_futures.items():
+                    try:
+                        size = future.result()
+                        logger.info(f"📋 {table}: {size / 1024:.1f} КБ")
+                    except Exception as e:
+                        logger.warning(f"⚠️ Ошибка экспорта {table}: {e}")
+                        parts.pop(table).close()
+
+            # 3. Собираем части в сжатый файл в порядке загрузки
+            header = (
+                "\n-- ========================================\n"
+                f"-- Данные таблиц (orders и sync_runs за последние {self.backup_months} месяцев, с {cutoff_date})\n"
+                "-- ========================================\n"
+            ).encode('utf-8')
+            self._compress_dump([schema_part, io.BytesIO(header)] + list(parts.values()), temp_path)
+            temp_path = temp_path.rename(temp_path.with_suffix(BACKUP_CODECS[self.codec]['ext']))
 
             # Проверяем размер созданного дампа
             dump_size = temp_path.stat().st_size
@@ -249,65 +343,70 @@ class BackupManager:
 
             return temp_path
 
-        except subprocess.TimeoutExpired:
-            logger.error("❌ Превышено время ожидания pg_dump")
-            if temp_path.exists():
-                temp_path.unlink()
-            return None
         except Exception as e:
             logger.error(f"❌ Ошибка создания дампа: {e}", exc_info=True)
-            if temp_path.exists():
+            if temp_path and temp_path.exists():
                 temp_path.unlink()
             return None
-
-    def _compress_dump(self, dump_path: Path) -> Optional[Path]:
-        """Сжимает дамп с помощью gzip"""
-        try:
-            import gzip
-            import shutil
-
-            compressed_path = dump_path.with_suffix('.sql.gz')
-
-            logger.info(f"📦 Сжатие дампа...")
-            with open(dump_path, 'rb') as f_in:
-                with gzip.open(compressed_path, 'wb', compresslevel=9) as f_out:
-                    shutil.copyfileobj(f_in, f_out)
-
-            # Удаляем несжатый дамп
-            dump_path.unlink()
-
-            compressed_size = compressed_path.stat().st_size
-            logger.info(f"✅ Дамп сжат: {compressed_path} ({compressed_size / 1024 / 1024:.2f} МБ)")
-
-            return compressed_path
-
-        except Exception as e:
-            logger.error(f"❌ Ошибка сжатия дампа: {e}")
-            return None
-
-    def _upload_to_yandex_disk(self, file_path: Path, remote_name: str) -> bool:
-        """Загружает файл на Яндекс.Диск"""
-        if not self.yadisk_client:
+        finally:
+            if snapshot_conn is not None:
+                try:
+                    snapshot_conn.rollback()
+                    snapshot_conn.close()
+                except Exception:
+                    pass
+            for part in parts.values():
+                part.close()
+
+    def _open_compressed_writer(self, path: Path):
+        """Файловый объект, сжимающий записываемое выбранным кодеком"""
+        if self.codec == 'zstd':
+            # threads=-1 — по потоку на ядро
+            compressor = _import_zstd().ZstdCompressor(level=self.compress_level, threads=-1)
+            return compressor.stream_writer(open(path, 'wb'))
+        if self.codec == 'lzma':
+            return lzma.open(path, 'wb', preset=self.compress_level)
+        return gzip.open(path, 'wb', compresslevel=self.compress_level)
+
+    @staticmethod
+    def _open_decompressed_reader(raw, codec: str):
+        """Распаковывающая обёртка над открытым файлом raw"""
+        if codec == 'zstd':
+            zstandard = _import_zstd()
+            if zstandard is None:
+                raise RuntimeError("Для восстановления .zst установите пакет zstandard")
+            return zstandard.ZstdDecompressor().stream_reader(raw, closefd=False)
+        if codec == 'lzma':
+            return lzma.LZMAFile(raw, 'rb')
+        return gzip.GzipFile(fileobj=raw, mode='rb')
+
+    def _compress_dump(self, parts: list, compressed_path: Path) -> Path:
+        """Последовательно стримит части дампа в compressed_path выбранным кодеком"""
+        started = time.monotonic()
+        logger.info(f"📦 Сжатие дампа ({self.codec}, уровень {self.compress_level})...")
+        with self._open_compressed_writer(compressed_path) as f_out:
+            f_out.write(
+                f"-- lunch_bot backup: codec={self.codec} level={self.compress_level} "
+                f"created={datetime.now().isoformat(timespec='seconds')}\n".encode('utf-8')
+            )
+            for part in parts:
+                part.seek(0)
+                shutil.copyfileobj(part, f_out, self.COPY_CHUNK_SIZE)
+                part.close()
+        logger.info(f"📦 Сжатие заняло {time.monotonic() - started:.1f} с")
+        return compressed_path
+
+    async def _upload_to_yandex_disk(self, file_path: Path, remote_name: str) -> bool:
+        """Загружает файл на Яндекс.Диск частями, с докачкой и проверкой sha256"""
+        if not self.yandex_token:
             logger.warning("⚠️ Яндекс.Диск не настроен, пропускаем загрузку")
             return False
 
         try:
-            # Создаем папку если её нет
-            if not self.yadisk_client.exists(self.yandex_folder):
-                self.yadisk_client.mkdir(self.yandex_folder)
-                logger.info(f"📁 Создана папка на Яндекс.Диске: {self.yandex_folder}")
-
-            remote_path = f"{self.yandex_folder}/{remote_name}"
-
-            # Удаляем старый файл если существует
-            if self.yadisk_client.exists(remote_path):
-                self.yadisk_client.remove(remote_path)
-                logger.info(f"🗑️ Удален старый бекап: {remote_name}")
-
-            # Загружаем новый файл
             logger.info(f"☁️ Загрузка на Яндекс.Диск: {remote_name}...")
-            self.yadisk_client.upload(str(file_path), remote_path)
-
+            remote_path = await YandexDiskUploader(self.yandex_token).upload(
+                file_path, self.yandex_folder, remote_name
+            )
             logger.info(f"✅ Файл загружен на Яндекс.Диск: {remote_path}")
             return True
 
@@ -320,7 +419,13 @@ class BackupManager:
         try:
             cutoff_date = datetime.now() - timedelta(days=keep_days)
 
-            for backup_file in self.local_backup_dir.glob('*.sql.gz'):
+            # База текущей инкрементальной цепочки нужна, пока к ней пишутся дельты
+            chain_base = (self._load_incremental_state() or {}).get('base_name')
+            backup_files = self._local_backup_files() + list(self.local_backup_dir.glob('*.json.gz'))
+
+            for backup_file in backup_files:
+                if chain_base and backup_file.name.startswith(backup_stem(chain_base)):
+                    continue
                 # Проверяем возраст файла
                 file_mtime = datetime.fromtimestamp(backup_file.stat().st_mtime)
                 if file_mtime < cutoff_date:
@@ -330,12 +435,13 @@ class BackupManager:
         except Exception as e:
             logger.error(f"❌ Ошибка очистки старых бекапов: {e}")
 
-    async def create_backup(self, upload_to_cloud: bool = True) -> Optional[Path]:
+    async def create_backup(self, upload_to_cloud: bool = True, as_base: bool = False) -> Optional[Path]:
         """
         Создает резервную копию базы данных
 
         Args:
             upload_to_cloud: Загружать ли бекап на Яндекс.Диск
+            as_base: Начать с этого дампа новую инкрементальную цепочку
 
         Returns:
             Path к созданному бекапу или None при ошибке
@@ -349,40 +455,50 @@ class BackupManager:
             weekday = self._get_weekday_name()
             timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
 
-            # 1. Создаем дамп
-            dump_path = await asyncio.to_thread(self._create_temp_dump)
-            if not dump_path:
-                logger.error("❌ Не удалось создать дамп базы данных")
-                return None
-
-            # 2. Сжимаем дамп
-            compressed_path = await asyncio.to_thread(self._compress_dump, dump_path)
+            # 1-2. Создаем дамп (части выгружаются параллельно, затем сжимаются в один файл)
+            snapshot_state = {} if as_base else None
+            compressed_path = await asyncio.to_thread(self._create_temp_dump, snapshot_state)
             if not compressed_path:
-                logger.error("❌ Не удалось сжать дамп")
+                logger.error("❌ Не удалось создать дамп базы данных")
                 return None
 
             # 3. Переименовываем с учетом дня недели для ротации
-            final_name = f"lunch_bot_backup_{weekday}_{timestamp}.sql.gz"
+            ext = BACKUP_CODECS[self.codec]['ext']
+            final_name = f"lunch_bot_backup_{weekday}_{timestamp}{ext}"
             final_path = self.local_backup_dir / final_name
             compressed_path.rename(final_path)
 
             logger.info(f"✅ Локальный бекап создан: {final_path}")
 
             # 4. Загружаем на Яндекс.Диск
+            upload_success = False
             if upload_to_cloud:
                 # Имя на Яндекс.Диске содержит только день недели для ротации
-                cloud_name = f"lunch_bot_backup_{weekday}.sql.gz"
-                upload_success = await asyncio.to_thread(
-                    self._upload_to_yandex_disk,
-                    final_path,
-                    cloud_name
-                )
+                cloud_name = f"lunch_bot_backup_{weekday}{ext}"
+                upload_success = await self._upload_to_yandex_disk(final_path, cloud_name)
 
                 if upload_success:
                     logger.info(f"✅ Бекап загружен на Яндекс.Диск: {cloud_name}")
+                    await asyncio.to_thread(self._remove_replaced_cloud_backups, cloud_name)
                 else:
                     logger.warning("⚠️ Не удалось загрузить на Яндекс.Диск")
 
+            if as_base:
+                self._save_incremental_state({
+                    'base_name': final_name,
+                    'base_created': datetime.now().isoformat(),
+                    'base_cloud_name': f"lunch_bot_backup_{weekday}{ext}" if upload_to_cloud else None,
+                    # Базы нет на Диске — дельтам там не к чему относиться, следующей ночью нужна новая
+                    'base_uploaded': upload_success or not upload_to_cloud,
+                    'base_codec': self.codec,
+                    # По хешу дельты проверяют, что восстанавливаются поверх своей базы:
+                    # файл дня недели на Диске может перезаписать и ручной /backup
+                    'base_sha256': (await asyncio.to_thread(YandexDiskUploader.file_hashes, final_path))['sha256'],
+                    'seq': 0,
+                    **snapshot_state,
+                })
+                logger.info(f"🧱 Новая база инкрементальной цепочки: {final_name}")
+
             # 5. Очищаем старые локальные бекапы
             await asyncio.to_thread(self._cleanup_old_local_backups)
 
@@ -396,6 +512,399 @@ class BackupManager:
             logger.error(f"❌ Критическая ошибка при создании бекапа: {e}", exc_info=True)
             return None
 
+    # ------------------------------------------------------------------
+    # Инкрементальные бекапы: полная база + дневные дельты
+    # ------------------------------------------------------------------
+
+    @property
+    def _incremental_state_path(self) -> Path:
+        return self.local_backup_dir / 'incremental_state.json'
+
+    def _load_incremental_state(self) -> Optional[dict]:
+        """Состояние текущей цепочки: база, номер последней дельты, водяной знак, ключи строк"""
+        try:
+            with self._incremental_state_path.open('r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось прочитать состояние инкрементальных бекапов: {e}")
+            return None
+
+    def _save_incremental_state(self, state: dict):
+        # Пишем через временный файл, чтобы обрыв не оставил битое состояние
+        tmp_path = self._incremental_state_path.with_suffix('.tmp')
+        with tmp_path.open('w', encoding='utf-8') as f:
+            json.dump(state, f)
+        tmp_path.replace(self._incremental_state_path)
+
+    def _read_watermark_state(self, cursor) -> dict:
+        """Водяной знак и первичные ключи всех таблиц в текущем снимке.
+
+        Ключи нужны для tombstone-ов: строка, которая была в прошлом бекапе и
+        пропала из текущего снимка, считается удалённой.
+        """
+        cursor.execute("SELECT LOCALTIMESTAMP")
+        watermark = cursor.fetchone()[0]
+
+        pks = {}
+        for table, (_, pk_cols) in self.INCREMENTAL_TABLES.items():
+            cursor.execute(f"SELECT {', '.join(pk_cols)} FROM public.{table}")
+            if len(pk_cols) == 1:
+                pks[table] = [row[0] for row in cursor.fetchall()]
+            else:
+                pks[table] = [list(row) for row in cursor.fetchall()]
+
+        return {'watermark': watermark.isoformat(), 'pks': pks}
+
+    @staticmethod
+    def _pk_key(value):
+        return tuple(value) if isinstance(value, list) else value
+
+    @staticmethod
+    def _json_default(value):
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        raise TypeError(f"Не сериализуется в JSON: {type(value).__name__}")
+
+    def _create_delta(self, state: dict) -> tuple:
+        """Выгружает изменения с прошлого водяного знака в сжатый JSON.
+
+        Возвращает (путь к дельте, новое состояние цепочки).
+        """
+        since = datetime.fromisoformat(state['watermark']) - self.WATERMARK_OVERLAP
+        seq = state['seq'] + 1
+
+        conn = db.engine.raw_connection()
+        try:
+            conn.rollback()
+            cursor = conn.cursor()
+            # Водяной знак, ключи и изменения читаются из одного снимка
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+            new_state = self._read_watermark_state(cursor)
+
+            tables = {}
+            total_rows = total_deleted = 0
+            for table, (watermark_col, pk_cols) in self.INCREMENTAL_TABLES.items():
+                if watermark_col is None:
+                    cursor.execute(f"SELECT * FROM public.{table}")
+                else:
+                    cursor.execute(f"SELECT * FROM public.{table} WHERE {watermark_col} >= %s", (since,))
+                columns = [col[0] for col in cursor.description]
+                rows = [list(row) for row in cursor.fetchall()]
+
+                previous = {self._pk_key(k) for k in state['pks'].get(table, [])}
+                current = {self._pk_key(k) for k in new_state['pks'][table]}
+                deleted = [list(k) if isinstance(k, tuple) else k for k in previous - current]
+
+                tables[table] = {'columns': columns, 'rows': rows, 'deleted': deleted}
+                total_rows += len(rows)
+                total_deleted += len(deleted)
+            conn.rollback()
+        finally:
+            conn.close()
+
+        base_stem = backup_stem(state['base_name'])
+        delta_path = self.local_backup_dir / f"{base_stem}.delta_{seq:03d}.json.gz"
+        document = {
+            'format': 'lunch_bot_delta',
+            'version': 1,
+            'base_name': state['base_name'],
+            'base_cloud_name': state.get('base_cloud_name'),
+            'base_sha256': state.get('base_sha256'),
+            'seq': seq,
+            'since': since.isoformat(),
+            'watermark': new_state['watermark'],
+            'created_at': datetime.now().isoformat(),
+            'tables': tables,
+        }
+        with gzip.open(delta_path, 'wt', encoding='utf-8', compresslevel=6) as f:
+            json.dump(document, f, default=self._json_default, ensure_ascii=False)
+
+        logger.info(f"🧩 Дельта #{seq}: {total_rows} строк, {total_deleted} удалений")
+        return delta_path, {**state, 'seq': seq, **new_state}
+
+    def _needs_new_base(self, state: Optional[dict]) -> bool:
+        if not state:
+            return True
+        if not (self.local_backup_dir / state['base_name']).exists():
+            logger.warning(f"⚠️ База цепочки {state['base_name']} не найдена локально")
+            return True
+        if not state.get('base_uploaded', True):
+            logger.warning(f"⚠️ База цепочки {state['base_name']} не загружена на Яндекс.Диск — делаем новую")
+            return True
+        base_day = datetime.fromisoformat(state['base_created']).date()
+        return (date.today() - base_day).days >= self.full_interval_days
+
+    async def create_scheduled_backup(self, upload_to_cloud: bool = True) -> Optional[Path]:
+        """Ночной бекап: в режиме incremental — полная база раз в N дней, иначе дельта"""
+        if self.backup_mode != 'incremental':
+            return await self.create_backup(upload_to_cloud=upload_to_cloud)
+
+        state = self._load_incremental_state()
+        if self._needs_new_base(state):
+            return await self.create_backup(upload_to_cloud=upload_to_cloud, as_base=True)
+        return await self.create_incremental_backup(state, upload_to_cloud=upload_to_cloud)
+
+    async def create_incremental_backup(self, state: dict, upload_to_cloud: bool = True) -> Optional[Path]:
+        """Создает дельту относительно последнего бекапа цепочки"""
+        try:
+            logger.info(f"🔄 Инкрементальный бекап к базе {state['base_name']}...")
+
+            delta_path, new_state = await asyncio.to_thread(self._create_delta, state)
+
+            advance = True
+            if upload_to_cloud:
+                # Имя базы с отметкой времени + номер: дельты разных цепочек не перезаписывают друг друга
+                cloud_name = delta_path.name
+                upload_success = await self._upload_to_yandex_disk(delta_path, cloud_name)
+                if upload_success:
+                    logger.info(f"✅ Дельта загружена на Яндекс.Диск: {cloud_name}")
+                    await asyncio.to_thread(self._cleanup_old_cloud_deltas)
+                else:
+                    # Без сдвига следующая дельта получит тот же номер и покроет и это окно —
+                    # в цепочке на Диске не будет дыры
+                    advance = False
+                    logger.warning("⚠️ Не удалось загрузить дельту на Яндекс.Диск, цепочка не сдвигается")
+
+            # Состояние сдвигаем только после того, как дельта записана (и загружена)
+            if advance:
+                self._save_incremental_state(new_state)
+            await asyncio.to_thread(self._cleanup_old_local_backups)
+
+            size_kb = delta_path.stat().st_size / 1024
+            logger.info(f"✅ Инкрементальный бекап создан: {delta_path} ({size_kb:.1f} КБ)")
+            return delta_path
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка инкрементального бекапа: {e}", exc_info=True)
+            return None
+
+    def _remove_replaced_cloud_backups(self, cloud_name: str):
+        """Удаляет с Диска бекап того же дня недели в другом кодеке.
+
+        Ротация идёт перезаписью lunch_bot_backup_<день><расширение>; после смены
+        кодека (например, .sql.gz → .sql.zst) старые файлы иначе остались бы навсегда.
+        """
+        if not self.yadisk_client:
+            return
+        stem = backup_stem(cloud_name)
+        for spec in BACKUP_CODECS.values():
+            old_name = f"{stem}{spec['ext']}"
+            if old_name == cloud_name:
+                continue
+            remote_path = f"{self.yandex_folder}/{old_name}"
+            try:
+                if self.yadisk_client.exists(remote_path):
+                    self.yadisk_client.remove(remote_path, permanently=True)
+                    logger.info(f"🗑️ Удалён заменённый бекап на Яндекс.Диске: {old_name}")
+            except Exception as e:
+                logger.warning(f"⚠️ Не удалось удалить {old_name} с Яндекс.Диска: {e}")
+
+    def _cleanup_old_cloud_deltas(self):
+        """Удаляет с Диска дельты цепочек, чья база уже заменена новой.
+
+        Цепочка живёт full_interval_days, база на Диске перезаписывается по дню
+        недели — дельты старше двух таких периодов ни к одной базе не относятся.
+        """
+        if not self.yadisk_client:
+            return
+        keep_days = 2 * max(7, self.full_interval_days)
+        cutoff = datetime.now() - timedelta(days=keep_days)
+        try:
+            for item in self.yadisk_client.listdir(self.yandex_folder):
+                if '.delta_' not in item.name or not item.name.endswith('.json.gz'):
+                    continue
+                created = item.created or item.modified
+                if created is not None and created.astimezone().replace(tzinfo=None) < cutoff:
+                    self.yadisk_client.remove(f"{self.yandex_folder}/{item.name}", permanently=True)
+                    logger.info(f"🗑️ Удалена старая дельта на Яндекс.Диске: {item.name}")
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка очистки дельт на Яндекс.Диске: {e}")
+
+    def find_incremental_chain(self, base_path: Path) -> list:
+        """Локальные дельты, относящиеся к базе base_path, по порядку"""
+        base_stem = backup_stem(base_path.name)
+        return sorted(base_path.parent.glob(f"{base_stem}.delta_*.json.gz"))
+
+    def find_cloud_incremental_chain(self, cloud_name: str) -> list:
+        """Имена дельт на Яндекс.Диске к базе cloud_name, по порядку
+
+        База на Диске перезаписывается по дню недели, а дельты названы по локальной
+        базе (lunch_bot_backup_<день>_<время>.delta_NNN.json.gz). К файлу дня недели
+        относится самая свежая цепочка этого дня; что база та же самая, после
+        скачивания проверяет _load_delta_chain по sha256.
+        """
+        if not self.yadisk_client:
+            return []
+        names = [item.name for item in self.yadisk_client.listdir(self.yandex_folder)]
+        return self._latest_delta_chain(cloud_name, names)
+
+    @staticmethod
+    def _latest_delta_chain(cloud_name: str, names: list) -> list:
+        prefix = f"{backup_stem(cloud_name)}_"
+        chains = {}
+        for name in names:
+            if name.startswith(prefix) and '.delta_' in name and name.endswith('.json.gz'):
+                chains.setdefault(name.split('.delta_', 1)[0], []).append(name)
+        if not chains:
+            return []
+        # Отметка времени в имени базы (%Y-%m-%d_%H-%M-%S) сортируется как строка
+        return sorted(chains[max(chains)])
+
+    async def download_incremental_chain(self, delta_names: list) -> Optional[list]:
+        """Скачивает дельты с Яндекс.Диска; None, если хоть одна не скачалась"""
+        paths = []
+        for name in delta_names:
+            path = await self.download_from_cloud(name)
+            if not path:
+                return None
+            paths.append(path)
+        return paths
+
+    @staticmethod
+    def _decode_value(column, value):
+        """JSON → Python-тип колонки (даты приходят строками)"""
+        if value is None:
+            return None
+        python_type = getattr(column.type, 'python_type', None)
+        if python_type is datetime and isinstance(value, str):
+            return datetime.fromisoformat(value)
+        if python_type is date and isinstance(value, str):
+            return date.fromisoformat(value)
+        return value
+
+    def _load_delta_chain(self, base_path: Path, delta_paths: list) -> list:
+        """Читает дельты и проверяет, что они образуют непрерывную цепочку к базе"""
+        documents = []
+        for path in delta_paths:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                document = json.load(f)
+            if document.get('format') != 'lunch_bot_delta':
+                raise ValueError(f"{path.name}: не файл дельты")
+            if base_path.name not in (document['base_name'], document.get('base_cloud_name')):
+                raise ValueError(f"{path.name}: дельта к другой базе ({document['base_name']})")
+            documents.append(document)
+
+        documents.sort(key=lambda d: d['seq'])
+        for expected, document in enumerate(documents, start=1):
+            if document['seq'] != expected:
+                raise ValueError(f"Пропущена дельта #{expected} (следующая найденная — #{document['seq']})")
+
+        # Дельты старых цепочек не знают хеша базы — для них проверка только по имени
+        expected_sha = {d['base_sha256'] for d in documents if d.get('base_sha256')}
+        if expected_sha:
+            base_sha = YandexDiskUploader.file_hashes(base_path)['sha256']
+            if expected_sha != {base_sha}:
+                raise ValueError(
+                    f"{base_path.name} — не та база, к которой сняты дельты "
+                    f"(файл перезаписан другим бекапом?)"
+                )
+        return documents
+
+    @staticmethod
+    def _upsert_batches(table_name: str, rows: list) -> list:
+        """Порядок upsert-ов внутри таблицы.
+
+        Отмена заказа и повторный заказ на ту же дату — обычный сценарий: в дельте
+        старая строка отменена, новая активна. Если вставить новую раньше, чем
+        отменена старая, сработает частичный уникальный индекс
+        uq_orders_user_date_active и вся дельта откатится — поэтому сначала
+        отмены, потом остальное.
+        """
+        if table_name != 'orders':
+            return [rows]
+        cancelled = [r for r in rows if r.get('is_cancelled')]
+        rest = [r for r in rows if not r.get('is_cancelled')]
+        return [batch for batch in (cancelled, rest) if batch]
+
+    def _apply_delta_chain(self, documents: list) -> dict:
+        """Накатывает дельты одной транзакцией: удаление tombstone-ов, затем upsert изменённых строк"""
+        from sqlalchemy import delete, tuple_
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        from models import Base
+
+        stats = {'upserted': 0, 'deleted': 0}
+        with db.get_session() as session:
+            for document in documents:
+                # Удаления — в обратном порядке FK и до вставок: удалённая строка
+                # (например, отменённый заказ после cleanup) не должна мешать новой
+                for table_name, (_, pk_cols) in reversed(list(self.INCREMENTAL_TABLES.items())):
+                    data = document['tables'].get(table_name)
+                    if not data or not data['deleted']:
+                        continue
+                    table = Base.metadata.tables[table_name]
+                    if len(pk_cols) == 1:
+                        condition = table.c[pk_cols[0]].in_(data['deleted'])
+                    else:
+                        condition = tuple_(*[table.c[c] for c in pk_cols]).in_([tuple(k) for k in data['deleted']])
+                    session.execute(delete(table).where(condition))
+                    stats['deleted'] += len(data['deleted'])
+
+                # Вставки — в порядке FK
+                for table_name, (_, pk_cols) in self.INCREMENTAL_TABLES.items():
+                    data = document['tables'].get(table_name)
+                    if not data or not data['rows']:
+                        continue
+                    table = Base.metadata.tables[table_name]
+                    known = [c for c in data['columns'] if c in table.c]
+                    rows = [
+                        {c: self._decode_value(table.c[c], v) for c, v in zip(data['columns'], row) if c in table.c}
+                        for row in data['rows']
+                    ]
+                    stmt = pg_insert(table)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=list(pk_cols),
+                        set_={c: stmt.excluded[c] for c in known if c not in pk_cols},
+                    )
+                    for batch in self._upsert_batches(table_name, rows):
+                        session.execute(stmt, batch)
+                    stats['upserted'] += len(rows)
+
+                logger.info(f"🧩 Применена дельта #{document['seq']} (на {document['watermark']})")
+        return stats
+
+    async def restore_incremental(self, base_path: Path, delta_paths: Optional[list] = None,
+                                  confirm: bool = False, progress_callback=None) -> dict:
+        """
+        Восстанавливает базу из полной копии и накатывает дельты цепочки
+
+        Args:
+            base_path: Полный бекап (.sql.gz/.sql.zst/.sql.xz), с которого начинается цепочка
+            delta_paths: Файлы дельт; по умолчанию — найденные рядом с базой
+            confirm: Подтверждение операции
+        """
+        if delta_paths is None:
+            delta_paths = self.find_incremental_chain(base_path)
+
+        # Цепочку проверяем до восстановления базы, а не после
+        try:
+            documents = await asyncio.to_thread(self._load_delta_chain, base_path, delta_paths)
+        except Exception as e:
+            return {'success': False, 'message': f'❌ Некорректная цепочка дельт: {e}',
+                    'details': {'chain_invalid': True}}
+
+        result = await self.restore_backup(base_path, confirm=confirm, progress_callback=progress_callback)
+        if not result['success'] or not documents:
+            return result
+
+        try:
+            stats = await asyncio.to_thread(self._apply_delta_chain, documents)
+            db.fix_sequences()
+        except Exception as e:
+            logger.error(f"❌ Ошибка применения дельт: {e}", exc_info=True)
+            result['success'] = False
+            result['message'] = f'❌ База восстановлена, но дельты не применены: {e}'
+            return result
+
+        result['details']['deltas_applied'] = len(documents)
+        result['details']['restored_to'] = documents[-1]['watermark']
+        result['details'].update(stats)
+        logger.info(f"✅ Применено дельт: {len(documents)} ({stats['upserted']} строк, {stats['deleted']} удалений)")
+        return result
+
     def list_available_backups(self) -> dict:
         """Возвращает список доступных бекапов для восстановления"""
         backups = {
@@ -404,14 +913,12 @@ class BackupManager:
         }
 
         # Локальные бекапы
-        for backup_file in sorted(
-            self.local_backup_dir.glob('*.sql.gz'),
-            key=lambda x: x.stat().st_mtime,
-            reverse=True
-        ):
+        for backup_file in self._local_backup_files():
             backups['local'].append({
                 'name': backup_file.name,
                 'path': str(backup_file),
+                'codec': detect_codec(backup_file),
+                'deltas': [p.name for p in self.find_incremental_chain(backup_file)],
                 'size_mb': backup_file.stat().st_size / 1024 / 1024,
                 'created': datetime.fromtimestamp(backup_file.stat().st_mtime).strftime('%Y-%m-%d %H:%M:%S')
             })
@@ -420,11 +927,15 @@ class BackupManager:
         if self.yadisk_client:
             try:
                 if self.yadisk_client.exists(self.yandex_folder):
-                    for item in self.yadisk_client.listdir(self.yandex_folder):
-                        if item.name.endswith('.sql.gz'):
+                    items = list(self.yadisk_client.listdir(self.yandex_folder))
+                    names = [item.name for item in items]
+                    for item in items:
+                        if is_backup_file(item.name):
                             backups['cloud'].append({
                                 'name': item.name,
                                 'path': f"{self.yandex_folder}/{item.name}",
+                                'codec': next(c for c, spec in BACKUP_CODECS.items() if item.name.endswith(spec['ext'])),
+                                'deltas': self._latest_delta_chain(item.name, names),
                                 'size_mb': item.size / 1024 / 1024,
                                 'created': item.created.strftime('%Y-%m-%d %H:%M:%S') if item.created else 'N/A'
                             })
@@ -457,15 +968,90 @@ class BackupManager:
             logger.error(f"❌ Ошибка скачивания с Яндекс.Диска: {e}")
             return None
 
-    async def restore_backup(self, backup_path: Path, confirm: bool = False) -> dict:
+    def _psql_base_cmd(self, database: Optional[str] = None) -> list:
+        return [
+            'psql',
+            '-h', self.db_host,
+            '-p', self.db_port,
+            '-U', self.db_user,
+            '-d', database or self.db_name,
+        ]
+
+    async def _run_psql(self, args: list, env: dict, timeout: int, database: Optional[str] = None) -> tuple:
+        """Запускает psql без блокировки event loop, возвращает (код, stdout, stderr)"""
+        proc = await asyncio.create_subprocess_exec(
+            *self._psql_base_cmd(database), *args,
+            env=env,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            raise
+        return proc.returncode, stdout.decode('utf-8', 'replace'), stderr.decode('utf-8', 'replace')
+
+    async def _stream_into_psql(self, backup_path: Path, env: dict, progress_callback=None) -> tuple:
+        """Распаковывает бекап блоками прямо в stdin psql.
+
+        В памяти держится не больше одного блока; прогресс считается по прочитанной
+        доле сжатого файла и отдаётся в progress_callback(percent) каждые 10%.
+        """
+        proc = await asyncio.create_subprocess_exec(
+            *self._psql_base_cmd(), '-q',
+            env=env,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        # stderr читаем параллельно, иначе psql встанет на заполненном пайпе
+        stderr_task = asyncio.create_task(proc.stderr.read())
+
+        total_size = backup_path.stat().st_size or 1
+        last_reported = 0
+        try:
+            codec = detect_codec(backup_path)
+            with open(backup_path, 'rb') as raw, self._open_decompressed_reader(raw, codec) as f_in:
+                while True:
+                    chunk = await asyncio.to_thread(f_in.read, self.COPY_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    proc.stdin.write(chunk)
+                    await proc.stdin.drain()
+
+                    percent = min(int(raw.tell() * 100 / total_size), 100)
+                    if percent >= last_reported + 10:
+                        last_reported = percent - percent % 10
+                        logger.info(f"📥 Восстановлено {last_reported}%")
+                        if progress_callback:
+                            try:
+                                await progress_callback(last_reported)
+                            except Exception as e:
+                                logger.warning(f"⚠️ Ошибка обновления прогресса: {e}")
+            proc.stdin.close()
+            await proc.stdin.wait_closed()
+            await proc.wait()
+        except BaseException:
+            proc.kill()
+            await proc.wait()
+            stderr_task.cancel()
+            raise
+
+        stderr = (await stderr_task).decode('utf-8', 'replace')
+        return proc.returncode, stderr
+
+    async def restore_backup(self, backup_path: Path, confirm: bool = False, progress_callback=None) -> dict:
         """
         Восстанавливает базу данных из бекапа
 
         ВНИМАНИЕ: Это опасная операция! Все текущие данные будут перезаписаны!
 
         Args:
-            backup_path: Путь к файлу бекапа (.sql.gz)
+            backup_path: Путь к файлу бекапа (.sql.gz, .sql.zst или .sql.xz)
             confirm: Подтверждение операции
+            progress_callback: async-функция, получающая процент выполнения
 
         Returns:
             dict с результатом операции
@@ -490,17 +1076,11 @@ class BackupManager:
             logger.info(f"📦 Файл: {backup_path}")
             logger.info("=" * 60)
 
-            import gzip
-
-            # 1. Распаковываем бекап
-            logger.info("📦 Распаковка бекапа...")
-            uncompressed_path = backup_path.with_suffix('')  # убираем .gz
-
-            with gzip.open(backup_path, 'rb') as f_in:
-                with open(uncompressed_path, 'wb') as f_out:
-                    f_out.write(f_in.read())
-
-            logger.info(f"✅ Распаковано: {uncompressed_path}")
+            # 1. Проверяем, что архив читается, до того как трогать базу
+            codec = detect_codec(backup_path)
+            with open(backup_path, 'rb') as raw, self._open_decompressed_reader(raw, codec) as f_in:
+                f_in.read(1)
+            logger.info(f"📦 Формат: {codec}")
 
             # 2. Формируем переменные окружения для psql
             env = os.environ.copy()
@@ -509,7 +1089,7 @@ class BackupManager:
             # 3. Закрываем все соединения SQLAlchemy перед восстановлением
             logger.info("🔌 Закрытие соединений SQLAlchemy...")
             try:
-                db.session.close()
+                db.SessionLocal.remove()
                 db.engine.dispose()
                 logger.info("✅ Соединения SQLAlchemy закрыты")
             except Exception as e:
@@ -518,45 +1098,28 @@ class BackupManager:
             # 4. Принудительно завершаем все другие соединения к БД
             logger.info("🔌 Завершение других соединений к БД...")
 
-            terminate_cmd = [
-                'psql',
-                '-h', self.db_host,
-                '-p', self.db_port,
-                '-U', self.db_user,
-                '-d', 'postgres',  # Подключаемся к системной БД
-                '-c', f'''
+            terminate_code, _, terminate_err = await self._run_psql(
+                ['-c', f'''
                 SELECT pg_terminate_backend(pid)
                 FROM pg_stat_activity
                 WHERE datname = '{self.db_name}'
                 AND pid <> pg_backend_pid();
-                '''
-            ]
-
-            terminate_result = await asyncio.to_thread(
-                subprocess.run,
-                terminate_cmd,
-                env=env,
-                capture_output=True,
-                text=True,
-                timeout=30
+                '''],
+                env, timeout=30,
+                database='postgres'  # Подключаемся к системной БД
             )
 
-            if terminate_result.returncode == 0:
+            if terminate_code == 0:
                 logger.info("✅ Другие соединения завершены")
             else:
-                logger.warning(f"⚠️ Предупреждение при завершении соединений: {terminate_result.stderr}")
+                logger.warning(f"⚠️ Предупреждение при завершении соединений: {terminate_err}")
 
             # 5. Очищаем базу и восстанавливаем
             # Сначала удаляем все таблицы
             logger.info("🗑️ Очистка базы данных...")
 
-            drop_cmd = [
-                'psql',
-                '-h', self.db_host,
-                '-p', self.db_port,
-                '-U', self.db_user,
-                '-d', self.db_name,
-                '-c', '''
+            drop_code, _, drop_err = await self._run_psql(
+                ['-c', '''
                 DO $$
                 DECLARE r RECORD;
                 BEGIN
@@ -565,54 +1128,32 @@ class BackupManager:
                         EXECUTE 'DROP TABLE IF EXISTS public.' || quote_ident(r.tablename) || ' CASCADE';
                     END LOOP;
                 END $$;
-                '''
-            ]
-
-            drop_result = await asyncio.to_thread(
-                subprocess.run,
-                drop_cmd,
-                env=env,
-                capture_output=True,
-                text=True,
-                timeout=60
+                '''],
+                env, timeout=60
             )
 
-            if drop_result.returncode != 0:
-                logger.warning(f"⚠️ Предупреждение при очистке: {drop_result.stderr}")
+            if drop_code != 0:
+                logger.warning(f"⚠️ Предупреждение при очистке: {drop_err}")
 
-            # 6. Восстанавливаем из дампа
+            # 6. Стримим распакованный дамп в psql
             logger.info("📥 Восстановление данных из бекапа...")
+            started = time.monotonic()
 
-            restore_cmd = [
-                'psql',
-                '-h', self.db_host,
-                '-p', self.db_port,
-                '-U', self.db_user,
-                '-d', self.db_name,
-                '-f', str(uncompressed_path)
-            ]
-
-            restore_result = await asyncio.to_thread(
-                subprocess.run,
-                restore_cmd,
-                env=env,
-                capture_output=True,
-                text=True,
+            restore_code, restore_err = await asyncio.wait_for(
+                self._stream_into_psql(backup_path, env, progress_callback),
                 timeout=600
             )
+            logger.info(f"📥 Дамп загружен за {time.monotonic() - started:.1f} с")
 
-            # 7. Удаляем временный файл
-            uncompressed_path.unlink()
-
-            if restore_result.returncode != 0:
+            if restore_code != 0:
                 # Проверяем на критические ошибки
-                if 'ERROR' in restore_result.stderr:
-                    result['message'] = f'❌ Ошибка восстановления: {restore_result.stderr}'
-                    result['details']['stderr'] = restore_result.stderr
-                    logger.error(f"❌ Ошибка восстановления: {restore_result.stderr}")
+                if 'ERROR' in restore_err:
+                    result['message'] = f'❌ Ошибка восстановления: {restore_err}'
+                    result['details']['stderr'] = restore_err
+                    logger.error(f"❌ Ошибка восстановления: {restore_err}")
                     return result
 
-            # 8. Переподключаемся к БД и исправляем последовательности
+            # 7. Переподключаемся к БД и исправляем последовательности
             logger.info("🔌 Переподключение к базе данных...")
             try:
                 db.reconnect()
@@ -636,7 +1177,7 @@ class BackupManager:
 
             return result
 
-        except subprocess.TimeoutExpired:
+        except asyncio.TimeoutError:
             result['message'] = '❌ Превышено время ожидания восстановления'
             logger.error("❌ Превышено время ожидания восстановления")
             return result
@@ -647,18 +1188,21 @@ class BackupManager:
 
     def get_backup_status(self) -> dict:
         """Возвращает информацию о бекапах"""
+        state = self._load_incremental_state()
         status = {
             'yandex_disk_configured': self.yadisk_client is not None,
+            'mode': self.backup_mode,
+            'incremental': {
+                'base_name': state['base_name'],
+                'deltas': state['seq'],
+                'watermark': state['watermark'],
+            } if state else None,
             'local_backups': [],
             'cloud_backups': []
         }
 
         # Локальные бекапы
-        for backup_file in sorted(
-            self.local_backup_dir.glob('*.sql.gz'),
-            key=lambda x: x.stat().st_mtime,
-            reverse=True
-        ):
+        for backup_file in self._local_backup_files():
             status['local_backups'].append({
                 'name': backup_file.name,
                 'size_mb': backup_file.stat().st_size / 1024 / 1024,
@@ -670,7 +1214,7 @@ class BackupManager:
             try:
                 if self.yadisk_client.exists(self.yandex_folder):
                     for item in self.yadisk_client.listdir(self.yandex_folder):
-                        if item.name.endswith('.sql.gz'):
+                        if is_backup_file(item.name):
                             status['cloud_backups'].append({
                                 'name': item.name,
                                 'size_mb': item.size / 1024 / 1024,
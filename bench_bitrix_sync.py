@@ -0,0 +1,329 @@
+"""
+Замер скорости синхронизации с Bitrix24 на локальном фейковом портале.
+
+Поднимает fake_bitrix24_server.py в фоновом потоке, направляет на него
+BITRIX_WEBHOOK/BITRIX_REST_WEBHOOK и для каждого объёма из --sizes
+(по умолчанию 100, 1 000 и 10 000 заказов в Bitrix) на чистой БД меряет:
+- sync_employees — холодный (пустая БД) и повторный прогон;
+- sync_orders — холодный (все заказы новые) и инкрементальный повтор;
+- _push_to_bitrix — отправку сегодняшних локальных заказов (--push, но не
+  больше, чем сотрудников: один заказ на человека в день).
+
+Для каждого шага: время, HTTP-запросы к порталу по методам (отдельно —
+вызовы внутри batch и ответы 503), SQL-запросы к БД.
+
+Паузы BitrixSync после записи (CREATE/UPDATE_PACING_SEC) по умолчанию
+обнуляются — иначе отправка 100 заказов заняла бы 100 секунд сна;
+--keep-pacing оставляет их. Ограничение частоты самого клиента fast_bitrix24
+(по умолчанию 2 запроса/с после запаса 50) настраивается --client-rps.
+
+Использование:
+    python bench_bitrix_sync.py --output data/bench/bitrix_sync.json
+    python bench_bitrix_sync.py --sizes 1000 --latency-ms 80 --rate-limit 2 --client-rps 2
+    python bench_bitrix_sync.py --compare data/bench/bitrix_sync.json
+
+Нужны fast_bitrix24, apscheduler, python-telegram-bot (их импортирует
+bitrix/sync.py), а также uvicorn и aiosqlite.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import logging
+import importlib
+import argparse
+import platform
+import threading
+from pathlib import Path
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_morning_rush import BENCH_DIR, Metrics, ContextThreadPool, tune_sqlite, git_commit, _current_action
+
+DEFAULT_SQLITE = BENCH_DIR / 'bitrix_sync.db'
+DEFAULT_SIZES = '100,1000,10000'
+
+logger = logging.getLogger('bench')
+
+
+# ---------------------------------------------------------------------------
+# Фейковый портал в фоновом потоке
+# ---------------------------------------------------------------------------
+
+class FakeBitrixThread:
+    """uvicorn с fake_bitrix24_server в отдельном потоке на свободном порту"""
+
+    def __init__(self, portal, **options):
+        import uvicorn
+        from fake_bitrix24_server import create_app
+
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            self.port = probe.getsockname()[1]
+        config = uvicorn.Config(create_app(portal, **options), host='127.0.0.1',
+                                port=self.port, log_level='warning')
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, name='fake-bitrix24', daemon=True)
+
+    @property
+    def webhook(self):
+        return f"http://127.0.0.1:{self.port}/rest/1/fake/"
+
+    def start(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+    def stats(self, reset=False):
+        import httpx
+        with httpx.Client(base_url=f"http://127.0.0.1:{self.port}", trust_env=False) as client:
+            data = client.get('/_stats').json()
+            if reset:
+                client.post('/_stats/reset')
+        return data
+
+
+# ---------------------------------------------------------------------------
+# Подготовка БД
+# ---------------------------------------------------------------------------
+
+def reset_database(db):
+    from models import Base, BotSetting
+
+    Base.metadata.drop_all(bind=db.engine)
+    Base.metadata.create_all(bind=db.engine)
+    with db.get_session() as session:
+        session.add(BotSetting(setting_name='orders_enabled', setting_value='True'))
+
+
+def seed_push_orders(db, limit):
+    """Сегодняшние заказы из бота, ещё не отправленные в Bitrix — по одному на сотрудника.
+
+    Берём сотрудников без заказа на сегодня в Bitrix, чтобы мерить создание,
+    а не ветку «заказ уже есть в Bitrix».
+    """
+    from models import User, Order
+    from time_config import TIME_CONFIG
+
+    today = datetime.now(TIME_CONFIG.TIMEZONE).date()
+    with db.get_session() as session:
+        ordered_today = session.query(Order.user_id).filter(Order.target_date == today)
+        user_ids = [row[0] for row in session.query(User.id).filter(
+            User.is_employee == True, User.bitrix_id != None, User.id.not_in(ordered_today),
+        ).order_by(User.id).limit(limit)]
+        session.add_all(
+            Order(user_id=user_id, target_date=today, order_time='08:45:00', quantity=1,
+                  is_from_bitrix=False, is_sent_to_bitrix=False, is_cancelled=False)
+            for user_id in user_ids
+        )
+    return len(user_ids)
+
+
+# ---------------------------------------------------------------------------
+# Прогон
+# ---------------------------------------------------------------------------
+
+async def measure_step(name, coro_factory, metrics, server):
+    server.stats(reset=True)
+    token = _current_action.set(name)
+    started = time.perf_counter()
+    try:
+        outcome = await coro_factory()
+    finally:
+        wall = time.perf_counter() - started
+        _current_action.reset(token)
+    portal = server.stats()
+    return {
+        'wall_sec': round(wall, 3),
+        'http_requests': sum(portal['requests'].values()),
+        'requests_by_method': portal['requests'],
+        'calls_by_method': portal['calls'],
+        'rejected_503': sum(portal['rejected'].values()),
+        'sql_queries': metrics.queries.pop(name, 0),
+        'outcome': outcome,
+    }
+
+
+async def run_size(size, args, db, portal, server, metrics):
+    from bitrix.sync import BitrixSync
+    from time_config import TIME_CONFIG
+
+    reset_database(db)
+    portal.seed_orders(size)
+
+    sync = BitrixSync()
+    if not args.keep_pacing:
+        sync.CREATE_PACING_SEC = sync.UPDATE_PACING_SEC = 0
+    if args.client_rps:
+        import metrics
+        from fast_bitrix24 import Bitrix
+        sync.bx = metrics.InstrumentedBitrix(Bitrix(sync.webhook, requests_per_second=args.client_rps,
+                                                    request_pool_size=args.client_pool))
+
+    today = datetime.now(TIME_CONFIG.TIMEZONE).date()
+    start_date = (today - timedelta(days=args.days)).isoformat()
+    end_date = today.isoformat()
+
+    steps = {}
+    steps['employees_cold'] = await measure_step('employees_cold', sync.sync_employees, metrics, server)
+    steps['employees_warm'] = await measure_step('employees_warm', sync.sync_employees, metrics, server)
+    steps['orders_cold'] = await measure_step(
+        'orders_cold', lambda: sync.sync_orders(start_date, end_date, incremental=False), metrics, server)
+    steps['orders_incremental'] = await measure_step(
+        'orders_incremental', lambda: sync.sync_orders(start_date, end_date, incremental=True), metrics, server)
+
+    pushed = seed_push_orders(db, min(args.push, size))
+    steps['push'] = await measure_step('push', sync._push_to_bitrix, metrics, server)
+    steps['push']['orders'] = pushed
+
+    await sync.close()
+    return steps
+
+
+async def run_all(sizes, args, db, portal, server, metrics):
+    # Один event loop на все объёмы: async-движок БД привязан к циклу, в котором создан
+    asyncio.get_running_loop().set_default_executor(ContextThreadPool())
+    results = {}
+    for size in sizes:
+        logger.warning(f"▶️ {size} заказов в Bitrix")
+        results[str(size)] = await run_size(size, args, db, portal, server, metrics)
+    return results
+
+
+def print_report(result):
+    meta = result['meta']
+    print(f"\nКоммит {meta['commit']}, БД {meta['db_dialect']}, сотрудников {meta['employees']}, "
+          f"задержка портала {meta['latency_ms']} мс, лимит {meta['rate_limit'] or '∞'} з/с, "
+          f"паузы {'включены' if meta['keep_pacing'] else 'выключены'}")
+    header = f"{'заказов':>8}  {'шаг':<20}{'время, с':>10}{'HTTP':>7}{'вызовов':>9}{'503':>6}{'SQL':>8}"
+    print(header)
+    print('-' * len(header))
+    for size, steps in result['sizes'].items():
+        for name, s in steps.items():
+            calls = sum(s['calls_by_method'].values())
+            print(f"{size:>8}  {name:<20}{s['wall_sec']:>10.2f}{s['http_requests']:>7}{calls:>9}"
+                  f"{s['rejected_503']:>6}{s['sql_queries']:>8}")
+
+
+def compare(result, baseline, max_regression, noise_sec):
+    """Рост времени сверх порога или рост числа HTTP-запросов — регрессия"""
+    regressions = []
+    print(f"\nСравнение с {baseline['meta'].get('commit')}:")
+    for size, steps in result['sizes'].items():
+        for name, s in steps.items():
+            base = baseline.get('sizes', {}).get(size, {}).get(name)
+            if not base:
+                continue
+            delta = s['wall_sec'] - base['wall_sec']
+            ratio = delta / base['wall_sec'] if base['wall_sec'] else 0.0
+            flag = ''
+            if ratio > max_regression and delta > noise_sec:
+                flag = '  ⚠️ время'
+                regressions.append(f"{size}:{name}")
+            if s['http_requests'] > base['http_requests']:
+                flag += '  ⚠️ HTTP'
+                regressions.append(f"{size}:{name}")
+            print(f"  {size:>6} {name:<20} {base['wall_sec']:>8.2f} → {s['wall_sec']:>8.2f} с ({ratio:+.0%}), "
+                  f"HTTP {base['http_requests']} → {s['http_requests']}{flag}")
+    return sorted(set(regressions))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Замер синхронизации с Bitrix24 на фейковом портале')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='число заказов в Bitrix, через запятую')
+    parser.add_argument('--employees', type=int, default=300, help='сотрудников на портале')
+    parser.add_argument('--days', type=int, default=30, help='период sync_orders и разброс заказов, дней')
+    parser.add_argument('--push', type=int, default=100, help='сколько локальных заказов отправлять в _push_to_bitrix')
+    parser.add_argument('--latency-ms', type=float, default=0, help='задержка ответа портала')
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--rate-limit', type=float, default=0, help='лимит портала, запросов/с (0 — без лимита)')
+    parser.add_argument('--burst', type=int, default=50)
+    parser.add_argument('--error-rate', type=float, default=0, help='доля случайных 503')
+    parser.add_argument('--client-rps', type=float, default=None, help='лимит клиента fast_bitrix24, запросов/с')
+    parser.add_argument('--client-pool', type=int, default=50, help='запас запросов клиента fast_bitrix24')
+    parser.add_argument('--keep-pacing', action='store_true', help='не обнулять паузы BitrixSync после записи')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', type=Path, default=None, help='сохранить результат в JSON')
+    parser.add_argument('--compare', type=Path, default=None, help='сравнить с сохранённым JSON')
+    parser.add_argument('--max-regression', type=float, default=0.2, help='допустимый рост времени (доля)')
+    parser.add_argument('--noise-sec', type=float, default=0.2, help='рост времени меньше этого не считается регрессией')
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+    try:
+        sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    except ValueError:
+        parser.error("--sizes: ожидаются целые числа через запятую")
+
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    from fake_bitrix24_server import FakePortal
+
+    portal = FakePortal(employees=args.employees, orders=0, days=args.days, seed=args.seed)
+    server = FakeBitrixThread(portal, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                              rate_limit=args.rate_limit, burst=args.burst, error_rate=args.error_rate)
+    server.start()
+
+    # Окружение задаётся до импорта database/config/bitrix.sync — они читают его при импорте
+    BENCH_DIR.mkdir(parents=True, exist_ok=True)
+    DEFAULT_SQLITE.unlink(missing_ok=True)
+    os.environ['DATABASE_URL'] = f"sqlite:///{DEFAULT_SQLITE.resolve()}"
+    os.environ.setdefault('BOT_TOKEN', '123456:BENCH')
+    os.environ['BITRIX_WEBHOOK'] = server.webhook
+    os.environ['BITRIX_REST_WEBHOOK'] = server.webhook
+
+    from database import db
+
+    tune_sqlite(db)
+    reset_database(db)
+    # Проверка зависимостей до старта прогонов: сам модуль импортируется позже, в run_size
+    try:
+        importlib.import_module('bitrix.sync')
+    except ImportError as e:
+        server.stop()
+        raise SystemExit(f"bitrix/sync.py не импортируется — не установлена зависимость: {e}")
+
+    metrics = Metrics()
+    metrics.attach(db)
+    try:
+        result = {'sizes': asyncio.run(run_all(sizes, args, db, portal, server, metrics))}
+    finally:
+        server.stop()
+
+    result['meta'] = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'db_dialect': db.engine.dialect.name,
+        'employees': args.employees,
+        'days': args.days,
+        'latency_ms': args.latency_ms,
+        'rate_limit': args.rate_limit,
+        'client_rps': args.client_rps,
+        'keep_pacing': args.keep_pacing,
+        'python': platform.python_version(),
+    }
+    print_report(result)
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(result, ensure_ascii=False, indent=2, default=str), encoding='utf-8')
+        print(f"\nРезультат сохранён: {args.output}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding='utf-8'))
+        regressions = compare(result, baseline, args.max_regression, args.noise_sec)
+        if regressions:
+            print(f"\n❌ Регрессия: {', '.join(regressions)}")
+            return 1
+        print("\n✅ Регрессий нет")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
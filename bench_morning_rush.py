@@ -0,0 +1,594 @@
+"""
+Нагрузочный прогон «утреннего часа пик» (8:50–9:30) через настоящие обработчики.
+
+Синтетические сотрудники проходят типичный сценарий — посмотреть меню,
+заказать, добавить порцию, посмотреть заказы, отменить — в трёх фронтендах:
+- telegram: Application с настоящими handlers (menu_handlers, order_callbacks)
+  поверх фейкового транспорта Bot API (ответы собираются в памяти);
+- vk: обработчики vk_bot/handlers (menu, orders) с фейковыми Message/MessageEvent;
+- bitrix24: FastAPI-приложение bitrix24_bot через ASGI-транспорт httpx
+  (POST /webhook/bot → handle_message), без сети.
+
+БД — отдельная, засеивается заново: по умолчанию SQLite data/bench/morning_rush.db,
+либо --database-url postgresql://... (эта БД будет ОЧИЩЕНА, нужен --reset-db).
+SQLite пишет в один поток, поэтому его цифры годятся для сравнения коммитов между
+собой; поведение под конкуренцией за соединения смотрите на Postgres.
+Для SQLite async-хендлерам нужен aiosqlite (pip install aiosqlite).
+
+Отчёт: p50/p95/p99 и среднее по каждому действию, запросы к БД на действие,
+пропускная способность. --output сохраняет JSON (с хешем коммита), --compare
+сравнивает с сохранённым прогоном и завершает процесс с кодом 1 при регрессии.
+
+Использование:
+    python bench_morning_rush.py --users 300 --concurrency 50 --output data/bench/rush.json
+    python bench_morning_rush.py --users 300 --concurrency 50 --compare data/bench/rush.json
+    python bench_morning_rush.py --transports bitrix24 --database-url postgresql://bench@localhost/lunch_bench --reset-db
+
+По умолчанию дедлайны TIME_CONFIG сдвигаются на 23:59, чтобы прогон в любое время
+суток шёл по веткам «до 9:30»; --real-clock оставляет настоящие дедлайны.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import platform
+import statistics
+import subprocess
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from datetime import datetime, time as dt_time
+from collections import defaultdict
+from contextvars import ContextVar
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+BENCH_DIR = Path('data') / 'bench'
+DEFAULT_SQLITE = BENCH_DIR / 'morning_rush.db'
+TRANSPORTS = ('telegram', 'vk', 'bitrix24')
+
+# ID мессенджеров у синтетических сотрудников: база + порядковый номер
+TELEGRAM_ID_BASE = 7_000_000_000
+VK_ID_BASE = 800_000_000
+BITRIX_ID_BASE = 900_000
+
+logger = logging.getLogger('bench')
+
+# Текущее действие — к нему относятся SQL-запросы, выполненные во время его обработки
+_current_action = ContextVar('bench_action', default=None)
+
+
+# ---------------------------------------------------------------------------
+# Метрики
+# ---------------------------------------------------------------------------
+
+class Metrics:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(int)
+        self.errors = defaultdict(int)
+
+    def count_query(self, *_):
+        action = _current_action.get()
+        if action is not None:
+            self.queries[action] += 1
+
+    def attach(self, db):
+        from sqlalchemy import event
+        event.listen(db.engine, 'before_cursor_execute', self.count_query)
+        event.listen(db.async_engine.sync_engine, 'before_cursor_execute', self.count_query)
+
+    async def measure(self, action, coro_factory):
+        token = _current_action.set(action)
+        started = time.perf_counter()
+        try:
+            ok = await coro_factory()
+            if ok is False:
+                self.errors[action] += 1
+        except Exception as e:
+            self.errors[action] += 1
+            logger.debug(f"{action}: {e!r}")
+        finally:
+            self.latencies[action].append(time.perf_counter() - started)
+            _current_action.reset(token)
+
+    def summary(self, wall_sec):
+        actions = {}
+        for action, samples in sorted(self.latencies.items()):
+            ms = sorted(s * 1000 for s in samples)
+            if len(ms) > 1:
+                cuts = statistics.quantiles(ms, n=100, method='inclusive')
+                p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+            else:
+                p50 = p95 = p99 = ms[0]
+            actions[action] = {
+                'count': len(ms),
+                'p50_ms': round(p50, 2),
+                'p95_ms': round(p95, 2),
+                'p99_ms': round(p99, 2),
+                'mean_ms': round(statistics.fmean(ms), 2),
+                'queries_per_action': round(self.queries[action] / len(ms), 2),
+                'errors': self.errors[action],
+            }
+        total = sum(len(s) for s in self.latencies.values())
+        return {
+            'actions': actions,
+            'total': {
+                'actions': total,
+                'errors': sum(self.errors.values()),
+                'queries': sum(self.queries.values()),
+                'wall_sec': round(wall_sec, 3),
+                'throughput_per_sec': round(total / wall_sec, 1) if wall_sec else None,
+            },
+        }
+
+
+class ContextThreadPool(ThreadPoolExecutor):
+    """Executor для run_in_executor, переносящий contextvars в поток —
+    иначе запросы из _run_sync/run_in_executor не привязались бы к действию"""
+
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def tune_sqlite(db):
+    """WAL и ожидание блокировки: иначе параллельные записи SQLite сразу падают с 'database is locked'"""
+    from sqlalchemy import event
+
+    def _pragmas(dbapi_conn, _record):
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA busy_timeout=30000")
+        cursor.close()
+
+    for engine in (db.engine, db.async_engine.sync_engine):
+        event.listen(engine, 'connect', _pragmas)
+
+
+# ---------------------------------------------------------------------------
+# Подготовка БД
+# ---------------------------------------------------------------------------
+
+def seed_database(db, users):
+    """Чистая схема + сотрудники (со всеми мессенджерами), меню на все дни, приём заказов включён"""
+    from models import Base, User, Menu, BotSetting
+    from services.menu_service import DAYS_RU
+
+    Base.metadata.drop_all(bind=db.engine)
+    Base.metadata.create_all(bind=db.engine)
+    with db.get_session() as session:
+        session.add_all(
+            User(
+                full_name=f"Сотрудник{i:05d} Бенчмарк",
+                telegram_id=TELEGRAM_ID_BASE + i,
+                vk_id=VK_ID_BASE + i,
+                bitrix_id=BITRIX_ID_BASE + i,
+                location='Офис',
+                is_employee=True,
+                is_verified=True,
+                is_deleted=False,
+            )
+            for i in range(users)
+        )
+        session.add_all(
+            Menu(day=day, first_course='Борщ', main_course='Котлета с пюре', salad='Винегрет')
+            for day in DAYS_RU
+        )
+        session.add(BotSetting(setting_name='orders_enabled', setting_value='True'))
+
+
+def order_day_offset():
+    """Смещение до ближайшего дня приёма заказов (0 — сегодня)"""
+    from time_config import TIME_CONFIG
+    from services.calendar_service import workday_index
+
+    today = datetime.now(TIME_CONFIG.TIMEZONE).date()
+    entry = workday_index.get(today)
+    return 0 if entry.is_order_day else (entry.next_order_day - today).days
+
+
+# ---------------------------------------------------------------------------
+# Telegram: настоящий Application, фейковый Bot API
+# ---------------------------------------------------------------------------
+
+class TelegramDriver:
+    name = 'telegram'
+
+    def __init__(self):
+        from telegram.request import BaseRequest
+
+        class FakeTelegramRequest(BaseRequest):
+            """Отвечает на вызовы Bot API из памяти, ничего не отправляя в сеть"""
+
+            def __init__(self):
+                self.calls = defaultdict(int)
+                self._message_id = 0
+
+            @property
+            def read_timeout(self):
+                return None
+
+            async def initialize(self):
+                pass
+
+            async def shutdown(self):
+                pass
+
+            def _message(self, params):
+                self._message_id += 1
+                chat_id = params.get('chat_id') or 0
+                return {
+                    'message_id': self._message_id,
+                    'date': int(time.time()),
+                    'chat': {'id': int(chat_id), 'type': 'private'},
+                    'text': params.get('text') or '',
+                }
+
+            async def do_request(self, url, method, request_data=None, **kwargs):
+                endpoint = url.rsplit('/', 1)[-1]
+                self.calls[endpoint] += 1
+                params = request_data.parameters if request_data is not None else {}
+                if endpoint == 'getMe':
+                    result = {'id': 1, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot',
+                              'can_join_groups': False, 'can_read_all_group_messages': False,
+                              'supports_inline_queries': False}
+                elif endpoint.startswith(('send', 'edit')):
+                    result = self._message(params)
+                else:
+                    result = True
+                return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+        self.request = FakeTelegramRequest()
+        self.app = None
+        self._update_id = 0
+
+    async def start(self):
+        from telegram.ext import ApplicationBuilder
+        from bot_core import RequestScopedApplication
+        from config import CONFIG
+        from middleware import AccessControlHandler
+        from handlers import setup_handlers
+
+        self.app = (
+            ApplicationBuilder()
+            .application_class(RequestScopedApplication)
+            .token('123456:BENCH')
+            .request(self.request)
+            .get_updates_request(self.request)
+            .build()
+        )
+        self.app.bot_data['admin_ids'] = CONFIG.admin_ids
+        self.app.add_handler(AccessControlHandler(), group=-1)
+        setup_handlers(self.app)
+        await self.app.initialize()
+
+    async def stop(self):
+        if self.app is not None:
+            await self.app.shutdown()
+
+    def _user(self, index):
+        return {'id': TELEGRAM_ID_BASE + index, 'is_bot': False, 'first_name': f'Bench{index}'}
+
+    async def _process(self, payload):
+        from telegram import Update
+        self._update_id += 1
+        payload['update_id'] = self._update_id
+        await self.app.process_update(Update.de_json(payload, self.app.bot))
+
+    async def text(self, index, text):
+        user = self._user(index)
+        await self._process({'message': {
+            'message_id': self._update_id + 1, 'date': int(time.time()),
+            'chat': {'id': user['id'], 'type': 'private'}, 'from': user, 'text': text,
+        }})
+
+    async def callback(self, index, data):
+        user = self._user(index)
+        await self._process({'callback_query': {
+            'id': str(self._update_id + 1), 'from': user, 'chat_instance': 'bench', 'data': data,
+            'message': {'message_id': 1, 'date': int(time.time()),
+                        'chat': {'id': user['id'], 'type': 'private'}, 'text': 'menu'},
+        }})
+
+    def scenario(self, index, offset):
+        return [
+            ('menu_today', lambda: self.text(index, 'Меню на сегодня')),
+            ('order', lambda: self.callback(index, f'order_{offset}')),
+            ('change', lambda: self.callback(index, f'change_{offset}')),
+            ('inc', lambda: self.callback(index, f'inc_{offset}')),
+            ('view_orders', lambda: self.text(index, 'Просмотреть заказы')),
+            ('cancel', lambda: self.callback(index, f'cancel_{offset}')),
+        ]
+
+
+# ---------------------------------------------------------------------------
+# VK: обработчики vk_bot/handlers с фейковыми объектами vkbottle
+# ---------------------------------------------------------------------------
+
+class _FakeVkMessages:
+    def __init__(self):
+        self.sent = 0
+
+    async def send(self, **kwargs):
+        self.sent += 1
+        return self.sent
+
+
+class _FakeVkMessage:
+    def __init__(self, api, vk_id, text):
+        self.ctx_api = api
+        self.from_id = vk_id
+        self.peer_id = vk_id
+        self.text = text
+
+    async def answer(self, text=None, **kwargs):
+        return await self.ctx_api.messages.send(peer_id=self.peer_id, message=text, **kwargs)
+
+
+class _FakeVkEvent:
+    def __init__(self, api, vk_id, payload):
+        self.ctx_api = api
+        self.object = SimpleNamespace(payload=payload, peer_id=vk_id, user_id=vk_id,
+                                      event_id='bench', conversation_message_id=1)
+
+    async def show_snackbar(self, text):
+        return True
+
+    async def send_empty_answer(self):
+        return True
+
+    async def edit_message(self, message=None, **kwargs):
+        return True
+
+    async def send_message(self, message=None, **kwargs):
+        return await self.ctx_api.messages.send(peer_id=self.object.peer_id, message=message, **kwargs)
+
+
+class VkDriver:
+    name = 'vk'
+
+    def __init__(self):
+        self.api = SimpleNamespace(messages=_FakeVkMessages())
+
+    async def start(self):
+        from vk_bot.handlers import menu, orders
+        self.menu = menu
+        self.orders = orders
+
+    async def stop(self):
+        pass
+
+    async def _scoped(self, handler, obj):
+        # Как RequestScopeMiddleware в vk_bot/main.py
+        from database import db
+        with db.request_scope("vk"):
+            await handler(obj)
+
+    def scenario(self, index, offset):
+        vk_id = VK_ID_BASE + index
+
+        def event(cmd):
+            return self._scoped(self.orders.on_order_callback, _FakeVkEvent(self.api, vk_id, {'cmd': cmd, 'd': offset}))
+
+        return [
+            ('menu_today', lambda: self._scoped(self.menu.show_today_menu, _FakeVkMessage(self.api, vk_id, 'Меню на сегодня'))),
+            ('order', lambda: event('order')),
+            ('inc', lambda: event('inc')),
+            ('cancel', lambda: event('cancel')),
+        ]
+
+
+# ---------------------------------------------------------------------------
+# Bitrix24: FastAPI-приложение через ASGI-транспорт
+# ---------------------------------------------------------------------------
+
+class Bitrix24Driver:
+    name = 'bitrix24'
+
+    async def start(self):
+        import httpx
+        from bitrix24_bot.main import app
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://bench')
+
+    async def stop(self):
+        await self.client.aclose()
+
+    async def send(self, index, text):
+        user_id = BITRIX_ID_BASE + index
+        response = await self.client.post('/webhook/bot', data={
+            'data[PARAMS][DIALOG_ID]': str(user_id),
+            'data[PARAMS][FROM_USER_ID]': str(user_id),
+            'data[PARAMS][MESSAGE]': text,
+        })
+        return response.status_code == 200 and 'Ошибка' not in response.text[:200]
+
+    def scenario(self, index, offset):
+        return [
+            ('menu_today', lambda: self.send(index, 'меню на сегодня')),
+            ('order', lambda: self.send(index, f'заказать день {offset}')),
+            ('inc', lambda: self.send(index, f'добавить день {offset}')),
+            ('view_orders', lambda: self.send(index, 'мои заказы')),
+            ('cancel', lambda: self.send(index, f'отменить день {offset}')),
+        ]
+
+
+DRIVERS = {'telegram': TelegramDriver, 'vk': VkDriver, 'bitrix24': Bitrix24Driver}
+
+
+# ---------------------------------------------------------------------------
+# Прогон
+# ---------------------------------------------------------------------------
+
+async def run_rush(args, metrics):
+    drivers = []
+    for name in args.transports:
+        try:
+            driver = DRIVERS[name]()
+            await driver.start()
+            drivers.append(driver)
+        except ImportError as e:
+            logger.warning(f"⚠️ Транспорт {name} пропущен — не установлена зависимость: {e}")
+    if not drivers:
+        raise SystemExit("Ни один транспорт не удалось запустить")
+
+    asyncio.get_running_loop().set_default_executor(ContextThreadPool())
+    offset = order_day_offset()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    rng = random.Random(args.seed)
+
+    async def employee(index):
+        driver = drivers[index % len(drivers)]
+        # Приход сотрудников размазан по --ramp секундам, как реальный час пик
+        await asyncio.sleep(rng.uniform(0, args.ramp))
+        async with semaphore:
+            for action, step in driver.scenario(index, offset):
+                await metrics.measure(f"{driver.name}:{action}", step)
+                if args.think_ms:
+                    await asyncio.sleep(args.think_ms / 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(employee(i) for i in range(args.users)))
+    wall = time.perf_counter() - started
+
+    for driver in drivers:
+        await driver.stop()
+    return wall, [driver.name for driver in drivers]
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def print_report(result):
+    print(f"\nКоммит {result['meta']['commit']}, БД {result['meta']['db_dialect']}, "
+          f"сотрудников {result['meta']['users']}, параллельно {result['meta']['concurrency']}")
+    header = f"{'действие':<26}{'n':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'mean':>9}{'SQL/д':>8}{'ошибки':>8}"
+    print(header)
+    print('-' * len(header))
+    for action, s in result['actions'].items():
+        print(f"{action:<26}{s['count']:>6}{s['p50_ms']:>9.1f}{s['p95_ms']:>9.1f}{s['p99_ms']:>9.1f}"
+              f"{s['mean_ms']:>9.1f}{s['queries_per_action']:>8.1f}{s['errors']:>8}")
+    total = result['total']
+    print(f"\nВсего действий: {total['actions']} за {total['wall_sec']:.2f} с "
+          f"({total['throughput_per_sec']} действий/с), SQL-запросов: {total['queries']}, ошибок: {total['errors']}")
+
+
+def compare(result, baseline, max_regression, noise_ms):
+    """Сравнение с сохранённым прогоном: рост p95 сверх порога или рост числа SQL — регрессия"""
+    regressions = []
+    print(f"\nСравнение с {baseline['meta'].get('commit')}:")
+    for action, s in result['actions'].items():
+        base = baseline['actions'].get(action)
+        if not base:
+            continue
+        delta = s['p95_ms'] - base['p95_ms']
+        ratio = delta / base['p95_ms'] if base['p95_ms'] else 0.0
+        queries_delta = s['queries_per_action'] - base['queries_per_action']
+        flag = ''
+        if ratio > max_regression and delta > noise_ms:
+            flag = '  ⚠️ p95'
+            regressions.append(action)
+        if queries_delta > 0.01:
+            flag += '  ⚠️ SQL'
+            regressions.append(action)
+        print(f"  {action:<26} p95 {base['p95_ms']:>8.1f} → {s['p95_ms']:>8.1f} мс ({ratio:+.0%}), "
+              f"SQL {base['queries_per_action']:.1f} → {s['queries_per_action']:.1f}{flag}")
+    return sorted(set(regressions))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный прогон утреннего часа пик')
+    parser.add_argument('--users', type=int, default=200, help='число синтетических сотрудников')
+    parser.add_argument('--concurrency', type=int, default=40, help='сколько сотрудников действуют одновременно')
+    parser.add_argument('--ramp', type=float, default=2.0, help='за сколько секунд приходят все сотрудники')
+    parser.add_argument('--think-ms', type=int, default=0, help='пауза между действиями одного сотрудника')
+    parser.add_argument('--transports', default=','.join(TRANSPORTS), help='telegram,vk,bitrix24')
+    parser.add_argument('--database-url', default=None, help=f'БД для прогона (по умолчанию SQLite {DEFAULT_SQLITE})')
+    parser.add_argument('--reset-db', action='store_true', help='разрешить очистку БД, заданной --database-url')
+    parser.add_argument('--real-clock', action='store_true', help='не сдвигать дедлайны заказов')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', type=Path, default=None, help='сохранить результат в JSON')
+    parser.add_argument('--compare', type=Path, default=None, help='сравнить с сохранённым JSON')
+    parser.add_argument('--max-regression', type=float, default=0.2, help='допустимый рост p95 (доля)')
+    parser.add_argument('--noise-ms', type=float, default=2.0, help='рост p95 меньше этого не считается регрессией')
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+    args.transports = [t.strip() for t in args.transports.split(',') if t.strip()]
+    unknown = set(args.transports) - set(TRANSPORTS)
+    if unknown:
+        parser.error(f"неизвестные транспорты: {sorted(unknown)}")
+
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    # Окружение задаётся до импорта database/config — они читают его при импорте
+    if args.database_url:
+        if not args.database_url.startswith('sqlite') and not args.reset_db:
+            parser.error("БД из --database-url будет очищена — подтвердите флагом --reset-db")
+        database_url = args.database_url
+    else:
+        BENCH_DIR.mkdir(parents=True, exist_ok=True)
+        DEFAULT_SQLITE.unlink(missing_ok=True)
+        database_url = f"sqlite:///{DEFAULT_SQLITE.resolve()}"
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.setdefault('BOT_TOKEN', '123456:BENCH')
+
+    from database import db
+    from time_config import TIME_CONFIG
+
+    if db.engine.dialect.name == 'sqlite':
+        tune_sqlite(db)
+    seed_database(db, args.users)
+    from config import CONFIG
+    if CONFIG is None:
+        raise SystemExit("CONFIG не создан — проверьте окружение")
+    CONFIG.reload(force=True)
+
+    if not args.real_clock:
+        TIME_CONFIG.ORDER_DEADLINE = dt_time(23, 59, 59)
+        TIME_CONFIG.MODIFICATION_DEADLINE = dt_time(23, 59, 59)
+
+    metrics = Metrics()
+    metrics.attach(db)
+    wall, transports = asyncio.run(run_rush(args, metrics))
+
+    result = metrics.summary(wall)
+    result['meta'] = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'db_dialect': db.engine.dialect.name,
+        'users': args.users,
+        'concurrency': args.concurrency,
+        'ramp_sec': args.ramp,
+        'think_ms': args.think_ms,
+        'transports': transports,
+        'real_clock': args.real_clock,
+        'python': platform.python_version(),
+    }
+    print_report(result)
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"\nРезультат сохранён: {args.output}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding='utf-8'))
+        regressions = compare(result, baseline, args.max_regression, args.noise_ms)
+        if regressions:
+            print(f"\n❌ Регрессия: {', '.join(regressions)}")
+            return 1
+        print("\n✅ Регрессий нет")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,13 +3,13 @@ import os
 import asyncio
 from fast_bitrix24 import Bitrix
 from dotenv import load_dotenv
-import pandas as pd
 import logging
 from datetime import datetime, timedelta
 from bitrix.sync import BitrixSync
 from database import db
 from models import User
 from sqlalchemy import text
+import metrics
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -38,10 +38,11 @@ def map_location(location_id):
     }
     return location_map.get(str(location_id), 'Неизвестно')
 
+@metrics.track_report('bitrix_monthly_orders')
 async def export_monthly_orders(year=None, month=None):
     """Экспорт заказов обедов из Bitrix24 за указанный месяц"""
     try:
-        bx = Bitrix(WEBHOOK)
+        bx = metrics.InstrumentedBitrix(Bitrix(WEBHOOK))
         logger.info("Подключение к Bitrix24 установлено")
 
         now = datetime.now()
@@ -116,6 +117,7 @@ async def export_monthly_orders(year=None, month=None):
                 'Время_заказа': created_time.split('T')[1][:8] if 'T' in created_time else ''
             })
 
+        import pandas as pd
         df = pd.DataFrame(processed_data)
         df = df.sort_values(by=['ID_заказа_Bitrix'])
 
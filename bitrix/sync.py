@@ -11,7 +11,7 @@ from dotenv import load_dotenv
 from database import db
 from config import CONFIG
 from models import User, Order, BitrixMapping
-from sqlalchemy import text
+from sqlalchemy import text, select, update
 import json
 import requests
 import ssl
@@ -19,6 +19,9 @@ import urllib3
 import aiohttp
 import warnings
 from time_config import TIME_CONFIG
+import metrics
+from bitrix import sync_stats
+from services.order_service import invalidate_user_stats
 
 # Отключаем SSL предупреждения для requests
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -35,6 +38,11 @@ logging.getLogger('bitrix.sync').setLevel(logging.INFO)  # или DEBUG для 
 logging.getLogger('fast_bitrix24').setLevel(logging.WARNING)
 
 class BitrixSync:
+    # Паузы после записи в Bitrix — берегут лимит запросов портала.
+    # Бенчмарк (bench_bitrix_sync.py) обнуляет их, чтобы мерить саму синхронизацию.
+    CREATE_PACING_SEC = 1.0
+    UPDATE_PACING_SEC = 0.5
+
     def __init__(self, bot_application=None):
         """Инициализация подключения к Bitrix24 с нормальным SSL"""
         try:
@@ -51,7 +59,8 @@ class BitrixSync:
             os.environ['NO_PROXY'] = 'b24.epc.su,b24dev.ru,localhost,127.0.0.1,192.168.0.0/16,172.17.0.0/16'
             os.environ['no_proxy'] = os.environ['NO_PROXY']
             
-            self.bx = Bitrix(self.webhook)
+            # Вызовы REST считаются по методам (bot_bitrix_calls_total и др.)
+            self.bx = metrics.InstrumentedBitrix(Bitrix(self.webhook))
             
             # Восстанавливаем прокси для остальных компонентов
             for k, v in saved_proxy.items():
@@ -79,7 +88,7 @@ class BitrixSync:
             }
             
             logger.info("✅ Подключение к Bitrix24 инициализировано (SSL включен)")
-            self.scheduler = AsyncIOScheduler(timezone=TIME_CONFIG.TIMEZONE)
+            self.scheduler = metrics.instrument_scheduler(AsyncIOScheduler(timezone=TIME_CONFIG.TIMEZONE))
             self.is_running = False
             
             # 🔥 ДОБАВЛЯЕМ: флаг для отслеживания активных сессий
@@ -210,6 +219,9 @@ class BitrixSync:
                         if failed_count > 0:
                             detailed_msg += f"❌ Не отправлено заказов: {failed_count}\n"
                         detailed_msg += "⏰ Следующая попытка через несколько минут\n\n"
+                        last_push = sync_stats.last_run('push')
+                        if last_push:
+                            detailed_msg += f"{sync_stats.summary_text(last_push)}\n\n"
                         detailed_msg += "💡 Запустите отправку вручную: /manual_sync"
                         
                         keyboard = InlineKeyboardMarkup([[
@@ -251,6 +263,9 @@ class BitrixSync:
             if failed_count > 0:
                 detailed_msg += f"❌ Не отправлено заказов: {failed_count}\n"
             detailed_msg += "⏰ Следующая автоматическая попытка через несколько минут\n\n"
+            last_push = sync_stats.last_run('push')
+            if last_push:
+                detailed_msg += f"{sync_stats.summary_text(last_push)}\n\n"
             detailed_msg += "💡 Вы можете запустить отправку вручную прямо сейчас:"
             
             # Создаем кнопку для ручной отправки
@@ -286,14 +301,20 @@ class BitrixSync:
                     Order.is_from_bitrix == False
                 ).all()
                 
-                return {
+                info = {
                     'count': len(pending_orders),
                     'order_ids': [order.id for order in pending_orders],
                     'date': today
                 }
+
+            # Последний прогон отправки: где ушло время (этапы, вызовы Bitrix)
+            last_push = sync_stats.last_run('push')
+            info['last_push'] = last_push
+            info['last_push_summary'] = sync_stats.summary_text(last_push) if last_push else ''
+            return info
         except Exception as e:
             logger.error(f"Ошибка получения информации о неотправленных заказах: {e}")
-            return {'count': 0, 'order_ids': [], 'date': None}
+            return {'count': 0, 'order_ids': [], 'date': None, 'last_push': None, 'last_push_summary': ''}
 
     async def _notify_admin(self, message: str, context: ContextTypes.DEFAULT_TYPE = None):
         """Улучшенная версия уведомления администраторов с использованием существующей логики"""
@@ -344,6 +365,7 @@ class BitrixSync:
             end_date.strftime('%Y-%m-%d')
         )
 
+    @sync_stats.tracked_run('employees')
     async def sync_employees(self) -> Dict[str, int]:
         """Синхронизация всех сотрудников из Bitrix REST API с улучшенным сопоставлением"""
         stats = {
@@ -414,7 +436,7 @@ class BitrixSync:
             entity_1120_map = await self._get_entity_1120_employees()
 
             # 4. Получаем всех существующих сотрудников из базы
-            with db.get_session() as session:
+            with sync_stats.stage('resolve'), db.get_session() as session:
                 existing_employees = session.query(User).filter(
                     User.is_employee == True
                 ).all()
@@ -476,6 +498,12 @@ class BitrixSync:
             
             logger.info(f"Синхронизация сотрудников завершена. Статистика: {stats}")
 
+            if stats['updated'] or stats['added'] or stats['merged']:
+                from config_notify import notify_config_changed
+                if CONFIG is not None:
+                    CONFIG.refresh('staff')
+                notify_config_changed('staff')
+
             # Синхронизация enum-поля 'Сотрудник' в CRM (отключено до проверки API)
             # try:
             #     enum_stats = await self.sync_crm_enum_field(rest_employees, entity_1120_map)
@@ -489,6 +517,7 @@ class BitrixSync:
             logger.error(f"Ошибка синхронизации сотрудников: {e}", exc_info=True)
             return stats
 
+    @sync_stats.tracked_run('orders')
     async def sync_orders(self, start_date: str, end_date: str, incremental: bool = True) -> Dict[str, int]:
         """Синхронизирует заказы из Bitrix в локальную базу"""
         stats = {
@@ -531,6 +560,7 @@ class BitrixSync:
             logger.error(f"Ошибка синхронизации заказов: {e}")
             return stats
 
+    @sync_stats.staged('fetch')
     async def _get_bitrix_orders(self, start_date: str, end_date: str) -> List[Dict]:
         params = {
             'entityTypeId': 1222,
@@ -575,6 +605,7 @@ class BitrixSync:
                 except asyncio.TimeoutError:
                     logger.warning(f"Таймаут при получении заказов (попытка {attempt + 1}/3)")
                     if attempt < 2:
+                        sync_stats.retry('crm.item.list')
                         await asyncio.sleep(5)
                     else:
                         raise
@@ -583,6 +614,7 @@ class BitrixSync:
             logger.error(f"Ошибка получения заказов после 3 попыток: {e}")
             return []
 
+    @sync_stats.staged('parse')
     def _parse_bitrix_order(self, order: Dict) -> Optional[Dict]:
         """Парсит данные заказа из Bitrix с приоритетом для CRM crm_employee_id"""
         try:
@@ -695,14 +727,15 @@ class BitrixSync:
             # 🔥 ИЗМЕНЕНИЕ: Ищем заказ ТОЛЬКО по bitrix_order_id
             existing_order = None
             if bitrix_id:
-                existing_order = self._find_local_order(bitrix_id)
+                existing_order = await self._find_local_order_async(bitrix_id)
             
             order_id = None
             success = False
             
             if existing_order:
                 order_id = existing_order['id']
-                success = self._update_local_order(order_id, order)
+                # Синхронные ORM-операции — в пуле потоков, чтобы не блокировать event loop
+                success = await asyncio.to_thread(self._update_local_order, order_id, order)
                 if success:
                     stats['updated'] += 1
                     logger.info(f"✅ Обновлен заказ {bitrix_id}")
@@ -714,7 +747,7 @@ class BitrixSync:
                 stats['skipped'] += 1
                 return
             else:
-                success = self._add_local_order(user_id, order)
+                success = await asyncio.to_thread(self._add_local_order, user_id, order)
                 if success:
                     stats['added'] += 1
                     logger.info(f"✅ Добавлен заказ {bitrix_id}")
@@ -726,12 +759,12 @@ class BitrixSync:
                 await self._update_user_location(user_id, order['location'])
 
             if success and order_id:
-                with db.get_session() as session:
-                    session.execute(
-                        text("UPDATE orders SET last_synced_at = CURRENT_TIMESTAMP WHERE id = :order_id"),
-                        {'order_id': order_id}
-                    )
-                    session.commit()
+                with sync_stats.stage('db_write'):
+                    async with db.get_async_session() as session:
+                        await session.execute(
+                            text("UPDATE orders SET last_synced_at = CURRENT_TIMESTAMP WHERE id = :order_id"),
+                            {'order_id': order_id}
+                        )
 
             stats['processed'] += 1
 
@@ -739,6 +772,7 @@ class BitrixSync:
             logger.error(f"❌ Критическая ошибка обработки заказа {order.get('bitrix_id', 'unknown')}: {str(e)}")
             stats['errors'] += 1
 
+    @sync_stats.staged('resolve')
     async def _find_user_by_crm_id_via_name(self, crm_id: str) -> Optional[int]:
         """Ищет пользователя по CRM ID через поиск по имени в CRM с учетом ФИО и обновляет crm_employee_id"""
         try:
@@ -837,14 +871,15 @@ class BitrixSync:
             logger.error(f"Ошибка поиска пользователя по CRM ID через имя: {e}")
             return None
 
+    @sync_stats.staged('resolve')
     async def _get_local_user_id(self, bitrix_id: str) -> Optional[int]:
         """Находит локальный ID пользователя по Bitrix ID"""
         try:
-            with db.get_session() as session:
-                user = session.query(User).filter(
-                    User.bitrix_id == bitrix_id
-                ).first()
-                return user.id if user else None
+            async with db.get_async_session() as session:
+                # asyncpg не приводит типы сам — Bitrix ID приходит строкой
+                return await session.scalar(
+                    select(User.id).where(User.bitrix_id == int(bitrix_id)).limit(1)
+                )
         except Exception as e:
             logger.error(f"Ошибка поиска пользователя: {e}")
             return None
@@ -869,6 +904,21 @@ class BitrixSync:
             logger.error(f"Ошибка поиска заказа: {e}")
             return None
         
+    @sync_stats.staged('resolve')
+    async def _find_local_order_async(self, bitrix_id: str) -> Optional[Dict]:
+        """_find_local_order() через AsyncSession — для async-пути синхронизации"""
+        try:
+            async with db.get_async_session() as session:
+                row = (await session.execute(
+                    select(Order.id, Order.user_id, Order.bitrix_order_id, Order.quantity, Order.is_cancelled)
+                    .where(Order.bitrix_order_id == str(bitrix_id))
+                    .limit(1)
+                )).first()
+                return dict(row._mapping) if row else None
+        except Exception as e:
+            logger.error(f"Ошибка поиска заказа: {e}")
+            return None
+
     def _get_full_order(self, order_id: int) -> Optional[Dict]:
         """Возвращает полные данные заказа по ID, включая user_id и target_date"""
         try:
@@ -885,6 +935,7 @@ class BitrixSync:
             logger.error(f"Ошибка получения полных данных заказа {order_id}: {e}")
             return None
 
+    @sync_stats.staged('db_write')
     def _update_local_order(self, order_id: int, order: Dict) -> bool:
         """Обновляет локальный заказ - С ОТЛАДКОЙ"""
         try:
@@ -909,6 +960,7 @@ class BitrixSync:
                     if real_changes:
                         db_order.updated_at = datetime.now()
                         db_order.last_synced_at = datetime.now()
+                        invalidate_user_stats(db_order.user_id, session)
                         session.commit()
                         logger.info(f"✅ Реальные изменения в заказе {order_id}")
                         return True
@@ -926,6 +978,7 @@ class BitrixSync:
             logger.error(f"❌ Ошибка обновления заказа {order_id}: {e}")
             return False
 
+    @sync_stats.staged('db_write')
     def _add_local_order(self, user_id: int, order: Dict) -> bool:
         """Добавляет новый заказ - РАЗРЕШАЕМ НЕСКОЛЬКО ЗАКАЗОВ В ДЕНЬ"""
         try:
@@ -993,6 +1046,7 @@ class BitrixSync:
                 )
                 
                 session.add(new_order)
+                invalidate_user_stats(user_id, session)
                 session.commit()
                 
                 logger.info(f"✅ Успешно добавлен заказ Bitrix ID: {bitrix_id}")
@@ -1002,24 +1056,26 @@ class BitrixSync:
             logger.error(f"❌ Ошибка добавления заказа: {e}", exc_info=True)
             return False
     
+    @sync_stats.staged('db_write')
     async def _update_user_location(self, user_id: int, location: str) -> bool:
         """Обновляет локацию пользователя"""
         try:
-            with db.get_session() as session:
+            async with db.get_async_session() as session:
                 # Очищаем локацию перед обновлением
                 clean_location = self._clean_string(location)
                 
-                user = session.query(User).filter(User.id == user_id).first()
-                if user and user.location != clean_location:
-                    user.location = clean_location
-                    user.updated_at = datetime.now()
-                    session.commit()
-                    return True
-                return False
+                # Один UPDATE вместо SELECT + UPDATE; строка не трогается, если локация та же
+                result = await session.execute(
+                    update(User)
+                    .where(User.id == user_id, User.location.is_distinct_from(clean_location))
+                    .values(location=clean_location, updated_at=datetime.now())
+                )
+                return result.rowcount > 0
         except Exception as e:
             logger.error(f"Ошибка обновления локации пользователя {user_id}: {e}")
             return False
 
+    @sync_stats.staged('fetch')
     async def _get_crm_employees(self) -> List[Dict[str, str]]:
         """Получаем список сотрудников из CRM Bitrix"""
         try:
@@ -1161,6 +1217,7 @@ class BitrixSync:
         '1657': ('08:30', '17:30'),
     }
 
+    @sync_stats.staged('fetch')
     async def _get_entity_1120_employees(self) -> Dict[str, Dict]:
         """
         Получает данные сотрудников из сущности 1120 (HR-карточки).
@@ -1410,17 +1467,19 @@ class BitrixSync:
         logger.debug(f"Нормализация имени: '{name}' -> '{normalized}'")
         return normalized
     
+    @sync_stats.tracked_run('push')
     async def _push_to_bitrix(self) -> bool:
         """Отправка заказов в Bitrix с правильным управлением сессиями"""
         if self._push_lock.locked():
             logger.warning("⏳ _push_to_bitrix уже выполняется, пропускаем")
+            sync_stats.update_stats(skipped_locked=1)
             return True
         async with self._push_lock:
             try:
                 today = datetime.now(TIME_CONFIG.TIMEZONE).date().isoformat()
 
                 # 🔥 ШАГ 1: Получаем ID заказов (не объекты!)
-                with db.get_session() as session:
+                with sync_stats.stage('resolve'), db.get_session() as session:
                     orders_ids = session.query(Order.id).filter(
                         Order.is_sent_to_bitrix == False,
                         Order.is_cancelled == False,
@@ -1434,6 +1493,7 @@ class BitrixSync:
 
                 if not order_ids_list:
                     logger.info("📦 Нет заказов для отправки в Bitrix24")
+                    sync_stats.update_stats(total=0, sent=0, errors=0)
                     return True
 
                 logger.info(f"📤 Найдено {len(order_ids_list)} заказов для отправки")
@@ -1447,24 +1507,26 @@ class BitrixSync:
                     try:
                         # Открываем новую сессию для каждого заказа
                         with db.get_session() as order_session:
-                            order = order_session.query(Order).filter(
-                                Order.id == order_id,
-                                Order.is_sent_to_bitrix == False,
-                                Order.bitrix_order_id == None,
-                            ).first()
+                            with sync_stats.stage('resolve'):
+                                order = order_session.query(Order).filter(
+                                    Order.id == order_id,
+                                    Order.is_sent_to_bitrix == False,
+                                    Order.bitrix_order_id == None,
+                                ).first()
+
+                                if order:
+                                    # 🔥 Принудительно обновляем объект из БД, чтобы получить актуальные данные
+                                    order_session.refresh(order)
+
+                                    # Получаем пользователя в той же сессии
+                                    user = order_session.query(User).filter(
+                                        User.id == order.user_id
+                                    ).first()
 
                             if not order:
                                 logger.info(f"Заказ {order_id} уже отправлен или не найден, пропускаем")
                                 continue
 
-                            # 🔥 Принудительно обновляем объект из БД, чтобы получить актуальные данные
-                            order_session.refresh(order)
-
-                            # Получаем пользователя в той же сессии
-                            user = order_session.query(User).filter(
-                                User.id == order.user_id
-                            ).first()
-
                             if not user or not user.bitrix_id:
                                 logger.warning(f"❌ Пользователь для заказа {order_id} не найден или нет Bitrix ID")
                                 error_count += 1
@@ -1503,7 +1565,7 @@ class BitrixSync:
                                 existing_local_order_id = None
                                 existing_local_cancelled = False
                                 existing_local_quantity = 0
-                                with db.get_session() as check_session:
+                                with sync_stats.stage('resolve'), db.get_session() as check_session:
                                     # 🔥 ИСПРАВЛЕНИЕ: Ищем отменённый заказ этого пользователя на эту дату
                                     # по user_id + target_date, а НЕ по bitrix_order_id.
                                     # Это нужно потому что при отмене заказа мы очищаем bitrix_order_id (Fix 1),
@@ -1563,7 +1625,7 @@ class BitrixSync:
                                         logger.info(f"✅ Заказ {order_id}: Bitrix заказ {existing_bitrix_id} обновлён, привязываем к новому локальному заказу")
                                         # 🔥 ИСПРАВЛЕНИЕ: очищаем bitrix_order_id у старого отменённого заказа,
                                         # чтобы избежать IntegrityError при сохранении bitrix_order_id на новом заказе
-                                        with db.get_session() as cleanup_session:
+                                        with sync_stats.stage('db_write'), db.get_session() as cleanup_session:
                                             old_order = cleanup_session.query(Order).filter(
                                                 Order.id == existing_local_order_id
                                             ).first()
@@ -1626,7 +1688,8 @@ class BitrixSync:
                                     logger.warning(f"🔍 DIAG push: заказ {existing_with_same_id[0]} уже имеет bitrix_order_id={bitrix_id}, "
                                                    f"ожидается IntegrityError при commit")
                                 try:
-                                    order_session.commit()
+                                    with sync_stats.stage('db_write'):
+                                        order_session.commit()
                                     success_count += 1
                                     # 🔍 ДИАГНОСТИКА: проверяем состояние заказа ПОСЛЕ успешного commit
                                     logger.info(f"✅ УСПЕШНО: Заказ {order_id} -> Bitrix ID: {bitrix_id}")
@@ -1714,6 +1777,7 @@ class BitrixSync:
                         failed_order_ids.append(order_id)
 
                 logger.info(f"📤 Итог отправки: Успешно: {success_count}, Ошибок: {error_count}")
+                sync_stats.update_stats(total=len(order_ids_list), sent=success_count, errors=error_count)
 
                 # 🔥 ШАГ 3: Сохраняем информацию о неотправленных заказах
                 if failed_order_ids:
@@ -1729,6 +1793,7 @@ class BitrixSync:
                 logger.error(f"❌ Критическая ошибка в _push_to_bitrix: {str(e)}", exc_info=True)
                 return False
 
+    @sync_stats.staged('remote_write')
     async def _create_bitrix_order(self, order_data: dict, user_crm_id: str = None) -> Optional[str]:
         """Создает заказ в Bitrix24 - ИСПРАВЛЕННАЯ ВЕРСИЯ"""
         try:
@@ -1804,7 +1869,8 @@ class BitrixSync:
             logger.info(f"✅ Успешно создан заказ в Bitrix: {result['id']}")
             
             # 🔥 ДОБАВЬТЕ: небольшую задержку между запросами
-            await asyncio.sleep(1.0)  # Увеличил задержку до 1 секунды
+            with sync_stats.stage('pacing'):
+                await asyncio.sleep(self.CREATE_PACING_SEC)
 
             return str(result['id'])
             
@@ -1812,6 +1878,7 @@ class BitrixSync:
             logger.error(f"❌ Ошибка создания заказа в Bitrix: {str(e)}", exc_info=True)
             return None
 
+    @sync_stats.staged('remote_write')
     async def _update_bitrix_order(self, bitrix_id: str, order_data: dict, user_crm_id: str = None) -> bool:
         """Обновляет существующий заказ в Bitrix24 (количество, статус отмены).
         Используется когда пользователь отменил заказ и создал новый на ту же дату,
@@ -1866,7 +1933,8 @@ class BitrixSync:
             
             if result:
                 logger.info(f"✅ Успешно обновлён заказ в Bitrix: {bitrix_id}, поля: {list(fields.keys())}")
-                await asyncio.sleep(0.5)
+                with sync_stats.stage('pacing'):
+                    await asyncio.sleep(self.UPDATE_PACING_SEC)
                 return True
             else:
                 logger.error(f"❌ Пустой ответ при обновлении заказа {bitrix_id} в Bitrix")
@@ -1876,6 +1944,7 @@ class BitrixSync:
             logger.error(f"❌ Ошибка обновления заказа {bitrix_id} в Bitrix: {str(e)}", exc_info=True)
             return False
 
+    @sync_stats.staged('remote_write')
     async def _cancel_bitrix_order(self, bitrix_id: str) -> bool:
         """Отменяет заказ в Bitrix24, устанавливая статус 'Нет' (отменён).
         Вызывается при отмене заказа пользователем в боте, если заказ уже был отправлен в Bitrix."""
@@ -1892,7 +1961,8 @@ class BitrixSync:
             
             if result:
                 logger.info(f"✅ Успешно отменён заказ в Bitrix: {bitrix_id}")
-                await asyncio.sleep(0.5)
+                with sync_stats.stage('pacing'):
+                    await asyncio.sleep(self.UPDATE_PACING_SEC)
                 return True
             else:
                 logger.error(f"❌ Пустой ответ при отмене заказа {bitrix_id} в Bitrix")
@@ -1902,6 +1972,7 @@ class BitrixSync:
             logger.error(f"❌ Ошибка отмены заказа {bitrix_id} в Bitrix: {str(e)}", exc_info=True)
             return False
 
+    @sync_stats.staged('fetch')
     async def _find_existing_bitrix_order(self, order_data: dict, crm_employee_id: str = None) -> Optional[str]:
         """Ищет заказ в Bitrix для данного пользователя на данную дату.
         Возвращает Bitrix ID если заказ уже существует, иначе None."""
@@ -1970,6 +2041,7 @@ class BitrixSync:
 
     # Добавить новый метод для получения сотрудников через REST API
     # Закоментировал на время просроченого сертификата
+    @sync_stats.staged('fetch')
     async def _get_rest_employees(self) -> List[Dict]:
         """Получает сотрудников через REST API с датой трудоустройства"""
         import requests
@@ -1986,7 +2058,8 @@ class BitrixSync:
                 
                 def fetch_deps(start=0):
                     params = {'start': start}
-                    response = requests.get(self.rest_webhook + 'department.get', params=params, proxies=_no_proxy)
+                    with metrics.track_bitrix('department.get'):
+                        response = requests.get(self.rest_webhook + 'department.get', params=params, proxies=_no_proxy)
                     data = response.json()
                     
                     if 'result' in data and data['result']:
@@ -2014,7 +2087,8 @@ class BitrixSync:
                     'FILTER[USER_TYPE]': 'employee',
                     'start': start
                 }
-                user_response = requests.get(self.rest_webhook + 'user.get', params=params, proxies=_no_proxy)
+                with metrics.track_bitrix('user.get'):
+                    user_response = requests.get(self.rest_webhook + 'user.get', params=params, proxies=_no_proxy)
                 user_data = user_response.json()
 
                 if 'result' not in user_data or not user_data['result']:
@@ -2101,12 +2175,15 @@ class BitrixSync:
             logger.error(f"Ошибка проверки пользователя по Bitrix ID: {e}")
             return False
         
+    @sync_stats.staged('resolve')
     async def _get_local_user_id_by_crm_id(self, crm_employee_id: str) -> Optional[int]:
         """Находит локальный ID пользователя по CRM crm_employee_id"""
         try:
-            with db.get_session() as session:
-                user = session.query(User).filter(User.crm_employee_id == crm_employee_id).first()
-                return user.id if user else None
+            async with db.get_async_session() as session:
+                # asyncpg не приводит типы сам — CRM ID приходит строкой
+                return await session.scalar(
+                    select(User.id).where(User.crm_employee_id == int(crm_employee_id)).limit(1)
+                )
         except Exception as e:
             logger.error(f"Ошибка поиска пользователя по CRM ID: {e}")
             return None
@@ -2142,6 +2219,7 @@ class BitrixSync:
         except Exception as e:
             logger.error(f"Ошибка удаления дублей: {e}")
             
+    @sync_stats.staged('db_write')
     async def _update_existing_employee(self, existing_employee: Dict, rest_emp: Dict, rest_to_crm_mapping: Dict, stats: Dict, entity_1120_map: Dict = None):
         """Обновляет данные существующего сотрудника с датой трудоустройства и рабочим временем из сущности 1120"""
         try:
@@ -2303,6 +2381,7 @@ class BitrixSync:
         except Exception as e:
             logger.error(f"Ошибка очистки неактивных сотрудников: {e}")
             
+    @sync_stats.staged('db_write')
     async def _add_new_employee(self, rest_emp: Dict, rest_to_crm_mapping: Dict, stats: Dict, entity_1120_map: Dict = None):
         """Добавляет нового сотрудника из Bitrix с датой трудоустройства и рабочим временем из сущности 1120"""
         try:
@@ -2452,6 +2531,7 @@ class BitrixSync:
             logger.error(f"Ошибка поиска сотрудника по CRM ID {crm_id}: {e}")
             return None
 
+    @sync_stats.staged('resolve')
     def _need_order_update(self, order: Dict) -> bool:
         """Проверяет нужно ли обновлять заказ - ИСПРАВЛЕННАЯ ВЕРСИЯ"""
         bitrix_id = order.get('bitrix_id')
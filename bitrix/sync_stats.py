@@ -0,0 +1,294 @@
+# ##bitrix/sync_stats.py
+"""
+Телеметрия прогонов синхронизации с Bitrix24.
+
+Каждый прогон (sync_orders, sync_employees, _push_to_bitrix) оборачивается в
+sync_run('orders' | 'employees' | 'push'). Внутри прогона участки кода отмечаются
+stage('fetch' | 'parse' | 'resolve' | 'db_write' | 'remote_write' | 'pacing').
+Время этапов исключающее: вложенный этап приостанавливает внешний, поэтому
+сумма этапов не превышает длительности прогона, а остаток попадает в 'other'.
+
+Вызовы REST считаются по методам через metrics.add_bitrix_listener, повторы —
+через retry(). По завершении прогон пишется в таблицу sync_runs и в лог.
+Вне прогона stage() и retry() ничего не делают.
+"""
+import asyncio
+import functools
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+import metrics
+from database import db
+from models import SyncRun as SyncRunRecord
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('fetch', 'parse', 'resolve', 'db_write', 'remote_write', 'pacing')
+
+_current_run = ContextVar('bitrix_sync_run', default=None)
+
+SYNC_STAGE_SECONDS = metrics.Histogram(
+    'bot_bitrix_sync_stage_seconds', 'Время этапа синхронизации с Bitrix24 за прогон',
+    ['run', 'stage'], buckets=metrics.JOB_BUCKETS)
+
+
+class SyncRun:
+    """Статистика одного прогона синхронизации"""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.started_at = datetime.now()
+        self.finished_at = None
+        self.status = 'running'
+        self.error = None
+        self.stats = {}
+        self.stages = dict.fromkeys(STAGES, 0.0)
+        self.calls = Counter()
+        self.call_errors = Counter()
+        self.call_seconds = Counter()
+        self.retries = Counter()
+        self._started = time.perf_counter()
+        self._duration = None
+        self._stack = []  # [этап, момент последнего возобновления]
+
+    @property
+    def duration(self) -> float:
+        if self._duration is not None:
+            return self._duration
+        return time.perf_counter() - self._started
+
+    def _enter(self, name: str):
+        now = time.perf_counter()
+        if self._stack:
+            outer = self._stack[-1]
+            self.stages[outer[0]] += now - outer[1]
+        self._stack.append([name, now])
+
+    def _exit(self):
+        now = time.perf_counter()
+        name, resumed = self._stack.pop()
+        self.stages[name] = self.stages.get(name, 0.0) + now - resumed
+        if self._stack:
+            self._stack[-1][1] = now
+
+    def record_call(self, method: str, seconds: float, ok: bool):
+        self.calls[method] += 1
+        self.call_seconds[method] += seconds
+        if not ok:
+            self.call_errors[method] += 1
+
+    def finish(self, stats: dict = None, status: str = None, error: str = None):
+        self._duration = time.perf_counter() - self._started
+        self.finished_at = datetime.now()
+        if stats is not None:
+            self.stats = dict(stats)
+        self.error = error
+        if status:
+            self.status = status
+        elif error:
+            self.status = 'error'
+        elif self.stats.get('errors'):
+            self.status = 'partial'
+        else:
+            self.status = 'ok'
+
+    def as_dict(self) -> dict:
+        staged = sum(self.stages.values())
+        return {
+            'kind': self.kind,
+            'status': self.status,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'duration_ms': round(self.duration * 1000, 1),
+            'stages_ms': {
+                **{name: round(seconds * 1000, 1) for name, seconds in self.stages.items()},
+                'other': round(max(self.duration - staged, 0.0) * 1000, 1),
+            },
+            'api_calls': dict(self.calls),
+            'api_errors': dict(self.call_errors),
+            'api_ms': {method: round(seconds * 1000, 1) for method, seconds in self.call_seconds.items()},
+            'retries': dict(self.retries),
+            'stats': self.stats,
+            'error': self.error,
+        }
+
+    def summary(self) -> str:
+        return summary_text(self.as_dict())
+
+
+def summary_text(data: dict) -> str:
+    """Короткое описание прогона для лога и уведомления админу"""
+    stages = data.get('stages_ms') or {}
+    busy = ', '.join(
+        f"{name} {ms / 1000:.1f} с" for name, ms in sorted(stages.items(), key=lambda kv: kv[1], reverse=True)
+        if ms >= 1
+    )
+    calls = data.get('api_calls') or {}
+    errors = sum((data.get('api_errors') or {}).values())
+    retries = sum((data.get('retries') or {}).values())
+    api_ms = sum((data.get('api_ms') or {}).values())
+    line = (
+        f"⏱️ {data['kind']} {data['started_at'][11:19]}: {data['duration_ms'] / 1000:.1f} с, "
+        f"статус {data['status']}\n"
+        f"   этапы: {busy or '—'}\n"
+        f"   Bitrix: {sum(calls.values())} вызовов ({api_ms / 1000:.1f} с), ошибок {errors}, повторов {retries}"
+    )
+    if calls:
+        line += "\n   " + ", ".join(f"{method} ×{count}" for method, count in sorted(calls.items()))
+    return line
+
+
+def current_run():
+    return _current_run.get()
+
+
+@contextmanager
+def stage(name: str):
+    """Отмечает этап текущего прогона; вне прогона ничего не делает"""
+    run = _current_run.get()
+    if run is None:
+        yield
+        return
+    run._enter(name)
+    try:
+        yield
+    finally:
+        run._exit()
+
+
+def staged(name: str):
+    """Декоратор: весь вызов метода (sync или async) считается этапом name"""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with stage(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def update_stats(**values):
+    """Дополняет счётчики текущего прогона (для методов, которые возвращают не dict)"""
+    run = _current_run.get()
+    if run is not None:
+        run.stats.update(values)
+
+
+def retry(method: str):
+    """Учитывает повторную попытку (таймаут, лимит запросов) в текущем прогоне"""
+    run = _current_run.get()
+    if run is not None:
+        run.retries[method] += 1
+
+
+def _on_bitrix_call(method: str, seconds: float, ok: bool):
+    run = _current_run.get()
+    if run is not None:
+        run.record_call(method, seconds, ok)
+
+
+metrics.add_bitrix_listener(_on_bitrix_call)
+
+
+@contextmanager
+def sync_run(kind: str):
+    """Прогон синхронизации: yield SyncRun, по выходу run.finish() (если не вызван) и сохранение"""
+    run = SyncRun(kind)
+    token = _current_run.set(run)
+    try:
+        yield run
+    except BaseException as e:
+        if run.finished_at is None:
+            run.finish(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _current_run.reset(token)
+        if run.finished_at is None:
+            run.finish()
+        _store(run)
+
+
+def tracked_run(kind: str):
+    """Декоратор async-метода синхронизации: вызов — отдельный прогон kind.
+
+    Если метод вернул dict, это итоговые счётчики прогона; False — прогон частичный.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with sync_run(kind) as run:
+                result = await func(*args, **kwargs)
+                if isinstance(result, dict):
+                    run.finish(stats=result)
+                elif result is False:
+                    run.finish(status='partial')
+                else:
+                    run.finish()
+                return result
+        return wrapper
+    return decorator
+
+
+def _store(run: SyncRun):
+    data = run.as_dict()
+    for name, ms in data['stages_ms'].items():
+        SYNC_STAGE_SECONDS.labels(run.kind, name).observe(ms / 1000)
+    logger.info(f"📊 Прогон синхронизации Bitrix:\n{run.summary()}")
+    try:
+        with db.get_session() as session:
+            session.add(SyncRunRecord(
+                kind=run.kind,
+                status=run.status,
+                started_at=run.started_at,
+                finished_at=run.finished_at,
+                duration_ms=int(data['duration_ms']),
+                stages=json.dumps(data['stages_ms']),
+                api_calls=json.dumps({
+                    'calls': data['api_calls'], 'errors': data['api_errors'], 'ms': data['api_ms'],
+                }),
+                retries=sum(run.retries.values()),
+                stats=json.dumps(data['stats'], ensure_ascii=False, default=str),
+                error=run.error,
+            ))
+            session.commit()
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось сохранить прогон синхронизации {run.kind}: {e}")
+
+
+def last_run(kind: str):
+    """Последний сохранённый прогон данного вида (dict как у SyncRun.as_dict) или None"""
+    try:
+        with db.get_session() as session:
+            record = session.query(SyncRunRecord).filter(
+                SyncRunRecord.kind == kind
+            ).order_by(SyncRunRecord.id.desc()).first()
+            if record is None:
+                return None
+            api = json.loads(record.api_calls or '{}')
+            return {
+                'kind': record.kind,
+                'status': record.status,
+                'started_at': record.started_at.isoformat(timespec='seconds'),
+                'duration_ms': record.duration_ms,
+                'stages_ms': json.loads(record.stages or '{}'),
+                'api_calls': api.get('calls', {}),
+                'api_errors': api.get('errors', {}),
+                'api_ms': api.get('ms', {}),
+                'retries': {'total': record.retries} if record.retries else {},
+                'stats': json.loads(record.stats or '{}'),
+                'error': record.error,
+            }
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось прочитать прогоны синхронизации: {e}")
+        return None
@@ -10,6 +10,8 @@ import os
 
 import httpx
 
+import metrics
+
 logger = logging.getLogger(__name__)
 
 
@@ -65,14 +67,17 @@ class BitrixBotClient:
             try:
                 # Явно без прокси — Bitrix24 во внутренней сети
                 async with httpx.AsyncClient(timeout=15.0, proxies={}) as client:
-                    resp = await client.post(self._sender_url, json=payload, headers=headers)
+                    with metrics.track_outbound("bitrix24"):
+                        resp = await client.post(self._sender_url, json=payload, headers=headers)
                     if resp.status_code == 200:
                         data = resp.json()
+                        metrics.count_message("bitrix24", "send_message", ok=bool(data.get("ok")))
                         if data.get("ok"):
                             logger.debug(f"[B24Client] Сообщение отправлено dialog={dialog_id}")
                             return True
                         logger.warning(f"[B24Client] PHP ошибка dialog={dialog_id}: {data.get('error', data)}")
                         return False
+                    metrics.count_message("bitrix24", "send_message", ok=False)
                     logger.warning(f"[B24Client] HTTP {resp.status_code} dialog={dialog_id}: {resp.text[:200]}")
                     return False
             except (httpx.ConnectError, httpx.TimeoutException, OSError) as e:
@@ -84,8 +89,10 @@ class BitrixBotClient:
                     )
                     await asyncio.sleep(delay)
                 else:
+                    metrics.count_message("bitrix24", "send_message", ok=False)
                     logger.error(f"[B24Client] Ошибка отправки dialog={dialog_id}: {e}")
             except Exception as e:
+                metrics.count_message("bitrix24", "send_message", ok=False)
                 logger.error(f"[B24Client] Ошибка отправки dialog={dialog_id}: {e}")
                 return False
         return False
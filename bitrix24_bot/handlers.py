@@ -13,20 +13,21 @@ from datetime import datetime, timedelta
 
 from config import CONFIG
 from database import db
-from models import User, Order
+from models import User
 from services.order_service import (
     get_order_for_date, get_active_orders,
     create_order, cancel_order, modify_quantity,
-    get_user_monthly_stats, QUANTITY_MAP,
+    get_user_monthly_stats,
 )
-from services.menu_service import get_menu_for_day, format_menu_text, get_week_menus
+from services.menu_service import get_menu_for_day, format_menu_text, get_week_view
 from services.report_service import (
     generate_provider_report_text,
     generate_accounting_report_file,
     generate_admin_report_file,
 )
-from services.user_service import get_user_role, MESSENGER_BITRIX24
+from services.user_service import get_user_role_async, MESSENGER_BITRIX24
 from time_config import TIME_CONFIG
+import sampling_profiler
 
 logger = logging.getLogger(__name__)
 
@@ -52,6 +53,10 @@ STEP_STATS       = "stats_period"
 STEP_LOCATION    = "select_location"
 S_LOCATION_PENDING = "location_pending"
 
+# PHP relay waits for the webhook response, so the profile must fit its timeout
+PROFILE_DEFAULT_SECONDS = 15
+PROFILE_MAX_SECONDS = 30
+
 # ------------------------------------------------------------------
 # Keyboards
 # ACTION_VALUE is what gets sent to the bot when button is clicked.
@@ -226,7 +231,7 @@ async def handle_message(
     command: str = "",
     command_params: str = "",
 ) -> list[dict]:
-    role = get_user_role(from_user_id, MESSENGER_BITRIX24, CONFIG)
+    role = await get_user_role_async(from_user_id, MESSENGER_BITRIX24, CONFIG)
     if not role:
         return [_msg("⛔ Вы не зарегистрированы в системе.")]
 
@@ -260,6 +265,12 @@ async def handle_message(
     if role == "employee" or (role == "admin" and _is_employee_action):
         return await _handle_employee(dialog_id, from_user_id, raw, state, step, role)
 
+    # Admin: sampling profile of this process, returned as a text file
+    profile_match = re.match(r'^(?:профиль|/profile)(?: (\d+))?$', raw)
+    if role == "admin" and profile_match:
+        seconds = int(profile_match.group(1) or PROFILE_DEFAULT_SECONDS)
+        return await _do_profile(min(max(seconds, 1), PROFILE_MAX_SECONDS), role)
+
     # Admin / provider / accountant — reports routing
     if raw in ("отчёты", "отчеты", "/reports"):
         _state[dialog_id] = {S_STEP: STEP_PERIOD}
@@ -430,6 +441,17 @@ async def _do_report(rtype: str, period: str, role: str) -> list[dict]:
     return messages
 
 
+async def _do_profile(seconds: int, role: str) -> list[dict]:
+    try:
+        path, text = await sampling_profiler.profile_event_loop(seconds, process="bitrix24")
+    except sampling_profiler.ProfilerBusyError:
+        return [_msg("⏳ Профиль уже снимается, дождитесь отчёта.", keyboard=_main_kb(role))]
+    m = _msg(f"🔬 Профиль event loop за {seconds} с", keyboard=_main_kb(role))
+    m["file_base64"] = base64.b64encode(text.encode("utf-8")).decode("ascii")
+    m["file_name"] = path.name if path else "profile_bitrix24.txt"
+    return [m]
+
+
 def _help_text(role: str) -> str:
     lines = ["[B]Бот ЕРС Обеды[/B]\n"]
     if role in ("admin", "provider"):
@@ -442,6 +464,8 @@ def _help_text(role: str) -> str:
         lines.append("📊 [B]статистика за месяц[/B] — сводка заказов за месяц")
         lines.append("🍽 [B]меню на сегодня[/B] — меню и управление заказом на сегодня")
         lines.append("📅 [B]меню на неделю[/B] — меню и заказы на ближайшие дни")
+    if role == "admin":
+        lines.append(f"🔬 [B]профиль N[/B] — профиль бота за N секунд (до {PROFILE_MAX_SECONDS}), файлом")
     return "\n".join(lines)
 
 
@@ -597,24 +621,12 @@ def _do_create_inspector_order_db(user_db_id: int, day_offset: int, session) ->
     if target_date == now.date() and now.time() >= TIME_CONFIG.ORDER_DEADLINE:
         return f"ℹ️ Приём заказов на сегодня завершён в {TIME_CONFIG.ORDER_DEADLINE.strftime('%H:%M')}."
 
-    # Проверяем существующий заказ
-    existing = get_order_for_date(user_db_id, target_date, session)
-    if existing:
-        return f"ℹ️ У вас уже заказано {existing.quantity} порций. Нельзя заказать и для себя, и для инспектора на один день."
-
-    quantity = 1
-    order = Order(
-        user_id=user_db_id,
-        target_date=target_date,
-        order_time=now.strftime("%H:%M:%S"),
-        quantity=quantity,
-        bitrix_quantity_id=QUANTITY_MAP[1],
-        is_active=True,
-        is_preliminary=(day_offset > 0),
-        is_for_inspector=True,
-        created_at=now.replace(tzinfo=None),
+    order, err = create_order(
+        user_db_id, target_date, session,
+        is_preliminary=(day_offset > 0), is_for_inspector=True,
     )
-    session.add(order)
+    if err:
+        return f"ℹ️ {err}. Нельзя заказать и для себя, и для инспектора на один день."
     return f"✅ 🕵️ Заказ для инспектора на {target_date.strftime('%d.%m')} оформлен — 1 порция."
 
 
@@ -629,29 +641,20 @@ def _do_cancel_order_db(user_db_id: int, target_date, session) -> str:
     return f"✅ Заказ на {target_date.strftime('%d.%m')} отменён."
 
 
-def _fetch_week_order_status(user_db_id: int, work_days: list, session) -> list:
-    now_local = datetime.now(TIME_CONFIG.TIMEZONE)
+def _fetch_week_order_status(user_db_id: int, session) -> list:
+    # Приём заказов в Б24 не зависит от orders_enabled — как и _do_create_order_db
+    week = get_week_view(user_db_id, CONFIG, session, orders_enabled=True)
     results = []
-    for day in work_days:
-        offset      = day["day_offset"]
-        target_date = day["target_date"]
-        menu_text   = format_menu_text(day["menu"], day["day_name"], target_date)
-        order       = get_order_for_date(user_db_id, target_date, session)
-        has_order   = order is not None
-        can_modify  = (
-            target_date > now_local.date() or
-            (target_date == now_local.date() and now_local.time() < TIME_CONFIG.MODIFICATION_DEADLINE)
-        )
-        qty = order.quantity if has_order else 0
-        if order:
-            session.expunge(order)
+    for day in week:
+        if day["is_weekend"] or day["is_holiday"] or not day["menu"]:
+            continue
         results.append({
-            "offset":      offset,
-            "target_date": target_date,
-            "menu_text":   menu_text,
-            "has_order":   has_order,
-            "can_modify":  can_modify,
-            "qty":         qty,
+            "offset":      day["day_offset"],
+            "target_date": day["target_date"],
+            "menu_text":   format_menu_text(day["menu"], day["day_name"], day["target_date"]),
+            "has_order":   day["has_order"],
+            "can_modify":  day["can_modify"],
+            "qty":         day["quantity"],
         })
     return results
 
@@ -785,11 +788,9 @@ async def _handle_employee_inner(
 
     # ---- Меню на неделю / Меню (обратная совместимость) ----
     if raw in ("меню на неделю", "меню"):
-        week = get_week_menus(CONFIG)
-        work_days = [d for d in week if not d["is_weekend"] and not d["is_holiday"] and d["menu"]]
-        if not work_days:
+        day_statuses = await _run_sync(_fetch_week_order_status, user_db_id)
+        if not day_statuses:
             return [_msg("Меню на текущую неделю отсутствует.", keyboard=main_kb, replace=True)]
-        day_statuses = await _run_sync(_fetch_week_order_status, user_db_id, work_days)
         _state.pop(dialog_id, None)
         messages = []
         for i, st in enumerate(day_statuses):
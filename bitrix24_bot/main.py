@@ -18,16 +18,23 @@ import logging
 import os
 import secrets
 import sys
+import time
 from pathlib import Path
 
 # Add project root to path so shared modules (config, database, etc.) are importable
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+# Startup profiling (--profile-startup / PROFILE_STARTUP=1) must start before heavy imports
+import startup_profiler
+startup_profiler.enable_from_argv('bitrix24')
+
 from logging.handlers import RotatingFileHandler
 
 import uvicorn
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+
+import metrics
 
 
 def _setup_logging():
@@ -53,6 +60,17 @@ logger = logging.getLogger(__name__)
 app = FastAPI(title="Bitrix24 Lunch Bot", docs_url=None, redoc_url=None)
 
 
+@app.middleware("http")
+async def request_db_scope(request: Request, call_next):
+    """Отдельная сессия БД на каждый HTTP-запрос (db.session внутри обработчиков)"""
+    from database import db
+    with db.request_scope(f"b24:{request.url.path}"):
+        response = await call_next(request)
+    if request.url.path.startswith("/webhook"):
+        startup_profiler.mark_first_update()
+    return response
+
+
 @app.on_event("startup")
 async def on_startup():
     from database import db
@@ -63,14 +81,46 @@ async def on_startup():
         sys.exit(1)
 
     Base.metadata.create_all(bind=db.engine)
+
+    # Partial unique index behind ON CONFLICT in order_service
+    from migrate_add_order_unique_index import run_migration as migrate_order_index
+    if not migrate_order_index():
+        logger.error("Индекс uq_orders_user_date_active не создан — заказы не будут работать")
+        sys.exit(1)
+
+    metrics.instrument_database()
+    metrics.PROCESS_START_TIME.labels("bitrix24").set(time.time())
+    import health
+    import loop_watchdog
+    health.register_loop(asyncio.get_running_loop())
+    loop_watchdog.start("bitrix24")
+
+    # Изменения конфигурации из других ботов (LISTEN config_changed)
+    from config_notify import start_config_listener
+    start_config_listener()
+
+    startup_profiler.checkpoint('bitrix24 startup')
     logger.info("=== Bitrix24 bot started ===")
 
 
 @app.get("/health")
 async def health():
+    """Deep check (DB, Bitrix, scheduler, outbound, event loop); 503 when the DB is down"""
+    import health as health_checks
+    report = await asyncio.to_thread(health_checks.collect, "bitrix24")
+    return JSONResponse(content=report, status_code=health_checks.http_status(report))
+
+
+@app.get("/health/live")
+async def liveness():
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 _webhook_token = os.getenv("B24_WEBHOOK_TOKEN", "")
 
 
@@ -125,11 +175,16 @@ async def handle_bot_webhook(request: Request):
         )
 
         from bitrix24_bot.handlers import handle_message
-        messages = await handle_message(
-            dialog_id, from_user_id, message,
-            command=command, command_params=command_params,
-        )
-
+        label = f"callback:{metrics.callback_prefix(command)}" if command else metrics.command_label(message)
+        from database import operation_scope
+        with metrics.track_handler("bitrix24", label), operation_scope(label):
+            messages = await handle_message(
+                dialog_id, from_user_id, message,
+                command=command, command_params=command_params,
+            )
+
+        # Ответы отправляет PHP-реле через Bot::addMessage()
+        metrics.count_message("bitrix24", "reply", amount=len(messages))
         return JSONResponse(content={"messages": messages})
 
     except Exception as e:
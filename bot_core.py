@@ -1,12 +1,69 @@
 import logging
 import asyncio
 import httpx
-from telegram.ext import ApplicationBuilder
+import metrics
+import startup_profiler
+from telegram.ext import Application, ApplicationBuilder
 from telegram.request import HTTPXRequest
 from telegram.error import NetworkError, TimedOut
 
 
-class SocksHTTPXRequest(HTTPXRequest):
+class RequestScopedApplication(Application):
+    """Application, обрабатывающий каждый апдейт в собственной сессии БД.
+
+    При concurrent_updates апдейты одного пользователя и одного чата
+    выстраиваются в очередь через update_serializer (update_ordering.py).
+    """
+
+    update_serializer = None
+
+    async def process_update(self, update: object) -> None:
+        if self.update_serializer is None:
+            await self._process_update_scoped(update)
+            return
+        user = getattr(update, 'effective_user', None)
+        chat = getattr(update, 'effective_chat', None)
+        async with self.update_serializer.hold(
+            user.id if user is not None else None,
+            chat.id if chat is not None else None,
+        ):
+            await self._process_update_scoped(update)
+
+    async def _process_update_scoped(self, update: object) -> None:
+        from database import db
+        label = metrics.telegram_handler_label(update)
+        with metrics.track_handler("telegram", label):
+            with db.request_scope(f"telegram:{label}"):
+                await super().process_update(update)
+        startup_profiler.mark_first_update()
+
+    async def process_error(self, update, error, job=None, coroutine=None) -> bool:
+        # Исключения хендлеров PTB перехватывает сам и передаёт сюда
+        if update is not None:
+            metrics.HANDLER_ERRORS.labels("telegram", metrics.telegram_handler_label(update)).inc()
+        return await super().process_error(update, error, job=job, coroutine=coroutine)
+
+
+class MetricsHTTPXRequest(HTTPXRequest):
+    """HTTPXRequest, считающий исходящие сообщения (send*/edit*/copy*/forward*)."""
+
+    _SEND_PREFIXES = ("send", "edit", "copy", "forward")
+
+    async def do_request(self, url, method, *args, **kwargs):
+        api_method = url.rsplit("/", 1)[-1]
+        if not api_method.startswith(self._SEND_PREFIXES):
+            return await super().do_request(url, method, *args, **kwargs)
+        try:
+            with metrics.track_outbound("telegram"):
+                code, payload = await super().do_request(url, method, *args, **kwargs)
+        except Exception:
+            metrics.count_message("telegram", api_method, ok=False)
+            raise
+        metrics.count_message("telegram", api_method, ok=code == 200)
+        return code, payload
+
+
+class SocksHTTPXRequest(MetricsHTTPXRequest):
     """HTTPXRequest that creates a simpler httpx.AsyncClient for SOCKS5 compatibility."""
 
     def initialize(self) -> "asyncio.coroutine":
@@ -30,6 +87,7 @@ class LunchBot:
         self.application = None
         self._running = False
         self.cron_manager = None
+        self.webhook = None
 
         # Простой логгер без сложной логики
         self.logger = logging.getLogger(__name__)
@@ -63,10 +121,19 @@ class LunchBot:
                 
             self.logger.info("2. Создаем application с устойчивостью к сетевым ошибкам")
             
+            # Сколько апдейтов разных пользователей обрабатывается одновременно;
+            # 1 — строго по одному, как раньше
+            import os
+            concurrent_updates = int(os.getenv('TELEGRAM_CONCURRENT_UPDATES', '8'))
+            # Cron-задачи и синхронизация с Bitrix24 — ровно на одной реплике;
+            # при нескольких репликах за webhook остальным ставится TELEGRAM_SCHEDULER=0
+            run_scheduler = os.getenv('TELEGRAM_SCHEDULER', '1').lower() not in ('0', 'false', 'no')
+
             # 🔥 КАСТОМНЫЙ REQUEST С УВЕЛИЧЕННЫМИ ТАЙМАУТАМИ
             # read_timeout должен быть больше, чем polling_timeout Telegram (обычно 30-60 сек)
             request_kwargs = dict(
-                connection_pool_size=8,
+                # +1 соединение под getUpdates, чтобы ответы хендлеров не ждали пула
+                connection_pool_size=max(8, concurrent_updates + 1),
                 connect_timeout=30.0,   # Увеличено: SOCKS5 + TLS handshake
                 read_timeout=90.0,      # Увеличено для long polling
                 write_timeout=30.0,     # Увеличено для отправки файлов
@@ -75,7 +142,6 @@ class LunchBot:
             if CONFIG.proxy_url:
                 # 🔥 Прокси ТОЛЬКО для Telegram API через HTTPS_PROXY,
                 # но с NO_PROXY для Bitrix24 и внутренних сетей
-                import os
                 os.environ['HTTPS_PROXY'] = CONFIG.proxy_url
                 # Запрещаем прокси для Bitrix24 и внутренних адресов
                 no_proxy = os.environ.get('NO_PROXY', '')
@@ -90,31 +156,63 @@ class LunchBot:
                 # Используем SocksHTTPXRequest — он корректно обрабатывает SOCKS5
                 request = SocksHTTPXRequest(**request_kwargs)
             else:
-                request = HTTPXRequest(**request_kwargs)
+                request = MetricsHTTPXRequest(**request_kwargs)
             
             # ✅ УБРАЛИ connect_timeout, read_timeout и т.д. из ApplicationBuilder
-            self.application = (
+            builder = (
                 ApplicationBuilder()
+                .application_class(RequestScopedApplication)
                 .token(CONFIG.token)
                 .request(request)  # ← ВСЕ ТАЙМАУТЫ УЖЕ В request
-                .build()
             )
+            if concurrent_updates > 1:
+                # PTB лишь запускает апдейты задачами (до TELEGRAM_PENDING_UPDATES разом);
+                # порядок по пользователю/чату и лимит держит UpdateSerializer
+                from update_ordering import UpdateSerializer
+                builder = builder.concurrent_updates(int(os.getenv('TELEGRAM_PENDING_UPDATES', '256')))
+            self.application = builder.build()
+            if concurrent_updates > 1:
+                self.application.update_serializer = UpdateSerializer('telegram', concurrent_updates)
+                self.logger.info(
+                    f"2b. Параллельная обработка: до {concurrent_updates} апдейтов, "
+                    f"по одному на пользователя и чат"
+                )
             
             # Передаем application в BitrixSync если он был создан
             if self.bitrix_sync:
                 self.bitrix_sync.bot_application = self.application
-                # Запускаем sync задачи
-                asyncio.create_task(self.bitrix_sync.run_sync_tasks())
+                # Запускаем sync задачи (только на реплике с планировщиком)
+                if run_scheduler:
+                    asyncio.create_task(self.bitrix_sync.run_sync_tasks())
                 self.logger.info("2a. BitrixSync подключен к application")
             
+            startup_profiler.checkpoint('application build')
             self.logger.info("3. Настраиваем admin_ids")
             admin_ids = getattr(CONFIG, 'admin_ids', [])
             self.application.bot_data['admin_ids'] = admin_ids
             
-            self.logger.info("4. Импортируем CronManager")
-            from cron_jobs import CronManager
-            self.cron_manager = CronManager(self.application)
-            await self.cron_manager.setup()
+            if run_scheduler:
+                self.logger.info("4. Импортируем CronManager")
+                from cron_jobs import CronManager
+                self.cron_manager = CronManager(self.application)
+                await self.cron_manager.setup()
+                startup_profiler.checkpoint('cron setup')
+            else:
+                # Напоминания, отчёты, бекап и отправка заказов в Bitrix идут с другой реплики
+                self.logger.info("4. Планировщик выключен (TELEGRAM_SCHEDULER=0)")
+                from services.calendar_service import production_calendar
+                await production_calendar.ensure_loaded()
+
+            # Изменения конфигурации из других ботов (LISTEN config_changed)
+            from config_notify import start_config_listener
+            start_config_listener()
+
+            # /metrics и /health на боковом HTTP-сервере (TELEGRAM_METRICS_PORT)
+            metrics.start_metrics_server("telegram")
+
+            # Опоздание event loop и блокирующие вызовы (bot_event_loop_*)
+            import loop_watchdog
+            loop_watchdog.start("telegram")
             
             # DEBUG: логируем ВСЕ входящие обновления
             from telegram.ext import TypeHandler
@@ -137,6 +235,7 @@ class LunchBot:
             from handlers.commands import setup as setup_commands
             setup_commands(self.application)
 
+            startup_profiler.checkpoint('handlers setup')
             self.logger.info("7. Добавляем обработчик ошибок")
             self.application.add_error_handler(self.error_handler)
 
@@ -144,16 +243,28 @@ class LunchBot:
             await self.application.initialize()
             await self.application.start()
 
+            startup_profiler.checkpoint('application initialize+start')
             bot_info = await self.application.bot.get_me()
             self.logger.info(f"9. Бот @{bot_info.username} запущен")
 
-            self.logger.info("10. Запускаем polling с увеличенными таймаутами")
-            # 🔥 ТОЛЬКО ПАРАМЕТРЫ POLLING, БЕЗ ТАЙМАУТОВ (они уже в request)
-            await self.application.updater.start_polling(
-                allowed_updates=None,
-                drop_pending_updates=False,
-                bootstrap_retries=5  # 5 попыток при старте
-            )
+            from telegram_webhook import TelegramWebhook, WebhookSettings
+            webhook_settings = WebhookSettings.from_env()
+            if webhook_settings.enabled:
+                # Апдейты приходят POST-запросами и попадают в ту же update_queue
+                self.logger.info("10. Запускаем приём апдейтов через webhook")
+                self.webhook = TelegramWebhook(self.application, webhook_settings)
+                await self.webhook.start()
+                startup_profiler.checkpoint('webhook start')
+            else:
+                self.logger.info("10. Запускаем polling с увеличенными таймаутами")
+                # 🔥 ТОЛЬКО ПАРАМЕТРЫ POLLING, БЕЗ ТАЙМАУТОВ (они уже в request)
+                # start_polling сам снимает webhook, если он был установлен
+                await self.application.updater.start_polling(
+                    allowed_updates=None,
+                    drop_pending_updates=False,
+                    bootstrap_retries=5  # 5 попыток при старте
+                )
+                startup_profiler.checkpoint('polling start')
             self._running = True
 
             self.logger.info("11. Бот успешно запущен, переходим в основной цикл")
@@ -174,9 +285,14 @@ class LunchBot:
                 await self.bitrix_sync.close()
                 self.logger.info("BitrixSync остановлен")
             
+            if self.webhook:
+                await self.webhook.stop()
+                self.webhook = None
+
             if self.application:
-                if hasattr(self.application, 'updater') and self.application.updater:
-                    await self.application.updater.stop()
+                updater = getattr(self.application, 'updater', None)
+                if updater and updater.running:
+                    await updater.stop()
                 await self.application.stop()
                 await self.application.shutdown()
             self.logger.info("Бот успешно остановлен")
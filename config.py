@@ -1,11 +1,12 @@
 # ##config.py
 import os
 import logging
+import threading
 from pathlib import Path
 from dotenv import load_dotenv
 import pytz
-import sqlite3
 from database import db
+from sqlalchemy import select, func
 from sqlalchemy.orm import Session
 from datetime import datetime, time, timedelta
 from time_config import TIME_CONFIG
@@ -28,6 +29,9 @@ logger = logging.getLogger(__name__)
 load_dotenv(CONFIGS_DIR / '.env')
 
 class BotConfig:
+    # Секции конфигурации: каждая перечитывается отдельно и только если изменилась
+    SECTIONS = ('orders', 'env', 'staff', 'holidays', 'menu')
+
     def __init__(self, database):
         self._token = None
         self._admin_ids = []
@@ -42,10 +46,14 @@ class BotConfig:
         self._timezone = TIME_CONFIG.TIMEZONE  # Используем из TIME_CONFIG
         self._locations = ["Офис", "ПЦ 1", "ПЦ 2", "Склад"]
         self._db = database
-        self._orders_enabled = self._load_orders_status()
-        
-        self._load_env_vars()
-        self._load_db_data()
+        self._orders_enabled = True
+        # etag — дешёвый отпечаток данных секции, version — сколько раз секция менялась
+        self._section_etags = {}
+        self._section_versions = dict.fromkeys(self.SECTIONS, 0)
+        # Секции перечитываются и из потока LISTEN, и из event loop
+        self._reload_lock = threading.Lock()
+
+        self._reload_sections(self.SECTIONS, force=True)
 
     def _load_env_vars(self):
         """Загружает переменные окружения с отладкой"""
@@ -121,24 +129,41 @@ class BotConfig:
         """Преобразует строку с ID в список чисел"""
         return [int(x) for x in ids_str.split(",") if x.strip()]
 
-    def _load_db_data(self):
-        """Загружает данные из базы данных"""
+    def _load_staff(self) -> bool:
+        """Загружает имена сотрудников (одна колонка, без ORM-объектов)"""
         try:
             with self._db.get_session() as session:
-                # Загрузка сотрудников
                 from models import User
-                users = session.query(User).filter(
-                    User.is_employee == True, 
-                    User.is_deleted == False
-                ).all()
-                self._staff_names = {user.full_name.lower() for user in users}
-                
-                # Загрузка праздников
+                names = session.execute(
+                    select(User.full_name).where(
+                        User.is_employee == True,
+                        User.is_deleted == False
+                    )
+                ).scalars()
+                self._staff_names = {name.lower() for name in names if name}
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка загрузки сотрудников из БД: {e}")
+            self._staff_names = set()
+            return False
+
+    def _load_holidays(self) -> bool:
+        """Загружает праздники"""
+        try:
+            with self._db.get_session() as session:
                 from models import Holiday
-                holidays = session.query(Holiday).all()
-                self._holidays = {holiday.date: holiday.name for holiday in holidays}
-                
-                # Загрузка меню
+                rows = session.execute(select(Holiday.date, Holiday.name)).all()
+                self._holidays = {day: name for day, name in rows}
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка загрузки праздников из БД: {e}")
+            self._holidays = {}
+            return False
+
+    def _load_menu(self) -> bool:
+        """Загружает меню"""
+        try:
+            with self._db.get_session() as session:
                 from models import Menu
                 menu_items = session.query(Menu).all()
                 self._menu = {
@@ -148,13 +173,117 @@ class BotConfig:
                         "salad": item.salad
                     } for item in menu_items
                 }
-                
+            return True
         except Exception as e:
-            logger.error(f"Ошибка загрузки данных из БД: {e}")
-            # Значения по умолчанию
-            self._staff_names = set()
-            self._holidays = {}
+            logger.error(f"Ошибка загрузки меню из БД: {e}")
             self._menu = {}
+            return False
+
+    def _load_orders(self) -> bool:
+        self._orders_enabled = self._load_orders_status()
+        return True
+
+    def _reload_env(self) -> bool:
+        load_dotenv(CONFIGS_DIR / '.env', override=True)
+        self._load_env_vars()
+        return True
+
+    def _env_etag(self):
+        try:
+            stat = (CONFIGS_DIR / '.env').stat()
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            # Без .env переменные приходят из окружения процесса и не меняются
+            return 'no-env-file'
+
+    def _db_etags(self) -> dict:
+        """Отпечатки секций из БД — одним запросом из скалярных подзапросов.
+
+        Сотрудники: количество активных, max(id), max(updated_at);
+        праздники: количество, max(id), суммарная длина названий;
+        меню: количество и max(updated_at); настройки: значение orders_enabled.
+        """
+        from models import User, Holiday, Menu, BotSetting
+
+        active_staff = (User.is_employee == True, User.is_deleted == False)
+        parts = {
+            'staff': [
+                select(func.count(User.id)).where(*active_staff),
+                select(func.max(User.id)).where(*active_staff),
+                select(func.max(User.updated_at)).where(*active_staff),
+            ],
+            'holidays': [
+                select(func.count(Holiday.id)),
+                select(func.max(Holiday.id)),
+                select(func.sum(func.length(Holiday.name))),
+            ],
+            'menu': [
+                select(func.count(Menu.id)),
+                select(func.max(Menu.updated_at)),
+            ],
+            'orders': [
+                select(BotSetting.setting_value).where(BotSetting.setting_name == 'orders_enabled').limit(1),
+            ],
+        }
+        columns = [query.scalar_subquery() for queries in parts.values() for query in queries]
+        with self._db.get_session() as session:
+            row = list(session.execute(select(*columns)).one())
+
+        etags = {}
+        for section, queries in parts.items():
+            etags[section] = tuple(row[:len(queries)])
+            row = row[len(queries):]
+        return etags
+
+    def _reload_sections(self, sections, force=False) -> list:
+        """Перечитывает секции, у которых изменился etag (или все при force).
+
+        Возвращает список реально перечитанных секций.
+        """
+        loaders = {
+            'orders': self._load_orders,
+            'env': self._reload_env,
+            'staff': self._load_staff,
+            'holidays': self._load_holidays,
+            'menu': self._load_menu,
+        }
+        unknown = set(sections) - set(loaders)
+        if unknown:
+            raise ValueError(f"Неизвестная секция конфигурации: {sorted(unknown)}")
+
+        with self._reload_lock:
+            etags = {}
+            try:
+                etags = self._db_etags()
+            except Exception as e:
+                # БД недоступна — etag неизвестен, секции БД перечитываются как раньше
+                logger.warning(f"⚠️ Не удалось получить версии секций конфигурации: {e}")
+            etags['env'] = self._env_etag()
+
+            reloaded = []
+            for section in sections:
+                etag = etags.get(section)
+                if not force and etag is not None and self._section_etags.get(section) == etag:
+                    continue
+                loaded = loaders[section]()
+                # Загрузчик заменяет данные секции и при ошибке (пустыми) — версия растёт
+                # в обоих случаях и только после замены, чтобы читатель не закешировал
+                # новую версию со старыми данными
+                self._section_versions[section] += 1
+                if loaded:
+                    self._section_etags[section] = etag
+                    reloaded.append(section)
+                else:
+                    self._section_etags.pop(section, None)
+            return reloaded
+
+    def refresh(self, section: str):
+        """Принудительно перечитывает одну секцию (см. SECTIONS)"""
+        self._reload_sections([section], force=True)
+
+    def section_version(self, section: str) -> int:
+        """Версия секции — растёт при каждом её перечитывании"""
+        return self._section_versions[section]
 
     def _load_orders_status(self):
         """Загружает статус заказов из БД"""
@@ -187,6 +316,10 @@ class BotConfig:
                     )
                     session.add(setting)
                 
+                # Остальные процессы узнают об изменении после коммита
+                from config_notify import notify_config_changed
+                notify_config_changed('orders', session=session)
+
                 self._orders_enabled = enabled
                 logger.info(f"Статус заказов обновлен: {'разрешены' if enabled else 'запрещены'}")
                 
@@ -194,17 +327,18 @@ class BotConfig:
             logger.error(f"Ошибка сохранения статуса заказов: {e}")
             raise
 
-    def reload(self):
-        """Перезагружает конфигурацию из файла .env и базы данных"""
+    def reload(self, force: bool = False):
+        """Перечитывает изменившиеся секции конфигурации (.env и данные БД).
+
+        Неизменившиеся секции (по etag) не трогаются; force=True — перечитать всё.
+        """
         try:
-            # Перезагружаем переменные окружения
-            load_dotenv(CONFIGS_DIR / '.env', override=True)
-            self._load_env_vars()
-            
-            # Перезагружаем данные из базы данных
-            self._load_db_data()
+            reloaded = self._reload_sections(self.SECTIONS, force=force)
             
-            logger.info("Конфигурация успешно перезагружена")
+            if reloaded:
+                logger.info(f"Конфигурация успешно перезагружена: {', '.join(reloaded)}")
+            else:
+                logger.debug("Конфигурация не изменилась")
         except Exception as e:
             logger.error(f"Ошибка при перезагрузке конфигурации: {e}")
             raise
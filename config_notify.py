@@ -0,0 +1,185 @@
+"""
+Межпроцессная инвалидация конфигурации через Postgres LISTEN/NOTIFY.
+
+Telegram, VK, Max и Bitrix24 — отдельные процессы, у каждого свой CONFIG.
+Писатель после изменения вызывает notify_config_changed('holidays'),
+а каждый процесс держит ConfigChangeListener, который получает
+уведомление из канала config_changed и перечитывает только затронутую
+секцию (статус заказов, меню, праздники, сотрудники, .env, производственный
+календарь) — без опроса и без полной перезагрузки.
+
+Формат payload: {"section": "<секция>", "origin": "<id процесса>"}.
+Собственные уведомления процесс пропускает — он уже обновил себя сам.
+"""
+import json
+import uuid
+import select
+import logging
+import threading
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'config_changed'
+
+# Секции, которые понимает слушатель
+SECTIONS = ('orders', 'menu', 'holidays', 'staff', 'env', 'calendar')
+
+# Идентификатор этого процесса — чтобы не применять свои же уведомления
+PROCESS_ID = uuid.uuid4().hex[:12]
+
+
+def _is_postgres(engine) -> bool:
+    return engine.dialect.name == 'postgresql'
+
+
+def notify_config_changed(*sections, session=None):
+    """Сообщает остальным процессам, что секции конфигурации изменились.
+
+    С session уведомление уходит в той же транзакции и доставляется только
+    после её коммита; без неё — отдельной короткой транзакцией (вызывать
+    после коммита изменения). Ошибка уведомления не ломает запись.
+    """
+    from database import db
+
+    unknown = set(sections) - set(SECTIONS)
+    if unknown:
+        raise ValueError(f"Неизвестные секции конфигурации: {sorted(unknown)}")
+    if not _is_postgres(db.engine):
+        return
+
+    payloads = [json.dumps({'section': s, 'origin': PROCESS_ID}) for s in sections]
+    statement = text("SELECT pg_notify(:channel, :payload)")
+    try:
+        if session is not None:
+            for payload in payloads:
+                session.execute(statement, {'channel': CHANNEL, 'payload': payload})
+        else:
+            with db.get_session() as own_session:
+                for payload in payloads:
+                    own_session.execute(statement, {'channel': CHANNEL, 'payload': payload})
+        logger.info(f"📣 Уведомление {CHANNEL}: {', '.join(sections)}")
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось отправить {CHANNEL} ({', '.join(sections)}): {e}")
+
+
+class ConfigChangeListener(threading.Thread):
+    """Фоновый поток: LISTEN config_changed и обновление секций по уведомлениям.
+
+    Работает на отдельном соединении, отсоединённом от пула, поэтому не
+    зависит от event loop конкретного фреймворка. При обрыве соединения
+    переподключается и на всякий случай перечитывает все секции — пока
+    слушателя не было, уведомления могли потеряться.
+    """
+
+    POLL_TIMEOUT = 5.0
+    MAX_BACKOFF = 60.0
+
+    def __init__(self, database, handlers: dict):
+        super().__init__(name='config-listener', daemon=True)
+        self._db = database
+        self._handlers = handlers
+        self._stop_event = threading.Event()
+        self._conn = None
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _connect(self):
+        raw = self._db.engine.raw_connection()
+        # Соединение живёт всё время работы слушателя — забираем его из пула
+        raw.detach()
+        conn = raw.driver_connection
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {CHANNEL}")
+        self._conn = conn
+        logger.info(f"👂 Слушаем канал {CHANNEL} (процесс {PROCESS_ID})")
+
+    def _close(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+    def _collect(self) -> list:
+        """Ждёт уведомления и возвращает изменённые секции без повторов"""
+        ready, _, _ = select.select([self._conn], [], [], self.POLL_TIMEOUT)
+        if not ready:
+            return []
+        self._conn.poll()
+        sections = []
+        while self._conn.notifies:
+            notify = self._conn.notifies.pop(0)
+            try:
+                payload = json.loads(notify.payload)
+            except ValueError:
+                logger.warning(f"⚠️ Некорректный payload {CHANNEL}: {notify.payload!r}")
+                continue
+            if payload.get('origin') == PROCESS_ID:
+                continue
+            section = payload.get('section')
+            if section in self._handlers and section not in sections:
+                sections.append(section)
+        return sections
+
+    def _apply(self, sections):
+        for section in sections:
+            try:
+                self._handlers[section]()
+                logger.info(f"🔄 Секция конфигурации '{section}' обновлена по уведомлению")
+            except Exception as e:
+                logger.error(f"❌ Ошибка обновления секции '{section}': {e}")
+
+    def run(self):
+        backoff = 1.0
+        reconnecting = False
+        while not self._stop_event.is_set():
+            try:
+                if self._conn is None:
+                    self._connect()
+                    if reconnecting:
+                        self._apply(list(self._handlers))
+                    backoff = 1.0
+                self._apply(self._collect())
+            except Exception as e:
+                logger.warning(f"⚠️ Слушатель {CHANNEL} потерял соединение: {e}; повтор через {backoff:.0f} с")
+                self._close()
+                reconnecting = True
+                self._stop_event.wait(backoff)
+                backoff = min(backoff * 2, self.MAX_BACKOFF)
+        self._close()
+
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def start_config_listener():
+    """Запускает слушателя один раз на процесс. Вне Postgres ничего не делает."""
+    global _listener
+    from database import db
+    from config import CONFIG
+    from services.calendar_service import production_calendar
+
+    if CONFIG is None or not _is_postgres(db.engine):
+        return None
+    with _listener_lock:
+        if _listener is not None and _listener.is_alive():
+            return _listener
+        handlers = {section: (lambda s=section: CONFIG.refresh(s)) for section in SECTIONS if section != 'calendar'}
+        handlers['calendar'] = production_calendar.load_from_db
+        _listener = ConfigChangeListener(db, handlers)
+        _listener.start()
+        return _listener
+
+
+def stop_config_listener():
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
@@ -10,6 +10,8 @@ from sqlalchemy import text
 from bitrix.sync import BitrixSync
 from time_config import TIME_CONFIG
 from backup_manager import backup_manager
+from services.calendar_service import production_calendar
+import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -31,53 +33,24 @@ class CronManager:
 
     def __init__(self, application: Application):
         self.application = application
-        self.scheduler = AsyncIOScheduler(timezone=TIME_CONFIG.TIMEZONE)
-        self._calendar_cache: dict = {}  # Кэш производственного календаря
+        self.scheduler = metrics.instrument_scheduler(AsyncIOScheduler(timezone=TIME_CONFIG.TIMEZONE))
 
         from bitrix24_bot.client import BitrixBotClient
         self._b24_client = BitrixBotClient.from_env()
 
     async def is_workday(self, date: datetime) -> bool:
-        """Проверяет, является ли день рабочим (включая производственный календарь РФ)"""
-        # Стандартные выходные (сб, вс)
-        if date.weekday() in TIME_CONFIG.WEEKEND_DAYS:
-            return False
-        # Ручной список праздников из БД
-        if date.strftime("%Y-%m-%d") in CONFIG.holidays:
-            return False
-        # Производственный календарь РФ (переносы, официальные выходные)
-        return await self._check_production_calendar(date)
-
-    async def _check_production_calendar(self, date: datetime) -> bool:
-        """Проверяет производственный календарь через isdayoff.ru.
-        Возвращает True если день рабочий, False если выходной."""
-        date_key = date.strftime("%Y%m%d")
-
-        if date_key in self._calendar_cache:
-            return self._calendar_cache[date_key]
+        """Проверяет, является ли день рабочим (производственный календарь РФ + ручные праздники)"""
+        return production_calendar.is_workday(date, CONFIG.holidays)
 
-        try:
-            import httpx
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                response = await client.get(f"https://isdayoff.ru/{date_key}")
-                if response.status_code == 200:
-                    result = response.text.strip()
-                    if result == '1':
-                        is_work = False  # Выходной/праздник по производственному календарю
-                        logger.info(f"📅 Производственный календарь: {date_key} — выходной день")
-                    else:
-                        is_work = True  # '0' — рабочий, '100'/'101' — неизвестно, считаем рабочим
-                    self._calendar_cache[date_key] = is_work
-                    return is_work
-        except Exception as e:
-            logger.warning(f"⚠️ Не удалось проверить производственный календарь для {date_key}: {e}")
-
-        # Если API недоступен — считаем рабочим днём
-        return True
+    async def _refresh_production_calendar(self):
+        """Догружает производственный календарь на текущий и следующий год"""
+        await production_calendar.ensure_loaded()
 
     async def setup(self):
         """Инициализация cron-задач в боевом режиме"""
         logger.info(f"Начало настройки cron задач в {datetime.now(TIME_CONFIG.TIMEZONE)}")
+        # Календарь нужен до первой задачи: из БД, при отсутствии года — из isdayoff.ru
+        await production_calendar.ensure_loaded()
         self._add_production_jobs()
         self.scheduler.start()
         logger.info(f"Cron задачи настроены в боевом режиме в {datetime.now(TIME_CONFIG.TIMEZONE)}")
@@ -156,6 +129,17 @@ class CronManager:
         )
         logger.info(f"🔄 Синхронизация: {TIME_CONFIG.SYNC_EMPLOYEES_TIME.strftime('%H:%M')} (Пн-Пт)")
 
+        # Производственный календарь: раз в неделю пробуем догрузить следующий год
+        self.scheduler.add_job(
+            self._refresh_production_calendar,
+            'cron',
+            day_of_week='mon',
+            hour=4,
+            minute=0,
+            second=0
+        )
+        logger.info("📅 Производственный календарь: Пн 04:00")
+
         # Автоматическое резервное копирование (каждую ночь в 03:00)
         self.scheduler.add_job(
             self._create_backup,
@@ -330,7 +314,8 @@ class CronManager:
         """Автоматическое создание резервной копии базы данных"""
         try:
             logger.info("🔄 Запуск автоматического бекапа базы данных...")
-            backup_path = await backup_manager.create_backup(upload_to_cloud=True)
+            # Полная база раз в BACKUP_FULL_INTERVAL_DAYS, в остальные ночи — дельта
+            backup_path = await backup_manager.create_scheduled_backup(upload_to_cloud=True)
 
             if backup_path:
                 logger.info(f"✅ Автоматический бекап успешно создан: {backup_path}")
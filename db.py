@@ -3,7 +3,6 @@ from datetime import datetime
 import shutil
 import sqlite3
 import logging
-import pandas as pd
 from typing import Optional, List, Dict, Any
 import os
 from pathlib import Path
@@ -88,6 +87,7 @@ class Database:
     def _load_initial_data(self):
         """Загружает начальные данные из Excel файла только при первом запуске"""
         try:
+            import pandas as pd  # тяжёлый импорт — только когда действительно читаем Excel
             config_path = Path('data') / 'configs' / 'config.xlsx'
             if not config_path.exists():
                 logger.warning(f"Файл {config_path} не найден, пропускаем загрузку данных")
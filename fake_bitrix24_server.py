@@ -0,0 +1,414 @@
+"""
+Локальная замена REST API Bitrix24 для замеров скорости синхронизации.
+
+Поддерживает то, чем пользуется bitrix/sync.py:
+- crm.item.list / crm.item.add / crm.item.update / crm.item.fields
+  (смарт-процесс заказов 1222 и HR-карточки 1120);
+- batch — так fast_bitrix24 выкачивает страницы get_all и группирует call;
+- user.get / department.get — GET-запросы через REST-вебхук.
+
+Пагинация как у настоящего портала: 50 записей на страницу, start/next/total.
+Данные генерируются в памяти (--employees, --orders) и детерминированы по --seed.
+
+Запуск:
+    python fake_bitrix24_server.py --port 8766 --orders 1000 --latency-ms 80 --rate-limit 2
+
+    BITRIX_WEBHOOK=http://127.0.0.1:8766/rest/1/fake/ \\
+    BITRIX_REST_WEBHOOK=http://127.0.0.1:8766/rest/1/fake/ python bench_bitrix_sync.py ...
+
+--latency-ms/--jitter-ms: задержка каждого ответа.
+--rate-limit R и --burst B: «дырявое ведро» портала (R запросов в секунду,
+запас B); при переполнении — HTTP 503 QUERY_LIMIT_EXCEEDED.
+--error-rate P: доля случайных 503 для проверки повторов.
+GET /_stats — счётчики запросов по методам, POST /_stats/reset — обнулить.
+"""
+import sys
+import time
+import random
+import asyncio
+import argparse
+from collections import Counter
+from datetime import date, datetime, timedelta
+from urllib.parse import parse_qsl, unquote
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+PAGE_SIZE = 50
+BATCH_LIMIT = 50
+
+ORDERS_ENTITY = 1222
+HR_ENTITY = 1120
+
+# Коды списков — те же, что разбирает BitrixSync
+QUANTITY_CODES = ['821', '822', '823', '824', '825']
+LOCATION_CODES = ['826', '827', '828', '1063']
+STATUS_ACTIVE, STATUS_CANCELLED = '1061', '1062'
+WORK_TIME_CODES = ['1078', '1079', '1080']
+
+LAST_NAMES = [
+    'Иванов', 'Петров', 'Сидоров', 'Кузнецов', 'Смирнов', 'Попов', 'Соколов', 'Лебедев',
+    'Козлов', 'Новиков', 'Морозов', 'Волков', 'Алексеев', 'Павлов', 'Семёнов', 'Голубев',
+    'Виноградов', 'Богданов', 'Воробьёв', 'Фёдоров',
+]
+FIRST_NAMES = [
+    'Александр', 'Дмитрий', 'Максим', 'Сергей', 'Андрей', 'Алексей', 'Артём', 'Илья',
+    'Кирилл', 'Михаил', 'Никита', 'Матвей', 'Роман', 'Егор', 'Арсений', 'Иван',
+    'Денис', 'Евгений', 'Тимофей', 'Владимир',
+]
+MIDDLE_NAMES = [
+    'Александрович', 'Дмитриевич', 'Сергеевич', 'Андреевич', 'Алексеевич',
+    'Михайлович', 'Иванович', 'Петрович', 'Николаевич', 'Викторович',
+]
+DEPARTMENTS = ['Администрация', 'Бухгалтерия', 'Склад', 'Производство', 'Логистика', 'ИТ', 'Продажи']
+POSITIONS = ['Специалист', 'Инженер', 'Менеджер', 'Кладовщик', 'Оператор', 'Бухгалтер']
+
+STAFF_FIELD = 'ufCrm45_1743599470'
+
+
+class BitrixError(Exception):
+    def __init__(self, status: int, code: str, description: str):
+        super().__init__(description)
+        self.status = status
+        self.code = code
+        self.description = description
+
+
+def parse_php_query(query: str) -> dict:
+    """Разбирает строку вида select[0]=id&filter[>=createdTime]=... в вложенные dict/list.
+
+    Так fast_bitrix24 кодирует параметры команд внутри batch.
+    """
+    result = {}
+    for raw_key, value in parse_qsl(query, keep_blank_values=True):
+        key = unquote(raw_key)
+        head, _, rest = key.partition('[')
+        parts = [head] + ([p for p in rest.rstrip(']').split('][')] if rest else [])
+        node = result
+        for i, part in enumerate(parts):
+            last = i == len(parts) - 1
+            if isinstance(node, list):
+                if last:
+                    node.append(value)
+                    break
+                node.append({})
+                node = node[-1]
+                continue
+            if last:
+                node[part] = value
+            else:
+                following = parts[i + 1]
+                default = [] if following == '' or following.isdigit() else {}
+                node = node.setdefault(part, default)
+    return result
+
+
+def _iso(dt: datetime) -> str:
+    return dt.strftime('%Y-%m-%dT%H:%M:%S+03:00')
+
+
+class FakePortal:
+    """Данные портала в памяти и реализация методов REST"""
+
+    def __init__(self, employees: int = 300, orders: int = 1000, days: int = 30,
+                 seed: int = 42, today: date = None):
+        self.rng = random.Random(seed)
+        self.today = today or date.today()
+        self.days = days
+        self.departments = [{'ID': str(i + 1), 'NAME': name} for i, name in enumerate(DEPARTMENTS)]
+        self.users = []
+        self.items = {ORDERS_ENTITY: {}, HR_ENTITY: {}}
+        self.next_id = {ORDERS_ENTITY: 1, HR_ENTITY: 1}
+        self.staff_enum = []
+        self._seed_employees(employees)
+        self.seed_orders(orders)
+
+    # --- генерация данных ---
+
+    def _seed_employees(self, count: int):
+        for i in range(count):
+            last = LAST_NAMES[i % len(LAST_NAMES)]
+            first = FIRST_NAMES[(i // len(LAST_NAMES)) % len(FIRST_NAMES)]
+            middle = MIDDLE_NAMES[(i // (len(LAST_NAMES) * len(FIRST_NAMES))) % len(MIDDLE_NAMES)]
+            user_id = str(100 + i)
+            hired = self.today - timedelta(days=self.rng.randint(30, 3000))
+            self.users.append({
+                'ID': user_id,
+                'ACTIVE': True,
+                'LAST_NAME': last,
+                'NAME': first,
+                'SECOND_NAME': middle,
+                'WORK_POSITION': self.rng.choice(POSITIONS),
+                'UF_DEPARTMENT': [int(self.rng.choice(self.departments)['ID'])],
+                'PERSONAL_CITY': 'Москва',
+                'UF_EMPLOYMENT_DATE': hired.isoformat(),
+                'USER_TYPE': 'employee',
+            })
+            full_name = f"{last} {first} {middle}"
+            self.staff_enum.append({'ID': str(5000 + i), 'VALUE': full_name})
+            self._insert(HR_ENTITY, {
+                'title': full_name,
+                'ufCrm20DataTrydoystroistva': f"{hired.isoformat()}T00:00:00+03:00",
+                'ufCrm20WorkTime': self.rng.choice(WORK_TIME_CODES),
+            })
+
+    def seed_orders(self, count: int):
+        """Заказы, равномерно размазанные по последним --days дням"""
+        self.items[ORDERS_ENTITY].clear()
+        self.next_id[ORDERS_ENTITY] = 1
+        for _ in range(count):
+            index = self.rng.randrange(len(self.users))
+            user = self.users[index]
+            day = self.today - timedelta(days=self.rng.randrange(self.days))
+            created = datetime.combine(day, datetime.min.time()) + timedelta(
+                hours=7, minutes=self.rng.randint(0, 150), seconds=self.rng.randint(0, 59))
+            self._insert(ORDERS_ENTITY, {
+                'ufCrm45_1751956286': user['ID'],
+                STAFF_FIELD: self.staff_enum[index]['ID'],
+                'ufCrm45ObedyCount': self.rng.choice(QUANTITY_CODES),
+                'ufCrm45ObedyFrom': self.rng.choice(LOCATION_CODES),
+                'ufCrm45_1744188327370': STATUS_CANCELLED if self.rng.random() < 0.05 else STATUS_ACTIVE,
+                'createdTime': _iso(created),
+                'createdBy': 24,
+                'updatedBy': 24,
+                'assignedById': 24,
+                'sourceDescription': '',
+            })
+
+    def _insert(self, entity: int, fields: dict) -> dict:
+        item_id = self.next_id[entity]
+        self.next_id[entity] += 1
+        item = {'id': item_id, 'entityTypeId': entity, **fields}
+        self.items[entity][item_id] = item
+        return item
+
+    # --- методы ---
+
+    @staticmethod
+    def _page(rows: list, params: dict) -> tuple:
+        start = int(params.get('start') or 0)
+        page = rows[start:start + PAGE_SIZE]
+        extra = {'total': len(rows)}
+        if start + PAGE_SIZE < len(rows):
+            extra['next'] = start + PAGE_SIZE
+        return page, extra
+
+    @staticmethod
+    def _matches(item: dict, filters: dict) -> bool:
+        for key, expected in filters.items():
+            op = ''
+            while key[:1] in ('>', '<', '=', '!', '@'):
+                op, key = op + key[0], key[1:]
+            value = item.get(key)
+            if op in ('', '='):
+                ok = str(value) == str(expected)
+            elif op == '!':
+                ok = str(value) != str(expected)
+            elif op == '@':
+                ok = str(value) in [str(v) for v in (expected if isinstance(expected, list) else [expected])]
+            elif value is None:
+                ok = False
+            elif op == '>=':
+                ok = str(value) >= str(expected)
+            elif op == '<=':
+                ok = str(value) <= str(expected)
+            elif op == '>':
+                ok = str(value) > str(expected)
+            elif op == '<':
+                ok = str(value) < str(expected)
+            else:
+                raise BitrixError(400, 'INVALID_ARG_VALUE', f"Unsupported filter operator {op}")
+            if not ok:
+                return False
+        return True
+
+    def _entity(self, params: dict) -> dict:
+        try:
+            return self.items[int(params.get('entityTypeId'))]
+        except (TypeError, ValueError, KeyError):
+            raise BitrixError(400, 'NOT_FOUND', 'Smart process not found')
+
+    def crm_item_list(self, params: dict):
+        items = self._entity(params)
+        filters = params.get('filter') or {}
+        rows = [item for item in items.values() if self._matches(item, filters)]
+        select = params.get('select') or []
+        if isinstance(select, dict):
+            select = list(select.values())
+        if select and '*' not in select:
+            keep = set(select) | {'id'}
+            rows = [{k: v for k, v in row.items() if k in keep} for row in rows]
+        page, extra = self._page(rows, params)
+        return {'items': page}, extra
+
+    def crm_item_add(self, params: dict):
+        entity = int(params.get('entityTypeId') or 0)
+        self._entity(params)
+        item = self._insert(entity, dict(params.get('fields') or {}))
+        return {'item': item}, {}
+
+    def crm_item_update(self, params: dict):
+        items = self._entity(params)
+        item = items.get(int(params.get('id') or 0))
+        if item is None:
+            raise BitrixError(400, 'NOT_FOUND', 'Element not found')
+        item.update(params.get('fields') or {})
+        return {'item': item}, {}
+
+    def crm_item_fields(self, params: dict):
+        self._entity(params)
+        return {'fields': {
+            STAFF_FIELD: {
+                'type': 'enumeration', 'title': 'Сотрудник', 'isMultiple': False,
+                'items': self.staff_enum,
+            },
+            'ufCrm45ObedyCount': {
+                'type': 'enumeration', 'title': 'Количество обедов', 'isMultiple': False,
+                'items': [{'ID': code, 'VALUE': str(i + 1)} for i, code in enumerate(QUANTITY_CODES)],
+            },
+            'createdTime': {'type': 'datetime', 'title': 'Дата создания', 'isMultiple': False},
+        }}, {}
+
+    def user_get(self, params: dict):
+        filters = params.get('FILTER') or {}
+        rows = [user for user in self.users
+                if all(str(user.get(k)) == str(v) for k, v in filters.items())]
+        return self._page(rows, params)
+
+    def department_get(self, params: dict):
+        return self._page(self.departments, params)
+
+    def dispatch(self, method: str, params: dict):
+        handler = getattr(self, method.replace('.', '_'), None)
+        if handler is None or method.startswith('_') or method in ('dispatch', 'seed_orders'):
+            raise BitrixError(404, 'ERROR_METHOD_NOT_FOUND', 'Method not found!')
+        return handler(params)
+
+
+class LeakyBucket:
+    """Ограничение частоты как у Bitrix24: запас burst запросов, утекает rate в секунду"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.level = 0.0
+        self.updated = time.monotonic()
+
+    def allow(self) -> bool:
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        self.level = max(0.0, self.level - (now - self.updated) * self.rate)
+        self.updated = now
+        if self.level + 1 > self.burst:
+            return False
+        self.level += 1
+        return True
+
+
+def create_app(portal: FakePortal, latency_ms: float = 0, jitter_ms: float = 0,
+               rate_limit: float = 0, burst: int = 50, error_rate: float = 0) -> FastAPI:
+    app = FastAPI(title="Fake Bitrix24", docs_url=None, redoc_url=None)
+    bucket = LeakyBucket(rate_limit, burst)
+    stats = {'requests': Counter(), 'calls': Counter(), 'rejected': Counter()}
+    rng = random.Random()
+
+    def error(exc: BitrixError) -> JSONResponse:
+        return JSONResponse(status_code=exc.status,
+                            content={'error': exc.code, 'error_description': exc.description})
+
+    def timing(started: float) -> dict:
+        finished = time.time()
+        return {'start': started, 'finish': finished, 'duration': finished - started,
+                'processing': finished - started, 'operating': 0}
+
+    def run_batch(params: dict):
+        commands = params.get('cmd') or {}
+        if len(commands) > BATCH_LIMIT:
+            raise BitrixError(400, 'ERROR_BATCH_LENGTH_EXCEEDED', 'Max batch length exceeded')
+        halt = str(params.get('halt', '0')) not in ('0', 'false', '')
+        out = {'result': {}, 'result_error': {}, 'result_total': {}, 'result_next': {}, 'result_time': {}}
+        for key, command in commands.items():
+            method, _, query = command.partition('?')
+            started = time.time()
+            stats['calls'][method] += 1
+            try:
+                result, extra = portal.dispatch(method, parse_php_query(query))
+            except BitrixError as e:
+                out['result_error'][key] = {'error': e.code, 'error_description': e.description}
+                if halt:
+                    break
+                continue
+            out['result'][key] = result
+            if 'total' in extra:
+                out['result_total'][key] = extra['total']
+            if 'next' in extra:
+                out['result_next'][key] = extra['next']
+            out['result_time'][key] = timing(started)
+        # Пустые группы портал отдаёт списком, а не объектом
+        return {k: (v if v else []) for k, v in out.items()}, {}
+
+    @app.get("/_stats")
+    async def get_stats():
+        return {name: dict(counter) for name, counter in stats.items()}
+
+    @app.post("/_stats/reset")
+    async def reset_stats():
+        for counter in stats.values():
+            counter.clear()
+        return {'ok': True}
+
+    @app.api_route("/rest/{user_id}/{token}/{method}", methods=['GET', 'POST'])
+    async def rest(method: str, request: Request):
+        started = time.time()
+        method = method[:-5] if method.endswith('.json') else method
+        stats['requests'][method] += 1
+
+        delay = latency_ms + (rng.uniform(0, jitter_ms) if jitter_ms else 0)
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        if not bucket.allow() or (error_rate and rng.random() < error_rate):
+            stats['rejected'][method] += 1
+            return error(BitrixError(503, 'QUERY_LIMIT_EXCEEDED', 'Too many requests'))
+
+        params = parse_php_query(request.url.query)
+        if request.method == 'POST':
+            if request.headers.get('content-type', '').startswith('application/json'):
+                params.update(await request.json() or {})
+            else:
+                params.update(parse_php_query((await request.body()).decode()))
+
+        try:
+            if method == 'batch':
+                result, extra = run_batch(params)
+            else:
+                stats['calls'][method] += 1
+                result, extra = portal.dispatch(method, params)
+        except BitrixError as e:
+            return error(e)
+        return {'result': result, **extra, 'time': timing(started)}
+
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Локальная замена REST API Bitrix24')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--employees', type=int, default=300, help='сотрудников в user.get и в enum «Сотрудник»')
+    parser.add_argument('--orders', type=int, default=1000, help='заказов в смарт-процессе 1222')
+    parser.add_argument('--days', type=int, default=30, help='за сколько последних дней размазать заказы')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--latency-ms', type=float, default=0, help='задержка каждого ответа')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='случайная добавка к задержке')
+    parser.add_argument('--rate-limit', type=float, default=0, help='запросов в секунду (0 — без ограничения)')
+    parser.add_argument('--burst', type=int, default=50, help='запас запросов сверх --rate-limit')
+    parser.add_argument('--error-rate', type=float, default=0, help='доля случайных ответов 503')
+    args = parser.parse_args()
+
+    portal = FakePortal(args.employees, args.orders, args.days, args.seed)
+    print(f"Fake Bitrix24: http://{args.host}:{args.port}/rest/1/fake/ "
+          f"({args.employees} сотрудников, {args.orders} заказов)", file=sys.stderr)
+    uvicorn.run(create_app(portal, args.latency_ms, args.jitter_ms, args.rate_limit, args.burst, args.error_rate),
+                host=args.host, port=args.port)
@@ -0,0 +1,155 @@
+"""
+Локальная замена Telegram для проверки webhook-режима (telegram_webhook.py).
+
+Шлёт на webhook бота синтетические апдейты — текстовые сообщения, команды и
+нажатия inline-кнопок от --users разных пользователей — с секретом в заголовке
+X-Telegram-Bot-Api-Secret-Token, как это делает Telegram, и печатает коды
+ответов и задержку приёма.
+
+Запуск (бот с TELEGRAM_WEBHOOK_URL=https://... и TELEGRAM_WEBHOOK_SECRET=test):
+    python fake_telegram_poster.py --url http://127.0.0.1:8443/telegram/webhook \\
+        --secret test --count 500 --concurrency 20 --users 50
+
+--check-secret: дополнительно проверить, что запрос без секрета и с неверным
+секретом получает 403, а мусор вместо JSON — 400.
+Ответы бота уходят в настоящий Bot API, поэтому для нагрузочных прогонов
+используйте тестового бота и id пользователей, которым можно писать.
+"""
+import sys
+import time
+import random
+import asyncio
+import argparse
+from collections import Counter
+
+import httpx
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+TEXTS = ['Привет', 'Меню', 'Заказать обед', 'Мои заказы', 'Отменить']
+COMMANDS = ['/start', '/menu', '/orders', '/help']
+CALLBACKS = ['menu', 'order_1', 'order_2', 'cancel_order', 'back']
+
+
+class UpdateFactory:
+    """Генерирует апдейты в формате Bot API с растущими update_id"""
+
+    def __init__(self, users: int, first_user_id: int, seed: int):
+        self.users = users
+        self.first_user_id = first_user_id
+        self.random = random.Random(seed)
+        self.update_id = int(time.time())
+        self.message_id = 1
+
+    def _user(self):
+        user_id = self.first_user_id + self.random.randrange(self.users)
+        return {'id': user_id, 'is_bot': False, 'first_name': f'Тест {user_id}', 'language_code': 'ru'}
+
+    def _message(self, user, text):
+        self.message_id += 1
+        message = {
+            'message_id': self.message_id,
+            'from': user,
+            'chat': {'id': user['id'], 'type': 'private', 'first_name': user['first_name']},
+            'date': int(time.time()),
+            'text': text,
+        }
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text)}]
+        return message
+
+    def next(self) -> dict:
+        self.update_id += 1
+        user = self._user()
+        kind = self.random.random()
+        if kind < 0.4:
+            return {'update_id': self.update_id, 'message': self._message(user, self.random.choice(TEXTS))}
+        if kind < 0.6:
+            return {'update_id': self.update_id, 'message': self._message(user, self.random.choice(COMMANDS))}
+        return {
+            'update_id': self.update_id,
+            'callback_query': {
+                'id': str(self.update_id),
+                'from': user,
+                'chat_instance': str(user['id']),
+                'message': self._message({'id': 1, 'is_bot': True, 'first_name': 'bot'}, 'Меню'),
+                'data': self.random.choice(CALLBACKS),
+            },
+        }
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def check_secret(client: httpx.AsyncClient, url: str, secret: str, factory: UpdateFactory) -> bool:
+    cases = [
+        ('без секрета', {}, factory.next(), 403),
+        ('неверный секрет', {SECRET_HEADER: secret + 'x'}, factory.next(), 403),
+        ('битый JSON', {SECRET_HEADER: secret}, None, 400),
+    ]
+    ok = True
+    for name, headers, update, expected in cases:
+        if update is None:
+            response = await client.post(url, content=b'{not json', headers=headers)
+        else:
+            response = await client.post(url, json=update, headers=headers)
+        passed = response.status_code == expected
+        ok &= passed
+        print(f"  {'✅' if passed else '❌'} {name}: HTTP {response.status_code} (ожидали {expected})")
+    return ok
+
+
+async def post_updates(url: str, secret: str, count: int, concurrency: int, factory: UpdateFactory):
+    statuses = Counter()
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(timeout=30, trust_env=False) as client:
+        async def post(update):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await client.post(url, json=update, headers={SECRET_HEADER: secret})
+                    statuses[response.status_code] += 1
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(post(factory.next()) for _ in range(count)))
+        elapsed = time.perf_counter() - started
+    return statuses, latencies, elapsed
+
+
+async def main(args) -> int:
+    factory = UpdateFactory(args.users, args.first_user_id, args.seed)
+    if args.check_secret:
+        print("Проверка секрета и формата:")
+        async with httpx.AsyncClient(timeout=30, trust_env=False) as client:
+            if not await check_secret(client, args.url, args.secret, factory):
+                return 1
+
+    statuses, latencies, elapsed = await post_updates(args.url, args.secret, args.count, args.concurrency, factory)
+    print(f"Отправлено {args.count} апдейтов за {elapsed:.2f} с ({args.count / elapsed:.0f}/с), "
+          f"параллельно {args.concurrency}")
+    print("Ответы: " + ", ".join(f"{status} ×{n}" for status, n in sorted(statuses.items(), key=str)))
+    print(f"Приём, мс: p50 {_percentile(latencies, 0.5) * 1000:.1f}, "
+          f"p95 {_percentile(latencies, 0.95) * 1000:.1f}, max {max(latencies, default=0) * 1000:.1f}")
+    return 0 if statuses.get(200) == args.count else 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Синтетические апдейты Telegram для webhook бота')
+    parser.add_argument('--url', default='http://127.0.0.1:8443/telegram/webhook')
+    parser.add_argument('--secret', required=True, help='TELEGRAM_WEBHOOK_SECRET бота')
+    parser.add_argument('--count', type=int, default=100, help='сколько апдейтов отправить')
+    parser.add_argument('--concurrency', type=int, default=10, help='одновременных запросов')
+    parser.add_argument('--users', type=int, default=20, help='сколько разных пользователей')
+    parser.add_argument('--first-user-id', type=int, default=100000000, help='id первого пользователя')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--check-secret', action='store_true', help='проверить ответы 403/400')
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args)))
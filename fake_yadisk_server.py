@@ -0,0 +1,160 @@
+"""
+Локальная замена REST API Яндекс.Диска для проверки загрузки бекапов.
+
+Поддерживает то, чем пользуется yadisk_uploader.py: создание папки,
+ссылку на загрузку, PUT (целиком и частями с Content-Range), метаданные
+с md5/sha256, перемещение и удаление. Файлы складываются в --root.
+
+Запуск:
+    python fake_yadisk_server.py --port 8765 --fail-every 3
+
+    YANDEX_DISK_TOKEN=test YANDEX_DISK_API_URL=http://127.0.0.1:8765/v1/disk \\
+        python -c "import asyncio; from backup_manager import backup_manager as b; asyncio.run(b.create_backup())"
+
+--fail-every N: каждая N-я часть обрывается на середине (ответ 503),
+чтобы проверить докачку.
+"""
+import sys
+import hashlib
+import argparse
+import itertools
+import secrets
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+
+def create_app(root: Path, token: str = None, fail_every: int = 0) -> FastAPI:
+    app = FastAPI(title="Fake Yandex.Disk", docs_url=None, redoc_url=None)
+    uploads = {}  # upload_id -> путь на Диске
+    put_counter = itertools.count(1)
+
+    def local(disk_path: str) -> Path:
+        return root / disk_path.replace('disk:', '').lstrip('/')
+
+    def authorized(request: Request) -> bool:
+        header = request.headers.get('Authorization', '')
+        if not header.startswith('OAuth '):
+            return False
+        return token is None or header[6:] == token
+
+    def error(status: int, message: str) -> JSONResponse:
+        return JSONResponse(status_code=status, content={'error': message, 'description': message})
+
+    @app.middleware("http")
+    async def check_auth(request: Request, call_next):
+        if request.url.path.startswith('/v1/') and not authorized(request):
+            return error(401, 'UnauthorizedError')
+        return await call_next(request)
+
+    @app.put("/v1/disk/resources")
+    async def mkdir(path: str):
+        target = local(path)
+        if target.exists():
+            return error(409, 'DiskPathPointsToExistentDirectoryError')
+        target.mkdir(parents=True)
+        return JSONResponse(status_code=201, content={'href': str(path)})
+
+    @app.get("/v1/disk/resources/upload")
+    async def upload_link(request: Request, path: str, overwrite: str = 'false'):
+        if local(path).exists() and overwrite != 'true':
+            return error(409, 'DiskResourceAlreadyExistsError')
+        upload_id = secrets.token_hex(8)
+        uploads[upload_id] = path
+        return {'href': f"{request.base_url}upload/{upload_id}", 'method': 'PUT', 'templated': False}
+
+    @app.put("/upload/{upload_id}")
+    async def upload(upload_id: str, request: Request):
+        if upload_id not in uploads:
+            return Response(status_code=404)
+        target = local(uploads[upload_id])
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fail = fail_every and next(put_counter) % fail_every == 0
+
+        content_range = request.headers.get('Content-Range')
+        if content_range:
+            # bytes start-end/total
+            span, total = content_range.replace('bytes ', '').split('/')
+            start, end = (int(x) for x in span.split('-'))
+            total = int(total)
+            current = target.stat().st_size if target.exists() else 0
+            if start > current:
+                return Response(status_code=416)
+        else:
+            start, end, total = 0, None, None
+
+        received = 0
+        length = int(request.headers.get('Content-Length', '0'))
+        with open(target, 'r+b' if target.exists() else 'wb') as f:
+            f.seek(start)
+            f.truncate()
+            async for block in request.stream():
+                if fail and received + len(block) > length // 2:
+                    # Имитация обрыва: часть байтов записана, ответ — ошибка
+                    f.write(block[:max(length // 2 - received, 0)])
+                    return Response(status_code=503)
+                f.write(block)
+                received += len(block)
+
+        if end is not None and end + 1 < total:
+            return Response(status_code=202)
+        uploads.pop(upload_id, None)
+        return Response(status_code=201)
+
+    @app.get("/v1/disk/resources")
+    async def meta(path: str, fields: str = None):
+        target = local(path)
+        if not target.exists():
+            return error(404, 'DiskNotFoundError')
+        if target.is_dir():
+            return {'name': target.name, 'path': path, 'type': 'dir'}
+        data = target.read_bytes()
+        return {
+            'name': target.name,
+            'path': path,
+            'type': 'file',
+            'size': len(data),
+            'md5': hashlib.md5(data).hexdigest(),
+            'sha256': hashlib.sha256(data).hexdigest(),
+            'created': datetime.fromtimestamp(target.stat().st_mtime, timezone.utc).isoformat(),
+        }
+
+    @app.post("/v1/disk/resources/move")
+    async def move(request: Request, path: str, overwrite: str = 'false'):
+        src = local(request.query_params['from'])
+        dst = local(path)
+        if not src.exists():
+            return error(404, 'DiskNotFoundError')
+        if dst.exists() and overwrite != 'true':
+            return error(409, 'DiskResourceAlreadyExistsError')
+        src.replace(dst)
+        return JSONResponse(status_code=201, content={'href': path})
+
+    @app.delete("/v1/disk/resources")
+    async def remove(path: str):
+        target = local(path)
+        if not target.exists():
+            return error(404, 'DiskNotFoundError')
+        target.unlink()
+        return Response(status_code=204)
+
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Локальная замена REST API Яндекс.Диска')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--root', type=Path, default=None, help='каталог для файлов (по умолчанию — временный)')
+    parser.add_argument('--token', default=None, help='принимать только этот OAuth-токен')
+    parser.add_argument('--fail-every', type=int, default=0, help='обрывать каждую N-ю загрузку части')
+    args = parser.parse_args()
+
+    root = args.root or Path(tempfile.mkdtemp(prefix='fake_yadisk_'))
+    root.mkdir(parents=True, exist_ok=True)
+    print(f"Fake Yandex.Disk: http://{args.host}:{args.port}/v1/disk, файлы в {root}", file=sys.stderr)
+    uvicorn.run(create_app(root, args.token, args.fail_every), host=args.host, port=args.port)
@@ -109,6 +109,8 @@ async def manual_push_orders_callback(update: Update, context: ContextTypes.DEFA
                 f"📅 Дата: {pending_info['date']}\n\n"
                 "Проверьте логи для деталей ошибок."
             )
+            if new_pending.get('last_push_summary'):
+                result_msg += f"\n\n{new_pending['last_push_summary']}"
         
         await query.edit_message_text(result_msg)
         await sync.close()
@@ -209,7 +211,7 @@ def setup_handlers(application):
         user = update.effective_user
         
         # Принудительно перезагружаем конфиг
-        CONFIG.reload()
+        CONFIG.reload(force=True)
         
         # Импортируем TIME_CONFIG
         from time_config import TIME_CONFIG
@@ -26,6 +26,7 @@ from pathlib import Path
 from database import db
 from models import User, Holiday
 from config import CONFIG
+from config_notify import notify_config_changed
 from constants import (
     ADD_ACCOUNTANT, ADD_ADMIN, ADD_HOLIDAY_DATE, ADD_HOLIDAY_NAME,
     ADD_PROVIDER, ADD_STAFF, CONFIG_MENU, DELETE_ACCOUNTANT, DELETE_ADMIN,
@@ -101,6 +102,7 @@ def update_env_file(key: str, value: str):
     from database import db
     from config import CONFIG
     CONFIG.reload()
+    notify_config_changed('env')
 
 async def config_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Главное меню управления конфигурацией"""
@@ -732,6 +734,8 @@ async def handle_deletion(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     message = f"✅ Сотрудник '{employee.full_name}' деактивирован"
 
                 db.session.commit()
+                CONFIG.refresh('staff')
+                notify_config_changed('staff')
 
                 # Обновляем интерфейс
                 try:
@@ -762,10 +766,11 @@ async def handle_deletion(update: Update, context: ContextTypes.DEFAULT_TYPE):
             result = db.session.query(Holiday).filter(Holiday.date == holiday_date).delete()
             db.session.commit()
                 
-            # ОБНОВЛЯЕМ КОНФИГУРАЦИЮ БЕЗ ПЕРЕЗАПУСКА
+            # ОБНОВЛЯЕМ КОНФИГУРАЦИЮ БЕЗ ПЕРЕЗАПУСКА (и в остальных ботах)
             from database import db
             from config import CONFIG
-            CONFIG.reload()
+            CONFIG.refresh('holidays')
+            notify_config_changed('holidays')
                 
             try:
                 await query.edit_message_text(
@@ -824,6 +829,8 @@ async def handle_add_staff(update: Update, context: ContextTypes.DEFAULT_TYPE):
             existing.telegram_id = None
             existing.updated_at = datetime.now()
             db.session.commit()
+            CONFIG.refresh('staff')
+            notify_config_changed('staff')
             
             await update.message.reply_text(
                 f"✅ Сотрудник '{full_name}' восстановлен (ожидает регистрации)",
@@ -847,6 +854,8 @@ async def handle_add_staff(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     db.session.add(new_employee)
     db.session.commit()
+    CONFIG.refresh('staff')
+    notify_config_changed('staff')
 
     await update.message.reply_text(
         f"✅ Сотрудник '{full_name}' добавлен. Теперь он может пройти регистрацию.",
@@ -1023,9 +1032,10 @@ async def handle_holiday_name(update: Update, context: ContextTypes.DEFAULT_TYPE
             session.add(new_holiday)
             session.commit()
             
-        # 🔥 ОБНОВЛЯЕМ КОНФИГУРАЦИЮ
+        # 🔥 ОБНОВЛЯЕМ КОНФИГУРАЦИЮ (и в остальных ботах)
         from config import CONFIG
-        CONFIG.reload()
+        CONFIG.refresh('holidays')
+        notify_config_changed('holidays')
         
         await update.message.reply_text(
             f"✅ Праздник '{holiday_name}' на {date_str} добавлен и сразу доступен в боте",
@@ -489,19 +489,21 @@ async def admin_reports_menu(update: Update, context: ContextTypes.DEFAULT_TYPE)
     
     # 🔥 ФОНОВАЯ СИНХРОНИЗАЦИЯ В ОТДЕЛЬНОЙ ЗАДАЧЕ
     async def background_sync():
-        try:
-            from bitrix.sync import BitrixSync
-            from datetime import datetime, timedelta
-            
-            sync = BitrixSync()
-            end_date = datetime.now().strftime('%Y-%m-%d')
-            start_date = (datetime.now() - timedelta(days=2)).strftime('%Y-%m-%d')
-            
-            await sync.sync_orders(start_date, end_date, incremental=True)
-            logger.info(f"✅ Фоновая синхронизация выполнена для пользователя {user.id}")
-            
-        except Exception as e:
-            logger.error(f"Ошибка фоновой синхронизации: {e}")
+        # Сессия апдейта закроется раньше, чем закончится синхронизация — берём свою
+        with db.background_scope('telegram:background_sync'):
+            try:
+                from bitrix.sync import BitrixSync
+                from datetime import datetime, timedelta
+                
+                sync = BitrixSync()
+                end_date = datetime.now().strftime('%Y-%m-%d')
+                start_date = (datetime.now() - timedelta(days=2)).strftime('%Y-%m-%d')
+                
+                await sync.sync_orders(start_date, end_date, incremental=True)
+                logger.info(f"✅ Фоновая синхронизация выполнена для пользователя {user.id}")
+                
+            except Exception as e:
+                logger.error(f"Ошибка фоновой синхронизации: {e}")
     
     # Запускаем в фоне без ожидания
     import asyncio
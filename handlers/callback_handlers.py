@@ -3,11 +3,12 @@ import logging
 from telegram.ext import ContextTypes
 from telegram import Update, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardRemove
 from datetime import datetime, time, timedelta
-from database import db, User, Order
+from database import db, User
 from config import CONFIG
 from telegram.ext import CommandHandler, MessageHandler, CallbackQueryHandler, ConversationHandler, filters
 
 from handlers.common import show_main_menu
+from services.order_service import modify_quantity, cancel_order as cancel_order_in_db
 from handlers.common_handlers import view_orders
 from handlers.order_callbacks import handle_cancel_callback, handle_change_callback, handle_confirm_callback, handle_order_callback, modify_portion_count
 from utils import can_modify_order
@@ -19,7 +20,7 @@ async def handle_quantity_change(query, now, user, context):
     """
     Обработчик изменения количества порций в заказе.
     Выполняет:
-    - Увеличение/уменьшение количества порций с проверкой лимитов
+    - Увеличение/уменьшение количества порций с проверкой лимитов (MAX_PORTIONS)
     - Автоматическую отмену заказа при уменьшении до 0 порций
     - Проверку временного окна для изменений (до 9:30)
     - Обновление представления дня через refresh_day_view
@@ -28,7 +29,6 @@ async def handle_quantity_change(query, now, user, context):
         action, day_offset_str = query.data.split("_", 1)
         day_offset = int(day_offset_str)
         target_date = (now + timedelta(days=day_offset)).date()
-        max_portions = 3
 
         if not can_modify_order(target_date):
             await query.answer("ℹ️ Изменение невозможно после 9:30", show_alert=True)
@@ -44,42 +44,31 @@ async def handle_quantity_change(query, now, user, context):
             return
         user_db_id = user_record.id
 
-        # Получаем заказ через SQLAlchemy
-        order = db.session.query(Order).filter(
-            Order.user_id == user_db_id,
-            Order.target_date == target_date,
-            Order.is_cancelled == False
-        ).first()
-        
-        if not order:
-            await query.answer("❌ Заказ не найден", show_alert=True)
-            return
-        
-        current_quantity = order.quantity
-
         if action == "increase":
-            if current_quantity >= max_portions:
-                await query.answer("ℹ️ Максимальное количество порций (3) достигнуто", show_alert=True)
-                return
-            order.quantity = current_quantity + 1
-            feedback = f"✅ Увеличено до {order.quantity} порций"
-            
+            delta = 1
         elif action == "decrease":
-            if current_quantity <= 1:
-                # Отмена заказа при уменьшении до 0
-                await cancel_order(query, user_db_id, target_date, now)
-                return
-                
-            order.quantity = current_quantity - 1
-            feedback = f"✅ Уменьшено до {order.quantity} порций"
-            
+            delta = -1
         else:
             await query.answer("⚠️ Неизвестное действие")
             return
 
-        # Обновляем время заказа и сохраняем
-        order.order_time = now.strftime("%H:%M:%S")
+        # Одним UPDATE ... SET quantity = quantity + delta с проверкой границ в WHERE
+        new_qty, order, error = modify_quantity(
+            user_db_id, target_date, delta, db.session, allow_bitrix=True
+        )
+        if error:
+            await query.answer(f"ℹ️ {error}", show_alert=True)
+            return
+        if new_qty == 0:
+            # Отмена заказа при уменьшении до 0
+            await cancel_order(query, user_db_id, target_date, now)
+            return
+
         db.session.commit()
+        if delta > 0:
+            feedback = f"✅ Увеличено до {new_qty} порций"
+        else:
+            feedback = f"✅ Уменьшено до {new_qty} порций"
 
         await refresh_day_view(query, day_offset, user_db_id, now)
         await query.answer(feedback)
@@ -94,20 +83,11 @@ async def cancel_order(query, user_db_id, target_date, now):
     """
     Общая функция отмены заказа
     """
-    # Находим и обновляем заказ через SQLAlchemy
-    order = db.session.query(Order).filter(
-        Order.user_id == user_db_id,
-        Order.target_date == target_date,
-        Order.is_cancelled == False
-    ).first()
+    # Отменяем одним UPDATE ... RETURNING — сразу получаем актуальный bitrix_order_id
+    order, error = cancel_order_in_db(user_db_id, target_date, db.session, allow_bitrix=True)
     
     if order:
-        # 🔥 Принудительно обновляем объект из БД, чтобы получить актуальный bitrix_order_id
-        db.session.refresh(order)
         bitrix_id_to_cancel = order.bitrix_order_id
-
-        order.is_cancelled = True
-        order.order_time = now.strftime("%H:%M:%S")
         db.session.commit()
 
         # 🔥 Если заказ уже отправлен в Bitrix — отменяем его там тоже
@@ -160,20 +140,11 @@ async def handle_cancel_order(update: Update, context: ContextTypes.DEFAULT_TYPE
             return
         user_db_id = user_record.id
 
-        # Отменяем заказ через SQLAlchemy
-        order = db.session.query(Order).filter(
-            Order.user_id == user_db_id,
-            Order.target_date == target_date,
-            Order.is_cancelled == False
-        ).first()
+        # Отменяем одним UPDATE ... RETURNING — сразу получаем актуальный bitrix_order_id
+        order, error = cancel_order_in_db(user_db_id, target_date, db.session, allow_bitrix=True)
         
         if order:
-            # 🔥 Принудительно обновляем объект из БД, чтобы получить актуальный bitrix_order_id
-            db.session.refresh(order)
             bitrix_id_to_cancel = order.bitrix_order_id
-
-            order.is_cancelled = True
-            order.order_time = now.strftime("%H:%M:%S")
             db.session.commit()
 
             # 🔥 Если заказ уже отправлен в Bitrix — отменяем его там тоже
@@ -8,6 +8,8 @@ from config import CONFIG
 from datetime import datetime
 from time_config import TIME_CONFIG
 from backup_manager import backup_manager
+import sampling_profiler
+from io import BytesIO
 
 async def notifications_on(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Включение уведомлений"""
@@ -111,6 +113,8 @@ async def manual_sync_command(update: Update, context: ContextTypes.DEFAULT_TYPE
                 f"📅 Дата: {pending_info['date']}\n\n"
                 f"🔍 Проверьте логи для деталей."
             )
+        if new_pending.get('last_push_summary'):
+            result_text += f"\n\n{new_pending['last_push_summary']}"
         
         await status_msg.edit_text(result_text)
         await sync.close()
@@ -208,7 +212,7 @@ async def restore_list_command(update: Update, context: ContextTypes.DEFAULT_TYP
         msg += f"💾 Локальные ({len(backups['local'])}):\n"
         if backups['local']:
             for i, backup in enumerate(backups['local'][:7], 1):  # Последние 7
-                msg += f"  {i}. {backup['name']}\n"
+                msg += f"  {i}. {backup['name']}{_chain_suffix(backup)}\n"
                 msg += f"     {backup['size_mb']:.2f} МБ | {backup['created']}\n"
         else:
             msg += "  Нет локальных бекапов\n"
@@ -219,7 +223,7 @@ async def restore_list_command(update: Update, context: ContextTypes.DEFAULT_TYP
         if backups['cloud']:
             msg += f"☁️ Яндекс.Диск ({len(backups['cloud'])}):\n"
             for backup in backups['cloud']:
-                msg += f"  • {backup['name']}\n"
+                msg += f"  • {backup['name']}{_chain_suffix(backup)}\n"
                 msg += f"    {backup['size_mb']:.2f} МБ | {backup['created']}\n"
         elif backup_manager.yadisk_client:
             msg += "☁️ Яндекс.Диск: нет бекапов\n"
@@ -231,6 +235,8 @@ async def restore_list_command(update: Update, context: ContextTypes.DEFAULT_TYP
         msg += "  /restore <номер> - восстановить из локального\n"
         msg += "  /restore cloud:<имя> - восстановить из облака\n"
         msg += "  /restore - показать этот список\n"
+        msg += "\n🧩 Дельты цепочки накатываются автоматически;\n"
+        msg += "  --base-only - только полный бекап, без дельт\n"
 
         await update.message.reply_text(msg)
 
@@ -238,6 +244,17 @@ async def restore_list_command(update: Update, context: ContextTypes.DEFAULT_TYP
         await update.message.reply_text(f"❌ Ошибка: {str(e)}")
 
 
+def _chain_suffix(backup: dict) -> str:
+    return f" (+{len(backup['deltas'])} дельт)" if backup.get('deltas') else ""
+
+
+def _describe_chain(delta_names: list) -> str:
+    """Строка о дельтах цепочки для подтверждения восстановления"""
+    if not delta_names:
+        return "🧩 Дельты: нет — только полный бекап"
+    return f"🧩 Дельты: {len(delta_names)}, последняя {delta_names[-1]}"
+
+
 async def restore_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Команда для восстановления базы данных из бекапа"""
     user_id = update.effective_user.id
@@ -258,7 +275,10 @@ async def restore_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     arg = context.args[0]
 
     # Проверяем подтверждение
-    confirm = len(context.args) > 1 and context.args[1] == '--confirm'
+    flags = set(context.args[1:])
+    confirm = '--confirm' in flags
+    base_only = '--base-only' in flags
+    confirm_hint = f"/restore {arg}" + (" --base-only" if base_only else "") + " --confirm"
 
     try:
         backups = backup_manager.list_available_backups()
@@ -277,15 +297,17 @@ async def restore_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 )
                 return
 
+            delta_names = [] if base_only else found['deltas']
             if not confirm:
                 await update.message.reply_text(
                     f"⚠️ ПОДТВЕРЖДЕНИЕ ВОССТАНОВЛЕНИЯ\n\n"
                     f"📦 Файл: {cloud_name}\n"
                     f"📊 Размер: {found['size_mb']:.2f} МБ\n"
-                    f"📅 Создан: {found['created']}\n\n"
+                    f"📅 Создан: {found['created']}\n"
+                    f"{_describe_chain(delta_names)}\n\n"
                     f"⚠️ ВСЕ ТЕКУЩИЕ ДАННЫЕ БУДУТ УДАЛЕНЫ!\n\n"
                     f"Для подтверждения отправьте:\n"
-                    f"/restore cloud:{cloud_name} --confirm"
+                    f"{confirm_hint}"
                 )
                 return
 
@@ -300,6 +322,11 @@ async def restore_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 await status_msg.edit_text("❌ Не удалось скачать бекап с Яндекс.Диска")
                 return
 
+            delta_paths = await backup_manager.download_incremental_chain(delta_names)
+            if delta_paths is None:
+                await status_msg.edit_text("❌ Не удалось скачать дельты цепочки с Яндекс.Диска")
+                return
+
             await status_msg.edit_text(
                 f"✅ Бекап скачан\n"
                 f"🔄 Начинаю восстановление..."
@@ -318,16 +345,18 @@ async def restore_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
                 selected = backups['local'][index]
                 backup_path = Path(selected['path'])
+                delta_paths = [] if base_only else backup_manager.find_incremental_chain(backup_path)
 
                 if not confirm:
                     await update.message.reply_text(
                         f"⚠️ ПОДТВЕРЖДЕНИЕ ВОССТАНОВЛЕНИЯ\n\n"
                         f"📦 Файл: {selected['name']}\n"
                         f"📊 Размер: {selected['size_mb']:.2f} МБ\n"
-                        f"📅 Создан: {selected['created']}\n\n"
+                        f"📅 Создан: {selected['created']}\n"
+                        f"{_describe_chain([p.name for p in delta_paths])}\n\n"
                         f"⚠️ ВСЕ ТЕКУЩИЕ ДАННЫЕ БУДУТ УДАЛЕНЫ!\n\n"
                         f"Для подтверждения отправьте:\n"
-                        f"/restore {arg} --confirm"
+                        f"{confirm_hint}"
                     )
                     return
 
@@ -336,7 +365,7 @@ async def restore_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     "❌ Укажите номер бекапа или cloud:<имя>\n\n"
                     "Примеры:\n"
                     "  /restore 1 - восстановить из локального #1\n"
-                    "  /restore cloud:backup_monday.sql.gz - из облака\n\n"
+                    "  /restore cloud:lunch_bot_backup_monday.sql.zst - из облака\n\n"
                     "Используйте /restore для просмотра списка"
                 )
                 return
@@ -347,23 +376,46 @@ async def restore_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         status_msg = await update.message.reply_text(
             "🔄 ВОССТАНОВЛЕНИЕ БАЗЫ ДАННЫХ\n\n"
             f"📦 Файл: {backup_path.name}\n"
+            f"🧩 Дельт: {len(delta_paths)}\n"
             "⏳ Это может занять несколько минут...\n\n"
             "⚠️ НЕ ВЫКЛЮЧАЙТЕ БОТА!"
         )
 
-        result = await backup_manager.restore_backup(backup_path, confirm=True)
+        async def _report_progress(percent):
+            await status_msg.edit_text(
+                "🔄 ВОССТАНОВЛЕНИЕ БАЗЫ ДАННЫХ\n\n"
+                f"📦 Файл: {backup_path.name}\n"
+                f"📥 Загружено: {percent}%\n\n"
+                "⚠️ НЕ ВЫКЛЮЧАЙТЕ БОТА!"
+            )
+
+        # База + дельты цепочки (пустой список — обычное восстановление полного бекапа)
+        result = await backup_manager.restore_incremental(
+            backup_path, delta_paths, confirm=True, progress_callback=_report_progress
+        )
 
         if result['success']:
+            chain_info = ""
+            if result['details'].get('deltas_applied'):
+                chain_info = (
+                    f"🧩 Дельт применено: {result['details']['deltas_applied']}\n"
+                    f"📅 Данные на: {result['details']['restored_to']}\n"
+                )
             await status_msg.edit_text(
                 f"✅ ВОССТАНОВЛЕНИЕ ЗАВЕРШЕНО!\n\n"
                 f"📦 Файл: {result['details']['backup_file']}\n"
+                f"{chain_info}"
                 f"⏰ Время: {result['details']['restored_at']}\n\n"
                 f"ℹ️ Рекомендуется перезапустить бота"
             )
         else:
+            hint = ""
+            if result['details'].get('chain_invalid'):
+                # Цепочка не прошла проверку — база не тронута
+                hint = f"\n\nВосстановить только полный бекап:\n/restore {arg} --base-only --confirm"
             await status_msg.edit_text(
                 f"❌ ОШИБКА ВОССТАНОВЛЕНИЯ\n\n"
-                f"{result['message']}"
+                f"{result['message']}{hint}"
             )
 
     except Exception as e:
@@ -393,6 +445,12 @@ async def backup_status_command(update: Update, context: ContextTypes.DEFAULT_TY
             msg += "☁️ Яндекс.Диск: не настроен\n"
             msg += "ℹ️ Укажите YANDEX_DISK_TOKEN в .env\n\n"
 
+        # Инкрементальная цепочка
+        if status.get('incremental'):
+            inc = status['incremental']
+            msg += f"🧱 База цепочки: {inc['base_name']}\n"
+            msg += f"🧩 Дельт: {inc['deltas']}, данные на {inc['watermark'][:16].replace('T', ' ')}\n\n"
+
         # Локальные бекапы
         msg += f"💾 Локальные бекапы ({len(status['local_backups'])}):\n"
         if status['local_backups']:
@@ -425,6 +483,92 @@ async def backup_status_command(update: Update, context: ContextTypes.DEFAULT_TY
             f"❌ Ошибка при получении статуса:\n\n{str(e)}"
         )
 
+async def slow_queries_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Топ самых медленных SQL-запросов с момента запуска: /slow_queries [N] [max|total|count]"""
+    user_id = update.effective_user.id
+
+    # Проверяем права администратора
+    if user_id not in CONFIG.admin_ids:
+        await update.message.reply_text("❌ У вас нет прав для выполнения этой команды")
+        return
+
+    limit = 10
+    order_by = 'max'
+    for arg in context.args or []:
+        if arg.isdigit():
+            limit = max(1, min(int(arg), 30))
+        elif arg.lower() in ('max', 'total', 'count'):
+            order_by = arg.lower()
+
+    stats = db.get_slow_queries(limit, order_by)
+    if not stats:
+        await update.message.reply_text("📭 Статистика SQL-запросов пока пуста")
+        return
+
+    lines = [f"🐢 ТОП-{len(stats)} SQL-ЗАПРОСОВ (сортировка: {order_by})\n"]
+    for index, item in enumerate(stats, 1):
+        fingerprint = item['fingerprint']
+        if len(fingerprint) > 300:
+            fingerprint = fingerprint[:300] + '…'
+        lines.append(
+            f"{index}. max {item['max_ms']:.1f} мс, avg {item['avg_ms']:.1f} мс, "
+            f"всего {item['total_ms']:.0f} мс, вызовов {item['count']} (медленных {item['slow']})"
+        )
+        if item['max_operation']:
+            lines.append(f"   самый долгий — в {item['max_operation']}")
+        if item['operations']:
+            lines.append("   чаще всего: " + ", ".join(
+                f"{name} ×{count}" for name, count in item['operations']
+            ))
+        lines.append(f"   {fingerprint}\n")
+
+    msg = "\n".join(lines)
+    if len(msg) > 4000:
+        msg = msg[:4000] + "\n…"
+    await update.message.reply_text(msg)
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Сэмплирующий профиль event loop на N секунд: /profile [N] — отчёт придёт файлом"""
+    user_id = update.effective_user.id
+
+    # Проверяем права администратора
+    if user_id not in CONFIG.admin_ids:
+        await update.message.reply_text("❌ У вас нет прав для выполнения этой команды")
+        return
+
+    seconds = 30
+    if context.args and context.args[0].isdigit():
+        seconds = max(1, min(int(context.args[0]), sampling_profiler.MAX_SECONDS))
+
+    if sampling_profiler.is_running():
+        await update.message.reply_text("⏳ Профиль уже снимается, дождитесь отчёта")
+        return
+
+    chat_id = update.effective_chat.id
+    await update.message.reply_text(f"🔬 Профилирую бота {seconds} с, отчёт пришлю файлом...")
+
+    async def run_profile():
+        # Задача переживёт апдейт — не даём ей унаследовать его сессию БД
+        with db.background_scope('telegram:profile'):
+            try:
+                path, text = await sampling_profiler.profile_event_loop(seconds, process='telegram')
+            except sampling_profiler.ProfilerBusyError:
+                await context.bot.send_message(chat_id, "⏳ Профиль уже снимается, дождитесь отчёта")
+                return
+            except Exception as e:
+                await context.bot.send_message(chat_id, f"❌ Ошибка профилирования:\n\n{str(e)}")
+                return
+            filename = path.name if path else 'profile_telegram.txt'
+            await context.bot.send_document(
+                chat_id=chat_id,
+                document=BytesIO(text.encode('utf-8')),
+                filename=filename,
+                caption=f"🔬 Профиль event loop за {seconds} с"
+            )
+
+    # В фоне: обработчик не должен держать апдейт все N секунд
+    context.application.create_task(run_profile())
+
 def setup(application):
     application.add_handler(CommandHandler("notifications_on", notifications_on))
     application.add_handler(CommandHandler("notifications_off", notifications_off))
@@ -434,6 +578,8 @@ def setup(application):
     application.add_handler(CommandHandler("backup", backup_command))
     application.add_handler(CommandHandler("backup_status", backup_status_command))
     application.add_handler(CommandHandler("restore", restore_command))
+    application.add_handler(CommandHandler("slow_queries", slow_queries_command))
+    application.add_handler(CommandHandler("profile", profile_command))
 
 # Для обратной совместимости
 def setup_commands(app):
@@ -14,6 +14,8 @@ from handlers.common import show_main_menu
 from handlers.common_handlers import view_orders
 from utils import can_modify_order, check_registration, format_menu, handle_unregistered
 from view_utils import refresh_orders_view
+from services.order_service import get_user_monthly_stats, cancel_order
+from services.menu_service import get_week_view
 
 logger = logging.getLogger(__name__)
 
@@ -102,9 +104,6 @@ async def show_week_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     try:
         user = update.effective_user
-        now = datetime.now(TIME_CONFIG.TIMEZONE)  # ← ИСПРАВИТЬ
-        today = now.date()
-        days_ru = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье"]
         
         sent_days = 0
         
@@ -117,28 +116,30 @@ async def show_week_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("❌ Пользователь не найден")
             return await show_main_menu(update, user.id)
         
-        for day_offset in range(7):
-            day_date = today + timedelta(days=day_offset)
-            day_name = days_ru[day_date.weekday()]
+        # Меню, праздники и заказы пользователя на 7 дней — одним запросом
+        week = get_week_view(user_record.id, CONFIG, db.session)
+
+        for day_info in week:
+            day_offset = day_info['day_offset']
+            day_date = day_info['target_date']
+            day_name = day_info['day_name']
             date_str = day_date.strftime("%d.%m")
-            date_iso = day_date.isoformat()
             
             # Проверяем праздники
-            holiday_name = CONFIG.holidays.get(date_iso)
-            if holiday_name:
+            if day_info['is_holiday']:
                 await update.message.reply_text(
-                    f"🎉 {day_name} ({date_str}) — {holiday_name}! Меню не предусмотрено."
+                    f"🎉 {day_name} ({date_str}) — {day_info['holiday_name']}! Меню не предусмотрено."
                 )
                 continue
             
             # Проверяем выходные
-            if day_date.weekday() in TIME_CONFIG.WEEKEND_DAYS:  # ← ИСПРАВИТЬ
+            if day_info['is_weekend']:
                 await update.message.reply_text(
                     f"⏳ {day_name} ({date_str}) — Выходной! Меню не предусмотрено."
                 )
                 continue
             
-            menu = CONFIG.menu.get(day_name)
+            menu = day_info['menu']
             if not menu:
                 logger.warning(f"Меню для {day_name} не найдено")
                 continue
@@ -148,13 +149,6 @@ async def show_week_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
             menu_text += f"2. 🍛 Основное блюдо: {menu['main']}\n"
             menu_text += f"3. 🥗 Салат: {menu['salad']}"
             
-            # Проверка заказа пользователя через SQLAlchemy
-            order = db.session.query(Order).filter(
-                Order.user_id == user_record.id,
-                Order.target_date == day_date,
-                Order.is_cancelled == False
-            ).first()
-            
             keyboard = []
             if not CONFIG.are_orders_accepted_now():
                 # Заказы отключены по времени
@@ -163,11 +157,11 @@ async def show_week_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 keyboard.append([InlineKeyboardButton("⏳ Заказы принимаются через Битрикс", callback_data="noop")])
             else:
                 # Логика для включенных заказов
-                if order:
-                    menu_text += f"\n\n✅ Заказ: {order.quantity} порции"
-                    if can_modify_order(day_date):
+                if day_info['has_order']:
+                    menu_text += f"\n\n✅ Заказ: {day_info['quantity']} порции"
+                    if day_info['can_modify']:
                         keyboard.append([InlineKeyboardButton("✏️ Изменить", callback_data=f"change_{day_offset}")])
-                elif can_modify_order(day_date):
+                elif day_info['can_modify']:
                     keyboard.append([InlineKeyboardButton("✅ Заказать", callback_data=f"order_{day_offset}")])
 
             await update.message.reply_text(
@@ -327,24 +321,15 @@ async def order_action(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
                 user_db_id = user_record.id
 
-                # Отменяем заказ в БД через SQLAlchemy
-                order = db.session.query(Order).filter(
-                    Order.user_id == user_db_id,
-                    Order.target_date == target_date,
-                    Order.is_cancelled == False
-                ).first()
+                # Отменяем одним UPDATE ... RETURNING — сразу получаем актуальный bitrix_order_id
+                order, error = cancel_order(user_db_id, target_date, db.session, allow_bitrix=True)
 
                 if not order:
                     logger.warning(f"USER {user_id}: заказ на {target_date} не найден для отмены")
                     await query.answer("❌ Заказ не найден", show_alert=True)
                     return
 
-                # 🔥 Принудительно обновляем объект из БД, чтобы получить актуальный bitrix_order_id
-                db.session.refresh(order)
                 bitrix_id_to_cancel = order.bitrix_order_id
-
-                order.is_cancelled = True
-                order.order_time = now.strftime("%H:%M:%S")
                 db.session.commit()
 
                 # 🔥 Если заказ уже отправлен в Bitrix — отменяем его там тоже
@@ -465,35 +450,12 @@ async def monthly_stats_selected(update: Update, context: ContextTypes.DEFAULT_T
 
         user_db_id = user_record.id
 
-        # 🔥 ИСПРАВЛЕНИЕ: Используем правильные типы данных для сравнения
-        from sqlalchemy import func, case, and_
-        
-        # Получаем статистику через отдельные запросы для надежности
-        completed = db.session.query(func.sum(Order.quantity)).filter(
-            Order.user_id == user_db_id,
-            Order.target_date < today,
-            Order.target_date.between(start_date, end_date),
-            Order.is_cancelled == False
-        ).scalar() or 0
-
-        today_orders = db.session.query(func.sum(Order.quantity)).filter(
-            Order.user_id == user_db_id,
-            Order.target_date == today,
-            Order.is_cancelled == False
-        ).scalar() or 0
-
-        upcoming = db.session.query(func.sum(Order.quantity)).filter(
-            Order.user_id == user_db_id,
-            Order.target_date > today,
-            Order.target_date.between(start_date, end_date),
-            Order.is_cancelled == False
-        ).scalar() or 0
-
-        cancelled = db.session.query(func.sum(Order.quantity)).filter(
-            Order.user_id == user_db_id,
-            Order.target_date.between(start_date, end_date),
-            Order.is_cancelled == True
-        ).scalar() or 0
+        # Все показатели одним запросом (с коротким кэшем на пользователя)
+        stats = get_user_monthly_stats(user_db_id, start_date, end_date, db.session)
+        completed = stats['completed']
+        today_orders = stats['today']
+        upcoming = stats['upcoming'] - stats['today']
+        cancelled = stats['cancelled']
 
         # Формируем сообщение
         message_lines = [
@@ -514,28 +476,13 @@ async def monthly_stats_selected(update: Update, context: ContextTypes.DEFAULT_T
             message_lines.append(f"❌ Отмененные: *{cancelled}*")
 
         # Дополнительная информация о предстоящих заказах
-        if upcoming > 0:
-            order_count = db.session.query(Order).filter(
-                Order.user_id == user_db_id,
-                Order.target_date > today,
-                Order.target_date.between(start_date, end_date),
-                Order.is_cancelled == False
-            ).count()
-            
-            next_order = db.session.query(Order).filter(
-                Order.user_id == user_db_id,
-                Order.target_date > today,
-                Order.target_date.between(start_date, end_date),
-                Order.is_cancelled == False
-            ).order_by(Order.target_date).first()
-            
-            if next_order:
-                next_order_date = next_order.target_date.strftime("%d.%m.%Y")
-                message_lines.extend([
-                    "",
-                    f"Ближайший заказ: *{next_order_date}*",
-                    f"Всего предстоящих дней с заказами: *{order_count}*"
-                ])
+        if upcoming > 0 and stats['next_order_date']:
+            next_order_date = stats['next_order_date'].strftime("%d.%m.%Y")
+            message_lines.extend([
+                "",
+                f"Ближайший заказ: *{next_order_date}*",
+                f"Всего предстоящих дней с заказами: *{stats['future_orders']}*"
+            ])
 
         await update.message.reply_text(
             "\n".join(message_lines),
@@ -611,22 +558,15 @@ async def handle_cancel_from_view(update: Update, context: ContextTypes.DEFAULT_
 
         # Отменяем заказ
         user_id = query.from_user.id
-        now = datetime.now(TIME_CONFIG.TIMEZONE)  # ← ИСПРАВИТЬ
+        user_record = db.session.query(User).filter(User.telegram_id == user_id).first()
         
-        # Находим заказ через SQLAlchemy
-        order = db.session.query(Order).join(User).filter(
-            User.telegram_id == user_id,
-            Order.target_date == target_date,
-            Order.is_cancelled == False
-        ).first()
+        # Отменяем одним UPDATE ... RETURNING — сразу получаем актуальный bitrix_order_id
+        order = None
+        if user_record:
+            order, error = cancel_order(user_record.id, target_date, db.session, allow_bitrix=True)
         
         if order:
-            # 🔥 Принудительно обновляем объект из БД, чтобы получить актуальный bitrix_order_id
-            db.session.refresh(order)
             bitrix_id_to_cancel = order.bitrix_order_id
-
-            order.is_cancelled = True
-            order.order_time = now.isoformat()
             db.session.commit()
             
             # 🔥 Если заказ уже отправлен в Bitrix — отменяем его там тоже
@@ -20,7 +20,7 @@ from time_config import TIME_CONFIG
 logger = logging.getLogger(__name__)
 
 # Re-export from services
-from services.order_service import QUANTITY_MAP, BITRIX_QUANTITY_MAP
+from services.order_service import BITRIX_QUANTITY_MAP, create_order, cancel_order, modify_quantity
     
 async def handle_inspector_order_callback(query, now, user, context):
     """
@@ -84,30 +84,15 @@ async def handle_inspector_order_callback(query, now, user, context):
     # user_record уже получен выше при проверке прав
     user_db_id = user_record.id
 
-    # Проверяем существующий заказ
-    existing_order = db.session.query(Order).filter(
-        Order.user_id == user_db_id,
-        Order.target_date == target_date,
-        Order.is_cancelled == False
-    ).first()
-
-    if existing_order:
-        await query.answer(f"ℹ️ У вас уже есть заказ на эту дату", show_alert=True)
-        return
-
-    # Создаём заказ для инспектора
-    new_order = Order(
-        user_id=user_db_id,
-        target_date=target_date,
-        order_time=now.strftime("%H:%M:%S"),
-        quantity=1,
-        bitrix_quantity_id=QUANTITY_MAP[1],
-        is_active=True,
-        is_preliminary=day_offset > 0,
-        is_for_inspector=True,
-        created_at=datetime.now()
+    # Создаём заказ для инспектора (одним запросом, без дублей при повторном нажатии)
+    new_order, error = create_order(
+        user_db_id, target_date, db.session,
+        is_preliminary=day_offset > 0, is_for_inspector=True,
     )
-    db.session.add(new_order)
+    if error:
+        db.session.rollback()
+        await query.answer(f"ℹ️ {error}", show_alert=True)
+        return
     db.session.commit()
 
     logger.info(f"USER {user_id}: создан заказ для инспектора на {target_date}")
@@ -188,34 +173,15 @@ async def handle_order_callback(query, now, user, context):
             return
         user_db_id = user_record.id
 
-        # Проверяем существующий заказ через SQLAlchemy
-        existing_order = db.session.query(Order).filter(
-            Order.user_id == user_db_id,
-            Order.target_date == target_date,
-            Order.is_cancelled == False
-        ).first()
-
-        if existing_order:
-            logger.info(f"USER {user_id}: уже имеет заказ на {target_date} - {existing_order.quantity} порций")
-            await query.answer(f"ℹ️ У вас уже заказано {existing_order.quantity} порций", show_alert=True)
+        # Создаём заказ одним запросом (INSERT ... ON CONFLICT DO NOTHING)
+        new_order, error = create_order(user_db_id, target_date, db.session, is_preliminary=day_offset > 0)
+        if error:
+            db.session.rollback()
+            logger.info(f"USER {user_id}: заказ на {target_date} не создан: {error}")
+            await query.answer(f"ℹ️ {error}", show_alert=True)
             return
-
-        initial_quantity = 1  # По умолчанию 1 порция
-        bitrix_quantity_id = QUANTITY_MAP[initial_quantity]
-
-        # Создаём новый заказ через SQLAlchemy
-        new_order = Order(
-            user_id=user_db_id,
-            target_date=target_date,
-            order_time=now.strftime("%H:%M:%S"),
-            quantity=initial_quantity,
-            bitrix_quantity_id=bitrix_quantity_id,
-            is_active=True,
-            is_preliminary=day_offset > 0,
-            created_at=datetime.now()
-        )
-        db.session.add(new_order)
         db.session.commit()
+        initial_quantity = new_order.quantity
 
         logger.info(f"USER {user_id}: успешно создал заказ на {target_date}, {initial_quantity} порция(й)")
 
@@ -448,24 +414,20 @@ async def handle_cancel_callback(query, now, user, context):
                 await query.answer(f"ℹ️ Отмена невозможна после {TIME_CONFIG.MODIFICATION_DEADLINE.strftime('%H:%M')}", show_alert=True)
                 return
 
-            # Получаем заказ (свежие данные из БД, включая bitrix_order_id)
-            order = session.query(Order).filter(
-                Order.user_id == user_db_id,
-                Order.target_date == target_date,
-                Order.is_cancelled == False
-            ).first()
-            
+            # Отменяем одним UPDATE ... RETURNING: строка возвращается уже отменённой,
+            # со свежим bitrix_order_id. Заказы из Bitrix тоже можно отменять.
+            order, error = cancel_order(user_db_id, target_date, session, allow_bitrix=True)
+
             if not order:
                 logger.warning(f"USER {user_id}: заказ на {target_date} не найден")
                 await query.answer("❌ Заказ не найден", show_alert=True)
                 return
 
-            # Заказы из Bitrix теперь можно отменять
             if order.is_from_bitrix == 1:
                 logger.info(f"USER {user_id}: отмена заказа из Битрикс на {target_date} (разрешено)")
 
-            # 🔍 ДИАГНОСТИКА: проверяем состояние заказа ДО отмены
-            logger.info(f"🔍 DIAG cancel: order.id={order.id}, is_cancelled before={order.is_cancelled}, "
+            # 🔍 ДИАГНОСТИКА: состояние заказа после отмены
+            logger.info(f"🔍 DIAG cancel: order.id={order.id}, is_cancelled={order.is_cancelled}, "
                         f"bitrix_order_id={order.bitrix_order_id}, is_from_bitrix={order.is_from_bitrix}, "
                         f"is_sent_to_bitrix={order.is_sent_to_bitrix}, "
                         f"target_date={order.target_date}, session={id(session)}")
@@ -489,9 +451,6 @@ async def handle_cancel_callback(query, now, user, context):
             bitrix_id_to_cancel = order.bitrix_order_id
             is_sent_to_bitrix = order.is_sent_to_bitrix
 
-            # Отменяем заказ
-            order.is_cancelled = True
-            order.order_time = now.strftime("%H:%M:%S")
             session.commit()
 
             # 🔍 ДИАГНОСТИКА: проверяем что заказ отменён после commit
@@ -604,42 +563,24 @@ async def modify_portion_count(query, now, user, context, delta):
                 await refresh_day_view(query, day_offset, context.user_data['user_db_id'], now)
             return
 
-        # Получаем текущий заказ через SQLAlchemy
-        order = db.session.query(Order).filter(
-            Order.user_id == user_db_id,
-            Order.target_date == target_date,
-            Order.is_cancelled == False
-        ).first()
-        
-        if not order:
-            await query.answer("ℹ️ Заказ не найден")
+        # Одним UPDATE ... SET quantity = quantity + delta: два быстрых нажатия не
+        # затирают друг друга. Заказы из Bitrix тоже можно изменять
+        # (синхронизация с Bitrix через _update_bitrix_order)
+        new_qty, order, error = modify_quantity(user_db_id, target_date, delta, db.session, allow_bitrix=True)
+
+        if error:
+            await query.answer(f"ℹ️ {error}")
             return
-            
-        # Заказы из Bitrix теперь можно изменять (синхронизация с Bitrix через _update_bitrix_order)
-        if order.is_from_bitrix == 1:
-            logger.info(f"USER {user.id}: изменение заказа из Битрикс на {target_date} (разрешено)")
-            
-        current_qty = order.quantity
-        new_qty = current_qty + delta
 
-        # Проверка границ
-        if new_qty < 1:
+        # Меньше одной порции — отменяем заказ
+        if new_qty == 0:
             return await handle_cancel_callback(query, now, user, context)
-        if new_qty > TIME_CONFIG.MAX_PORTIONS:
-            await query.answer(f"ℹ️ Максимум {TIME_CONFIG.MAX_PORTIONS} порций")
-            return
 
-        # Маппинг количества порций на bitrix_quantity_id
-        new_bitrix_quantity_id = QUANTITY_MAP.get(new_qty, '821')
+        if order.is_from_bitrix == 1:
+            logger.info(f"USER {user.id}: изменение заказа из Битрикс на {target_date} (разрешено)")
 
-        # 🔥 Принудительно обновляем объект из БД, чтобы получить актуальный bitrix_order_id
-        db.session.refresh(order)
+        # RETURNING отдаёт актуальный bitrix_order_id
         bitrix_id_to_update = order.bitrix_order_id
-
-        # Обновляем заказ через SQLAlchemy
-        order.quantity = new_qty
-        order.bitrix_quantity_id = new_bitrix_quantity_id
-        order.updated_at = datetime.now()
         db.session.commit()
 
         # 🔥 Если заказ уже отправлен в Bitrix — обновляем количество там тоже
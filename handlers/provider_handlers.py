@@ -5,6 +5,7 @@ from telegram.ext import ContextTypes
 from database import db
 from models import Menu
 from config import CONFIG
+from config_notify import notify_config_changed
 from constants import (
     EDIT_MENU_DAY,
     EDIT_MENU_FIRST,
@@ -146,6 +147,7 @@ async def handle_menu_salad(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "main": main,
             "salad": salad
         }
+        notify_config_changed('menu')
         
         await update.message.reply_text(
             f"✅ Меню на {day} успешно обновлено!\n"
@@ -0,0 +1,232 @@
+"""
+Глубокая проверка здоровья процесса бота (GET /health).
+
+Отдаётся всеми процессами: Bitrix24-бот — из своего FastAPI-приложения,
+Telegram, VK и Max — с бокового сервера метрик (metrics.start_metrics_server).
+collect() синхронная и рассчитана на вызов не из потока event loop
+(поток HTTP-сервера метрик или asyncio.to_thread).
+
+Что проверяется:
+- database — время SELECT 1 и занятость пула соединений;
+- bitrix — доступность REST Bitrix24 (server.time), результат кешируется
+  на BITRIX_PROBE_TTL_SEC, чтобы частые проверки не тратили лимит портала;
+- scheduler — сколько прошло с последнего успешного напоминания, отправки
+  заказов (push) и синхронизации; push/sync берутся и из таблицы sync_runs,
+  поэтому видны в любом процессе и переживают перезапуск;
+- outbound — исходящие сообщения, ожидающие ответа API;
+- event_loop — задержка выполнения callback, поставленного в event loop,
+  и сводка сторожа loop_watchdog (максимальное опоздание, блокировки).
+
+Статус: down (HTTP 503) — недоступна БД; degraded — Bitrix недоступен или
+event loop отвечает дольше HEALTH_LOOP_LAG_MS; иначе ok.
+"""
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+
+import httpx
+from sqlalchemy import text
+
+import metrics
+import loop_watchdog
+from database import db
+
+logger = logging.getLogger(__name__)
+
+BITRIX_PROBE_TTL_SEC = float(os.getenv('HEALTH_BITRIX_TTL_SEC', '60'))
+BITRIX_PROBE_TIMEOUT_SEC = 5.0
+LOOP_LAG_DEGRADED_MS = float(os.getenv('HEALTH_LOOP_LAG_MS', '500'))
+LOOP_PROBE_TIMEOUT_SEC = 2.0
+
+# Задачи планировщика, за которыми следим: ключ отчёта -> имя функции задачи
+TRACKED_JOBS = {
+    'reminder': '_morning_reminder',
+    'push': '_push_to_bitrix_with_retry',
+    'sync': 'sync_recent_orders',
+}
+# Прогоны из sync_runs, которые считаются успешным push / sync
+_SYNC_RUN_KINDS = {'push': 'push', 'sync': 'orders'}
+
+_loop = None
+_loop_thread_id = None
+_bitrix_cache = None
+_bitrix_lock = threading.Lock()
+
+
+def register_loop(loop):
+    """Запоминает event loop процесса; вызывать из потока этого loop"""
+    global _loop, _loop_thread_id
+    _loop = loop
+    _loop_thread_id = threading.get_ident()
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 1)
+
+
+def _age(timestamp):
+    if not timestamp:
+        return None
+    return {
+        'last_success': datetime.fromtimestamp(timestamp).isoformat(timespec='seconds'),
+        'age_sec': round(time.time() - timestamp),
+    }
+
+
+def check_database() -> dict:
+    started = time.perf_counter()
+    try:
+        with db.engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+    except Exception as e:
+        return {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+    result = {'ok': True, 'round_trip_ms': _ms(time.perf_counter() - started)}
+    try:
+        pool = db.get_pool_stats()
+        result['pool'] = {
+            'size': pool['pool_size'],
+            'checked_out': pool['checked_out'],
+            'max_checked_out': pool['max_checked_out'],
+            'avg_hold_ms': pool['avg_hold_ms'],
+            'slow_holds': pool['slow_holds'],
+        }
+    except Exception as e:
+        result['pool'] = {'error': str(e)}
+    return result
+
+
+def _probe_bitrix() -> dict:
+    webhook = os.getenv('BITRIX_WEBHOOK')
+    checked_at = datetime.now().isoformat(timespec='seconds')
+    if not webhook:
+        return {'ok': None, 'configured': False, 'checked_at': checked_at}
+    started = time.perf_counter()
+    try:
+        # Bitrix24 во внутренней сети — без прокси из окружения
+        with httpx.Client(timeout=BITRIX_PROBE_TIMEOUT_SEC, trust_env=False, verify=False) as client:
+            response = client.get(webhook.rstrip('/') + '/server.time')
+        latency = _ms(time.perf_counter() - started)
+        ok = response.status_code == 200 and 'result' in response.json()
+        result = {'ok': ok, 'latency_ms': latency, 'http_status': response.status_code}
+    except Exception as e:
+        result = {'ok': False, 'latency_ms': _ms(time.perf_counter() - started),
+                  'error': f"{type(e).__name__}: {e}"}
+    result.update(configured=True, checked_at=checked_at)
+    return result
+
+
+def check_bitrix(force: bool = False) -> dict:
+    global _bitrix_cache
+    with _bitrix_lock:
+        cached = _bitrix_cache
+        if force or cached is None or time.monotonic() - cached[0] > BITRIX_PROBE_TTL_SEC:
+            cached = _bitrix_cache = (time.monotonic(), _probe_bitrix())
+    result = dict(cached[1])
+    result['cache_age_sec'] = round(time.monotonic() - cached[0])
+    return result
+
+
+def _last_sync_runs() -> dict:
+    from models import SyncRun
+    result = {}
+    try:
+        with db.get_session() as session:
+            for key, kind in _SYNC_RUN_KINDS.items():
+                record = session.query(SyncRun).filter(
+                    SyncRun.kind == kind, SyncRun.status == 'ok'
+                ).order_by(SyncRun.id.desc()).first()
+                if record is not None:
+                    result[key] = (record.finished_at or record.started_at).timestamp()
+    except Exception as e:
+        logger.debug(f"health: sync_runs недоступна: {e}")
+    return result
+
+
+def check_scheduler() -> dict:
+    in_process = {}
+    for (job,), value in metrics.JOB_LAST_SUCCESS.values().items():
+        short_name = job.rsplit('.', 1)[-1]
+        in_process[short_name] = max(value, in_process.get(short_name, 0))
+
+    persisted = _last_sync_runs()
+    result = {}
+    for key, job in TRACKED_JOBS.items():
+        last = max(in_process.get(job, 0), persisted.get(key, 0)) or None
+        result[key] = _age(last) or {'last_success': None, 'age_sec': None}
+    result['jobs'] = {job: _age(value) for job, value in sorted(in_process.items())}
+    return result
+
+
+def check_outbound() -> dict:
+    depth = {messenger: int(value) for (messenger,), value in metrics.OUTBOUND_IN_FLIGHT.values().items()}
+    return {'in_flight': depth, 'total': sum(depth.values())}
+
+
+def check_event_loop(timeout: float = LOOP_PROBE_TIMEOUT_SEC) -> dict:
+    loop = _loop
+    if loop is None or loop.is_closed() or not loop.is_running():
+        return {'ok': None, 'error': 'event loop не зарегистрирован'}
+    if threading.get_ident() == _loop_thread_id:
+        return {'ok': None, 'error': 'проверка вызвана из потока event loop'}
+
+    done = threading.Event()
+    ran_at = []
+
+    def callback():
+        ran_at.append(time.perf_counter())
+        done.set()
+
+    started = time.perf_counter()
+    loop.call_soon_threadsafe(callback)
+    if done.wait(timeout):
+        lag = _ms(ran_at[0] - started)
+        result = {'ok': lag < LOOP_LAG_DEGRADED_MS, 'lag_ms': lag}
+    else:
+        result = {'ok': False, 'lag_ms': _ms(timeout), 'blocked': True}
+    watchdog = loop_watchdog.snapshot()
+    if watchdog is not None:
+        result['watchdog'] = watchdog
+    return result
+
+
+def _run_check(check):
+    try:
+        return check()
+    except Exception as e:
+        logger.warning(f"⚠️ health: проверка {check.__name__} упала: {e}")
+        return {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+
+
+def collect(process: str) -> dict:
+    """Полный отчёт о здоровье процесса"""
+    started = time.perf_counter()
+    checks = {
+        'database': _run_check(check_database),
+        'bitrix': _run_check(check_bitrix),
+        'scheduler': _run_check(check_scheduler),
+        'outbound': _run_check(check_outbound),
+        'event_loop': _run_check(check_event_loop),
+    }
+    if not checks['database'].get('ok'):
+        status = 'down'
+    elif checks['bitrix'].get('ok') is False or checks['event_loop'].get('ok') is False:
+        status = 'degraded'
+    else:
+        status = 'ok'
+
+    start_times = metrics.PROCESS_START_TIME.values()
+    process_start = start_times.get((process,))
+    return {
+        'status': status,
+        'process': process,
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'uptime_sec': round(time.time() - process_start) if process_start else None,
+        'check_ms': _ms(time.perf_counter() - started),
+        'checks': checks,
+    }
+
+
+def http_status(report: dict) -> int:
+    return 503 if report['status'] == 'down' else 200
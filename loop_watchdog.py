@@ -0,0 +1,184 @@
+"""
+Сторож event loop: постоянно меряет его опоздание и ловит блокирующие вызовы.
+
+Пульс — корутина в самом loop, которая каждые INTERVAL_MS засыпает и меряет,
+насколько позже положенного проснулась. Опоздание пишется в гистограмму
+bot_event_loop_lag_seconds.
+
+Если пульса нет дольше LOOP_LAG_THRESHOLD_MS, поток-сторож снимает стек потока
+event loop (sys._current_frames) и запоминает текущую задачу asyncio — это и
+есть код, который держит loop: requests.get в async def, синхронный yadisk,
+openpyxl, синхронные запросы к БД. Когда loop оживает, блокировка пишется в лог
+со стеком (одно место — не чаще раза в LOG_EVERY_SEC) и считается в
+bot_event_loop_blocks_total по первому кадру из кода проекта.
+
+    loop_watchdog.start('telegram')   # из работающего event loop
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from collections import deque
+from datetime import datetime
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+INTERVAL_SEC = float(os.getenv('LOOP_WATCHDOG_INTERVAL_MS', '100')) / 1000
+THRESHOLD_SEC = float(os.getenv('LOOP_LAG_THRESHOLD_MS', '250')) / 1000
+LOG_EVERY_SEC = 60
+STACK_LIMIT = 25
+RECENT_BLOCKS = 20
+
+_PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+_LIBRARY_MARKERS = ('site-packages', 'dist-packages')
+
+_watchdog = None
+
+
+def _project_location(stack) -> str:
+    """Первый (самый глубокий) кадр из кода проекта — «место» блокировки"""
+    for entry in reversed(stack):
+        filename = os.path.abspath(entry.filename)
+        if filename.startswith(_PROJECT_DIR) and not any(m in filename for m in _LIBRARY_MARKERS) \
+                and filename != os.path.abspath(__file__):
+            return f"{os.path.relpath(filename, _PROJECT_DIR)}:{entry.lineno} {entry.name}"
+    if stack:
+        entry = stack[-1]
+        return f"{os.path.basename(entry.filename)}:{entry.lineno} {entry.name}"
+    return 'unknown'
+
+
+def _task_name(loop) -> str:
+    task = asyncio.current_task(loop)
+    if task is None:
+        return '-'
+    coro = task.get_coro()
+    return f"{task.get_name()} ({getattr(coro, '__qualname__', coro)})"
+
+
+class LoopWatchdog:
+    def __init__(self, process: str, loop, interval: float = INTERVAL_SEC, threshold: float = THRESHOLD_SEC):
+        self.process = process
+        self.loop = loop
+        self.interval = interval
+        self.threshold = threshold
+        self.blocks = 0
+        self.recent_blocks = deque(maxlen=RECENT_BLOCKS)
+        self._lags = deque(maxlen=max(1, int(60 / interval)))  # (время, опоздание) за ~минуту
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.perf_counter()
+        self._capture = None
+        self._lock = threading.Lock()
+        self._logged_at = {}
+        self._stop = threading.Event()
+        self._task = None
+
+    def start(self):
+        self._task = self.loop.create_task(self._heartbeat(), name='loop-watchdog')
+        threading.Thread(target=self._watch, name='loop-watchdog', daemon=True).start()
+        logger.info(
+            f"🐕 Сторож event loop ({self.process}): пульс {self.interval * 1000:.0f} мс, "
+            f"порог блокировки {self.threshold * 1000:.0f} мс"
+        )
+
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _heartbeat(self):
+        lag_metric = metrics.LOOP_LAG_SECONDS.labels(self.process)
+        while not self._stop.is_set():
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            self._last_beat = now
+            lag = max(0.0, now - expected)
+            lag_metric.observe(lag)
+            self._lags.append((time.monotonic(), lag))
+            with self._lock:
+                capture, self._capture = self._capture, None
+            if lag >= self.threshold:
+                self._report(lag, capture)
+
+    def _watch(self):
+        """Поток-сторож: снимает стек, пока loop ещё заблокирован"""
+        while not self._stop.wait(self.interval / 2):
+            stalled = time.perf_counter() - self._last_beat - self.interval
+            if stalled < self.threshold or self._capture is not None:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            try:
+                task = _task_name(self.loop)
+            except Exception:
+                task = '-'
+            with self._lock:
+                if self._capture is None:
+                    self._capture = (stack, task)
+
+    def _report(self, lag: float, capture):
+        if capture is not None:
+            stack, task = capture
+            location = _project_location(stack)
+        else:
+            # Пульс опоздал, но сторож не успел снять стек (короткая блокировка)
+            stack, task, location = None, '-', 'unknown'
+
+        self.blocks += 1
+        metrics.LOOP_BLOCKS.labels(self.process, location).inc()
+        self.recent_blocks.append({
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'lag_ms': round(lag * 1000, 1),
+            'location': location,
+            'task': task,
+        })
+
+        now = time.monotonic()
+        if now - self._logged_at.get(location, -LOG_EVERY_SEC) < LOG_EVERY_SEC:
+            logger.debug(f"🐌 Event loop ({self.process}) заблокирован на {lag * 1000:.0f} мс: {location}")
+            return
+        self._logged_at[location] = now
+        message = (
+            f"🐌 Event loop ({self.process}) заблокирован на {lag * 1000:.0f} мс\n"
+            f"   место: {location}\n"
+            f"   задача: {task}"
+        )
+        if stack:
+            message += "\n" + "".join(traceback.format_list(stack[-STACK_LIMIT:])).rstrip()
+        logger.warning(message)
+
+    def snapshot(self) -> dict:
+        horizon = time.monotonic() - 60
+        recent = [lag for at, lag in list(self._lags) if at >= horizon]
+        return {
+            'interval_ms': round(self.interval * 1000),
+            'threshold_ms': round(self.threshold * 1000),
+            'max_lag_1m_ms': round(max(recent) * 1000, 1) if recent else None,
+            'blocks_total': self.blocks,
+            'recent_blocks': list(self.recent_blocks)[-5:],
+        }
+
+
+def start(process: str):
+    """Запускает сторожа для текущего event loop; повторный вызов ничего не делает"""
+    global _watchdog
+    if os.getenv('LOOP_WATCHDOG', '1').lower() in ('0', 'false', 'no'):
+        return None
+    if _watchdog is not None:
+        return _watchdog
+    _watchdog = LoopWatchdog(process, asyncio.get_running_loop())
+    _watchdog.start()
+    return _watchdog
+
+
+def snapshot():
+    """Состояние сторожа для /health или None, если он не запущен"""
+    return _watchdog.snapshot() if _watchdog is not None else None
@@ -7,6 +7,10 @@ import signal
 import atexit
 import sys
 
+# 0. Профилирование старта (--profile-startup) — до всех тяжёлых импортов
+import startup_profiler
+startup_profiler.enable_from_argv('telegram')
+
 # 1. СНАЧАЛА настраиваем логирование
 def setup_logging():
     # Создаем папку для логов, если ее нет
@@ -32,6 +36,7 @@ def setup_logging():
 # Настраиваем логирование СРАЗУ
 setup_logging()
 logger = logging.getLogger(__name__)
+startup_profiler.checkpoint('logging')
 
 # 2. ПОТОМ импортируем остальные модули
 try:
@@ -44,6 +49,7 @@ try:
         sys.exit(1)
         
     logger.info("✅ Базовые модули успешно импортированы")
+    startup_profiler.checkpoint('config+database')
     
 except ImportError as e:
     logger.error(f"❌ Ошибка импорта модулей: {e}")
@@ -62,6 +68,11 @@ try:
         migrate()
     except Exception as e:
         logger.warning(f"⚠️ Migration check: {e}")
+    # Индекс под ON CONFLICT в order_service: без него не проходит ни один заказ
+    from migrate_add_order_unique_index import run_migration as migrate_order_index
+    if not migrate_order_index():
+        raise RuntimeError("не создан индекс uq_orders_user_date_active")
+    startup_profiler.checkpoint('create_all+migrations')
 except Exception as e:
     logger.error(f"❌ Ошибка инициализации БД: {e}")
     sys.exit(1)
@@ -85,6 +96,7 @@ async def main():
     try:
         # 🔥 ОТЛОЖЕННЫЙ ИМПОРТ bot_core - после настройки логирования
         from bot_core import LunchBot
+        startup_profiler.checkpoint('import bot_core')
         
         logger.info("🚀 Запуск бота...")
         logger.info("Проверка логирования перед созданием бота...")
@@ -105,6 +117,7 @@ async def main():
             logger.error(f"Ошибка импорта BitrixSync: {e}")
         except Exception as e:
             logger.error(f"Ошибка инициализации BitrixSync: {e}")
+        startup_profiler.checkpoint('BitrixSync')
         
         # 🔥 ШАГ 3: Передаем bitrix_sync в бота
         bot.bitrix_sync = bitrix_sync
@@ -8,7 +8,7 @@ from maxapi.types import MessageCreated, MessageCallback
 from database import db
 from config import CONFIG
 from time_config import TIME_CONFIG
-from services.menu_service import get_menu_for_day, format_menu_text, get_week_menus
+from services.menu_service import get_menu_for_day, format_menu_text, get_week_view
 from services.order_service import get_order_for_date
 from services.time_service import can_modify_order
 from services.user_service import get_user_by_messenger, get_verified_user, MESSENGER_MAX
@@ -66,7 +66,7 @@ async def show_week_menu(event: MessageCreated):
             await event.message.answer("❌ Вы не зарегистрированы. Отправьте /start")
             return
 
-        week = get_week_menus(CONFIG)
+        week = get_week_view(user_db_id, CONFIG, session)
 
         for day_info in week:
             if day_info['is_weekend']:
@@ -85,11 +85,10 @@ async def show_week_menu(event: MessageCreated):
             text = format_menu_text(menu, day_info['day_name'], day_info['target_date'])
             offset = day_info['day_offset']
 
-            order = get_order_for_date(user_db_id, day_info['target_date'], session)
-            has_order = order is not None
-            can_mod = can_modify_order(day_info['target_date'], CONFIG.are_orders_accepted_now())
+            has_order = day_info['has_order']
+            can_mod = day_info['can_modify']
 
             if has_order:
-                text += f"\n\n🛒 Ваш заказ: {order.quantity} порций"
+                text += f"\n\n🛒 Ваш заказ: {day_info['quantity']} порций"
 
             await event.message.answer(text, attachments=[order_buttons(offset, has_order, can_mod)])
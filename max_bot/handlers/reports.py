@@ -7,7 +7,7 @@ from maxapi.types import MessageCreated, MessageCallback, InputMedia
 
 from database import db
 from config import CONFIG
-from services.user_service import get_user_role, MESSENGER_MAX
+from services.user_service import get_user_role_async, MESSENGER_MAX
 from services.report_service import (
     generate_provider_report_text,
     generate_accounting_report_file,
@@ -23,7 +23,7 @@ router = Router()
 async def daily_report(event: MessageCreated):
     """Generate and send daily report."""
     user_id = event.user.user_id
-    role = get_user_role(user_id, MESSENGER_MAX, CONFIG)
+    role = await get_user_role_async(user_id, MESSENGER_MAX, CONFIG)
 
     if role not in ('admin', 'provider', 'accountant'):
         await event.message.answer("❌ У вас нет прав для просмотра отчетов.")
@@ -48,7 +48,7 @@ async def daily_report(event: MessageCreated):
 async def monthly_report_menu(event: MessageCreated):
     """Show month selection for monthly report."""
     user_id = event.user.user_id
-    role = get_user_role(user_id, MESSENGER_MAX, CONFIG)
+    role = await get_user_role_async(user_id, MESSENGER_MAX, CONFIG)
 
     if role not in ('admin', 'provider', 'accountant'):
         await event.message.answer("❌ У вас нет прав для просмотра отчетов.")
@@ -61,7 +61,7 @@ async def monthly_report_menu(event: MessageCreated):
 async def on_month_selected(event: MessageCallback):
     """Handle month selection, show report type selection."""
     user_id = event.user.user_id
-    role = get_user_role(user_id, MESSENGER_MAX, CONFIG)
+    role = await get_user_role_async(user_id, MESSENGER_MAX, CONFIG)
 
     if role not in ('admin', 'provider', 'accountant'):
         await event.answer(notification="❌ Нет прав")
@@ -111,7 +111,7 @@ async def on_month_selected(event: MessageCallback):
 async def on_report_type(event: MessageCallback):
     """Generate specific report type."""
     user_id = event.user.user_id
-    role = get_user_role(user_id, MESSENGER_MAX, CONFIG)
+    role = await get_user_role_async(user_id, MESSENGER_MAX, CONFIG)
     report_type = event.callback.payload.replace("report_", "")
 
     if role != 'admin':
@@ -11,6 +11,10 @@ from pathlib import Path
 # Add project root to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+# Startup profiling (--profile-startup / PROFILE_STARTUP=1) must start before heavy imports
+import startup_profiler
+startup_profiler.enable_from_argv('max')
+
 from logging.handlers import RotatingFileHandler
 
 
@@ -57,6 +61,12 @@ async def main():
         except Exception as e:
             logger.warning(f"Migration check: {e}")
 
+        # Partial unique index behind ON CONFLICT in order_service
+        from migrate_add_order_unique_index import run_migration as migrate_order_index
+        if not migrate_order_index():
+            logger.error("Индекс uq_orders_user_date_active не создан — заказы не будут работать")
+            sys.exit(1)
+
         token = os.getenv('MAX_BOT_TOKEN')
         if not token:
             logger.error("MAX_BOT_TOKEN not set in environment")
@@ -65,10 +75,46 @@ async def main():
         bot = Bot(token=token)
         dp = Dispatcher()
 
+        # Отдельная сессия БД на каждое событие Max (db.session внутри хендлеров)
+        from maxapi.filters.middleware import BaseMiddleware
+
+        import metrics
+
+        def handler_label(event_object):
+            payload = getattr(getattr(event_object, 'callback', None), 'payload', None)
+            if payload:
+                return f"callback:{metrics.callback_prefix(str(payload))}"
+            body = getattr(getattr(event_object, 'message', None), 'body', None)
+            return metrics.command_label(getattr(body, 'text', None))
+
+        class RequestScopeMiddleware(BaseMiddleware):
+            async def __call__(self, handler, event_object, data):
+                label = handler_label(event_object)
+                try:
+                    with metrics.track_handler("max", label):
+                        with db.request_scope(f"max:{label}"):
+                            return await handler(event_object, data)
+                finally:
+                    startup_profiler.mark_first_update()
+
+        dp.middlewares.append(RequestScopeMiddleware())
+
         # Register handlers
         from max_bot.handlers import setup_routers
         setup_routers(dp)
 
+        # Config changes made by the other bots (LISTEN config_changed)
+        from config_notify import start_config_listener
+        start_config_listener()
+
+        # /metrics and /health on a side HTTP server (MAX_METRICS_PORT)
+        metrics.start_metrics_server("max")
+
+        # Event-loop lag and blocking-call detection (bot_event_loop_*)
+        import loop_watchdog
+        loop_watchdog.start("max")
+
+        startup_profiler.checkpoint('max setup')
         logger.info("=== Max bot starting ===")
         me = await bot.get_me()
         logger.info(f"Bot info: {me}")
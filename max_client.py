@@ -5,6 +5,8 @@ Does NOT start a dispatcher — only used for outbound messages.
 import os
 import logging
 
+import metrics
+
 logger = logging.getLogger(__name__)
 
 _max_bot = None
@@ -41,9 +43,12 @@ async def send_max_message(user_max_id, text):
         return False
 
     try:
-        await bot.send_message(chat_id=user_max_id, text=text)
+        with metrics.track_outbound('max'):
+            await bot.send_message(chat_id=user_max_id, text=text)
+        metrics.count_message('max', 'send_message')
         return True
     except Exception as e:
+        metrics.count_message('max', 'send_message', ok=False)
         logger.warning(f"Failed to send Max message to {user_max_id}: {e}")
         return False
 
@@ -57,8 +62,11 @@ async def send_max_document(user_max_id, file_path, caption=""):
     try:
         from maxapi.types import InputMedia
         attachments = [InputMedia(path=file_path)]
-        await bot.send_message(chat_id=user_max_id, text=caption, attachments=attachments)
+        with metrics.track_outbound('max'):
+            await bot.send_message(chat_id=user_max_id, text=caption, attachments=attachments)
+        metrics.count_message('max', 'send_document')
         return True
     except Exception as e:
+        metrics.count_message('max', 'send_document', ok=False)
         logger.warning(f"Failed to send Max document to {user_max_id}: {e}")
         return False
@@ -0,0 +1,643 @@
+"""
+Метрики в формате Prometheus для всех процессов бота.
+
+Без внешних зависимостей: счётчики, гистограммы и gauge хранятся в памяти
+процесса и отдаются текстом (формат exposition 0.0.4):
+- Bitrix24-бот — GET /metrics в его FastAPI-приложении;
+- Telegram, VK, Max — маленький HTTP-сервер сбоку (start_metrics_server),
+  порт из <ПРОЦЕСС>_METRICS_PORT (по умолчанию 9101/9102/9103, 0 — выключить),
+  адрес из METRICS_HOST.
+
+Что меряется:
+- bot_handler_duration_seconds / bot_handler_errors_total — обработка апдейта
+  по команде или префиксу callback;
+- bot_db_queries_total / bot_db_query_duration_seconds — SQL по типу запроса;
+- bot_bitrix_* — вызовы REST Bitrix24 по методам и их ошибки;
+- bot_messages_sent_total / bot_outbound_in_flight — исходящие сообщения
+  по мессенджерам и отправки, ожидающие ответа API;
+- bot_scheduler_job_* — задачи APScheduler и их последний успешный запуск;
+- bot_report_generation_seconds — формирование отчётов;
+- bot_event_loop_lag_seconds / bot_event_loop_blocks_total — опоздание event loop
+  и блокирующие вызовы (loop_watchdog.py);
+- bot_webhook_updates_total / bot_update_queue_depth — приём апдейтов Telegram
+  через webhook и глубина внутренней очереди (telegram_webhook.py).
+- bot_update_lock_wait_seconds / bot_updates_in_progress — параллельная обработка
+  апдейтов с очередью на пользователя и чат (update_ordering.py).
+
+Тот же сервер отдаёт GET /health — глубокую проверку процесса (health.py).
+"""
+import os
+import re
+import json
+import time
+import asyncio
+import logging
+import functools
+import threading
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+JOB_BUCKETS = (0.1, 0.5, 1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Порты бокового HTTP-сервера по умолчанию
+DEFAULT_PORTS = {'telegram': 9101, 'vk': 9102, 'max': 9103}
+
+_registry = []
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format_labels(names, values, extra=()) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs += [f'{n}="{_escape(v)}"' for n, v in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Timer:
+    """Замер времени: контекстный менеджер и декоратор (sync и async)"""
+
+    def __init__(self, observe):
+        self._observe = observe
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._observe(time.perf_counter() - self._started)
+        return False
+
+    def __call__(self, func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with _Timer(self._observe):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Timer(self._observe):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        _registry.append(self)
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name}: ожидаются метки {self.labelnames}")
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, extra, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, labels, extra)} {_format_value(value)}")
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def _samples(self):
+        for labels, child in list(self._children.items()):
+            yield '', labels, (), child.value
+
+
+class _GaugeChild:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value: float):
+        self._value = float(value)
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+    @property
+    def value(self):
+        return self._value
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def values(self) -> dict:
+        """{значения меток: значение} — для /health"""
+        return {labels: child.value for labels, child in list(self._children.items())}
+
+    def _samples(self):
+        for labels, child in list(self._children.items()):
+            yield '', labels, (), child.value
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self._buckets = buckets
+        self._counts = [0] * len(buckets)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self._sum += value
+            self._count += 1
+            for i, bound in enumerate(self._buckets):
+                if value <= bound:
+                    self._counts[i] += 1
+                    break
+
+    def time(self) -> _Timer:
+        return _Timer(self.observe)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._counts), self._sum, self._count
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def _samples(self):
+        for labels, child in list(self._children.items()):
+            counts, total, count = child.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield '_bucket', labels, (('le', _format_value(bound)),), cumulative
+            yield '_sum', labels, (), total
+            yield '_count', labels, (), count
+
+
+def render() -> str:
+    """Все метрики процесса в текстовом формате Prometheus"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# ---------------------------------------------------------------------------
+# Метрики бота
+# ---------------------------------------------------------------------------
+
+PROCESS_START_TIME = Gauge('bot_process_start_time_seconds', 'Время запуска процесса (unix)', ['process'])
+
+HANDLER_SECONDS = Histogram(
+    'bot_handler_duration_seconds', 'Время обработки апдейта', ['transport', 'handler'])
+HANDLER_ERRORS = Counter(
+    'bot_handler_errors_total', 'Апдейты, обработка которых упала', ['transport', 'handler'])
+
+DB_QUERIES = Counter('bot_db_queries_total', 'SQL-запросы', ['statement'])
+DB_QUERY_SECONDS = Histogram(
+    'bot_db_query_duration_seconds', 'Время SQL-запроса', ['statement'], buckets=DB_BUCKETS)
+
+BITRIX_CALLS = Counter('bot_bitrix_calls_total', 'Вызовы REST Bitrix24', ['method'])
+BITRIX_ERRORS = Counter('bot_bitrix_errors_total', 'Ошибки вызовов REST Bitrix24', ['method'])
+BITRIX_SECONDS = Histogram('bot_bitrix_call_duration_seconds', 'Время вызова REST Bitrix24', ['method'])
+
+MESSAGES_SENT = Counter(
+    'bot_messages_sent_total', 'Исходящие сообщения', ['messenger', 'method', 'result'])
+OUTBOUND_IN_FLIGHT = Gauge(
+    'bot_outbound_in_flight', 'Исходящие сообщения, ожидающие ответа API', ['messenger'])
+
+JOB_SECONDS = Histogram(
+    'bot_scheduler_job_duration_seconds', 'Время выполнения задачи планировщика', ['job'], buckets=JOB_BUCKETS)
+JOB_ERRORS = Counter('bot_scheduler_job_errors_total', 'Упавшие задачи планировщика', ['job'])
+JOB_LAST_SUCCESS = Gauge(
+    'bot_scheduler_job_last_success_time_seconds', 'Последнее успешное выполнение задачи (unix)', ['job'])
+
+LOOP_LAG_SECONDS = Histogram(
+    'bot_event_loop_lag_seconds', 'Опоздание пульса event loop', ['process'], buckets=LAG_BUCKETS)
+LOOP_BLOCKS = Counter(
+    'bot_event_loop_blocks_total', 'Блокировки event loop дольше порога по месту в коде', ['process', 'location'])
+
+WEBHOOK_UPDATES = Counter(
+    'bot_webhook_updates_total', 'Апдейты, принятые webhook, по результату', ['transport', 'result'])
+UPDATE_QUEUE_DEPTH = Gauge(
+    'bot_update_queue_depth', 'Апдейты во внутренней очереди, ожидающие обработки', ['transport'])
+UPDATE_LOCK_WAIT_SECONDS = Histogram(
+    'bot_update_lock_wait_seconds', 'Ожидание очереди пользователя/чата и общего лимита перед обработкой апдейта',
+    ['transport', 'lock'], buckets=LAG_BUCKETS)
+UPDATES_IN_PROGRESS = Gauge(
+    'bot_updates_in_progress', 'Апдейты, ожидающие своей очереди и обрабатываемые сейчас', ['transport', 'state'])
+
+REPORT_SECONDS = Histogram(
+    'bot_report_generation_seconds', 'Время формирования отчёта', ['report'], buckets=JOB_BUCKETS)
+
+
+# ---------------------------------------------------------------------------
+# Обработчики апдейтов
+# ---------------------------------------------------------------------------
+
+_ID_PART = re.compile(r'[\d-]')
+
+
+def callback_prefix(data: str) -> str:
+    """Префикс callback_data без идентификаторов: del_staff_12 → del_staff, order:3 → order"""
+    if not data:
+        return 'empty'
+    parts = []
+    for part in re.split(r'[_:|]', data):
+        if not part or _ID_PART.search(part) or len(parts) == 2:
+            break
+        parts.append(part)
+    return '_'.join(parts) or 'other'
+
+
+def command_label(text) -> str:
+    """/start@bot args → /start; обычный текст — 'text', чтобы не плодить метки"""
+    if isinstance(text, str) and text.startswith('/'):
+        return text.split()[0].split('@')[0][:32]
+    return 'text'
+
+
+def telegram_handler_label(update) -> str:
+    callback = getattr(update, 'callback_query', None)
+    if callback is not None:
+        return f"callback:{callback_prefix(callback.data)}"
+    message = getattr(update, 'effective_message', None)
+    if message is not None:
+        return command_label(message.text)
+    return 'other'
+
+
+def vk_handler_label(event) -> str:
+    """Message: команда или payload кнопки; raw message_event: cmd из payload"""
+    obj = event.get('object') if isinstance(event, dict) else getattr(event, 'object', None)
+    text = getattr(event, 'text', None)
+    if isinstance(obj, dict) and isinstance(obj.get('message'), dict):
+        # Сырое событие message_new: текст и payload — во вложенном message
+        obj = obj['message']
+        text = obj.get('text')
+    payload = obj.get('payload') if isinstance(obj, dict) else getattr(obj, 'payload', None)
+    if payload is None:
+        payload = getattr(event, 'payload', None)
+    if isinstance(payload, str):
+        try:
+            payload = json.loads(payload)
+        except ValueError:
+            payload = None
+    if isinstance(payload, dict) and payload.get('cmd'):
+        return f"callback:{callback_prefix(str(payload['cmd']))}"
+    return command_label(text)
+
+
+@contextmanager
+def track_handler(transport: str, handler: str):
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        HANDLER_ERRORS.labels(transport, handler).inc()
+        raise
+    finally:
+        HANDLER_SECONDS.labels(transport, handler).observe(time.perf_counter() - started)
+
+
+# ---------------------------------------------------------------------------
+# База данных
+# ---------------------------------------------------------------------------
+
+_db_instrumented = False
+
+
+def _statement_kind(statement: str) -> str:
+    word = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else ''
+    return word if word in ('select', 'insert', 'update', 'delete', 'with') else 'other'
+
+
+def instrument_database():
+    """Считает все SQL-запросы процесса: слушатель на классе Engine
+    покрывает и синхронный движок, и sync_engine асинхронного"""
+    global _db_instrumented
+    if _db_instrumented:
+        return
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get('metrics_query_start')
+        if not stack:
+            return
+        kind = _statement_kind(statement)
+        DB_QUERIES.labels(kind).inc()
+        DB_QUERY_SECONDS.labels(kind).observe(time.perf_counter() - stack.pop())
+
+    @event.listens_for(Engine, 'handle_error')
+    def _error(exception_context):
+        conn = exception_context.connection
+        stack = conn.info.get('metrics_query_start') if conn is not None else None
+        if stack:
+            stack.pop()
+
+    _db_instrumented = True
+
+
+# ---------------------------------------------------------------------------
+# Bitrix24
+# ---------------------------------------------------------------------------
+
+_bitrix_listeners = []
+
+
+def add_bitrix_listener(callback):
+    """callback(method, seconds, ok) вызывается после каждого вызова REST (телеметрия синхронизации)"""
+    _bitrix_listeners.append(callback)
+
+
+@contextmanager
+def track_bitrix(method: str):
+    BITRIX_CALLS.labels(method).inc()
+    started = time.perf_counter()
+    ok = True
+    try:
+        yield
+    except BaseException:
+        ok = False
+        BITRIX_ERRORS.labels(method).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        BITRIX_SECONDS.labels(method).observe(elapsed)
+        for listener in _bitrix_listeners:
+            try:
+                listener(method, elapsed, ok)
+            except Exception:
+                logger.debug("Ошибка слушателя вызовов Bitrix", exc_info=True)
+
+
+class InstrumentedBitrix:
+    """Обёртка над fast_bitrix24.Bitrix: call/get_all/... считаются по имени метода REST"""
+
+    _TRACKED = ('call', 'get_all', 'get_by_ID', 'list_and_get')
+
+    def __init__(self, bx):
+        self._bx = bx
+
+    def __getattr__(self, name):
+        attr = getattr(self._bx, name)
+        if name not in self._TRACKED and name != 'call_batch':
+            return attr
+
+        @functools.wraps(attr)
+        async def wrapper(*args, **kwargs):
+            method = 'batch' if name == 'call_batch' else (args[0] if args else kwargs.get('method', 'unknown'))
+            with track_bitrix(method):
+                return await attr(*args, **kwargs)
+        return wrapper
+
+
+# ---------------------------------------------------------------------------
+# Исходящие сообщения
+# ---------------------------------------------------------------------------
+
+def count_message(messenger: str, method: str, ok: bool = True, amount: int = 1):
+    MESSAGES_SENT.labels(messenger, method, 'ok' if ok else 'error').inc(amount)
+
+
+@contextmanager
+def track_outbound(messenger: str):
+    """Отправка «в полёте»: глубина исходящей очереди для /health"""
+    gauge = OUTBOUND_IN_FLIGHT.labels(messenger)
+    gauge.inc()
+    try:
+        yield
+    finally:
+        gauge.dec()
+
+
+_VK_SEND_METHODS = ('messages.send', 'messages.edit', 'messages.sendMessageEventAnswer')
+
+
+def instrument_vk_api(api):
+    """Считает отправку сообщений через vkbottle API (messages.send/edit)"""
+    if api is None or getattr(api, '_metrics_instrumented', False):
+        return api
+    original = api.request
+
+    async def request(method, *args, **kwargs):
+        if method not in _VK_SEND_METHODS:
+            return await original(method, *args, **kwargs)
+        try:
+            with track_outbound('vk'):
+                result = await original(method, *args, **kwargs)
+        except BaseException:
+            count_message('vk', method, ok=False)
+            raise
+        count_message('vk', method)
+        return result
+
+    api.request = request
+    api._metrics_instrumented = True
+    return api
+
+
+# ---------------------------------------------------------------------------
+# Планировщик и отчёты
+# ---------------------------------------------------------------------------
+
+def _job_operation(func):
+    """Оборачивает функцию задачи: её SQL-запросы приписываются операции job:<имя>"""
+    from database import traced_operation
+
+    if not callable(func):
+        return func
+    name = getattr(func, '__name__', None) or type(func).__name__
+    return traced_operation(f"job:{name}")(func)
+
+
+def instrument_scheduler(scheduler):
+    """Длительность и ошибки задач APScheduler: старт — по EVENT_JOB_SUBMITTED,
+    конец — по EVENT_JOB_EXECUTED/EVENT_JOB_ERROR того же запуска.
+    Функции задач, добавленных после этого, выполняются в операции job:<имя>
+    (атрибуция медленных SQL-запросов в database.py)."""
+    from apscheduler.events import EVENT_JOB_SUBMITTED, EVENT_JOB_EXECUTED, EVENT_JOB_ERROR
+
+    add_job = scheduler.add_job
+
+    @functools.wraps(add_job)
+    def traced_add_job(func, *args, **kwargs):
+        return add_job(_job_operation(func), *args, **kwargs)
+
+    scheduler.add_job = traced_add_job
+
+    running = {}
+    lock = threading.Lock()
+
+    def job_name(job_id):
+        job = scheduler.get_job(job_id)
+        return job.name if job is not None else job_id
+
+    def on_event(event):
+        if event.code == EVENT_JOB_SUBMITTED:
+            started = time.perf_counter()
+            name = job_name(event.job_id)
+            with lock:
+                for run_time in event.scheduled_run_times:
+                    running[(event.job_id, run_time)] = (name, started)
+            return
+        with lock:
+            entry = running.pop((event.job_id, event.scheduled_run_time), None)
+        if entry is None:
+            return
+        name, started = entry
+        JOB_SECONDS.labels(name).observe(time.perf_counter() - started)
+        if event.code == EVENT_JOB_ERROR:
+            JOB_ERRORS.labels(name).inc()
+        else:
+            JOB_LAST_SUCCESS.labels(name).set(time.time())
+
+    scheduler.add_listener(on_event, EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
+    return scheduler
+
+
+def track_report(report: str) -> _Timer:
+    """@track_report('accounting') или with track_report('accounting'): ..."""
+    return REPORT_SECONDS.labels(report).time()
+
+
+# ---------------------------------------------------------------------------
+# Боковой HTTP-сервер
+# ---------------------------------------------------------------------------
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if path == '/health':
+            import health
+            report = health.collect(_process)
+            self._reply(health.http_status(report), json.dumps(report, ensure_ascii=False).encode('utf-8'),
+                        'application/json; charset=utf-8')
+            return
+        if path != '/metrics':
+            self.send_error(404)
+            return
+        self._reply(200, render().encode('utf-8'), CONTENT_TYPE)
+
+    def _reply(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_process = 'bot'
+
+
+def start_metrics_server(process: str, port: int = None, host: str = None):
+    """Поднимает /metrics и /health в фоновом потоке. Порт — из <PROCESS>_METRICS_PORT,
+    0 — не запускать. Заодно включает подсчёт SQL-запросов."""
+    global _server, _process
+    instrument_database()
+    PROCESS_START_TIME.labels(process).set(time.time())
+    _process = process
+    try:
+        import health
+        health.register_loop(asyncio.get_running_loop())
+    except RuntimeError:
+        pass  # loop ещё не запущен (VK) — процесс зарегистрирует его сам
+    if _server is not None:
+        return _server
+
+    if port is None:
+        port = int(os.getenv(f'{process.upper()}_METRICS_PORT', DEFAULT_PORTS.get(process, 0)))
+    if not port:
+        logger.info(f"📊 Метрики {process}: HTTP-сервер выключен")
+        return None
+    host = host or os.getenv('METRICS_HOST', '0.0.0.0')
+    try:
+        _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        logger.warning(f"⚠️ Не удалось запустить сервер метрик на {host}:{port}: {e}")
+        return None
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name='metrics-http', daemon=True).start()
+    logger.info(f"📊 Метрики {process}: http://{host}:{port}/metrics, /health")
+    return _server
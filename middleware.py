@@ -2,8 +2,8 @@
 from telegram import Update
 from telegram.ext import BaseHandler, ContextTypes
 import logging
-from database import db
-from models import User
+from database import db, traced_operation
+from services.user_service import get_user_by_messenger_async, MESSENGER_TELEGRAM
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +15,7 @@ class AccessControlHandler(BaseHandler):
     def check_update(self, update: object) -> bool:
         return isinstance(update, Update)
 
+    @traced_operation('access')
     async def _handle_update(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user = update.effective_user
         if context.user_data.get('is_verified'):
@@ -28,10 +29,8 @@ class AccessControlHandler(BaseHandler):
             if user.id in context.application.bot_data.get('admin_ids', []):
                 return True
 
-            with db.get_session() as session:
-                user_data = session.query(User).filter(
-                    User.telegram_id == user.id
-                ).first()
+            async with db.get_async_session() as session:
+                user_data = await get_user_by_messenger_async(user.id, MESSENGER_TELEGRAM, session)
                 
                 if not user_data:
                     logger.info(f"Незарегистрированный пользователь {user.id}")
@@ -77,10 +76,8 @@ async def check_user_access(user_id: int, application=None) -> bool:
         if application and user_id in application.bot_data.get('admin_ids', []):
             return True
             
-        with db.get_session() as session:
-            user_data = session.query(User).filter(
-                User.telegram_id == user_id
-            ).first()
+        async with db.get_async_session() as session:
+            user_data = await get_user_by_messenger_async(user_id, MESSENGER_TELEGRAM, session)
             
             return bool(user_data and user_data.is_verified and not user_data.is_deleted)
     except Exception as e:
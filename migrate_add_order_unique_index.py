@@ -0,0 +1,90 @@
+"""
+Миграция: частичный уникальный индекс на активные заказы бота.
+
+Создаёт uq_orders_user_date_active (user_id, target_date)
+WHERE is_cancelled = false AND is_from_bitrix = false —
+на него опираются INSERT ... ON CONFLICT в services/order_service.py.
+Перед созданием индекса отменяет дубли (оставляет заказ, уже
+отправленный в Битрикс, иначе самый ранний).
+
+Запускается автоматически при старте каждого бота (main.py, vk_bot,
+max_bot, bitrix24_bot) до приёма апдейтов: без индекса любой заказ
+падает с «no unique or exclusion constraint matching the ON CONFLICT».
+Боты стартуют параллельно, поэтому миграция берёт advisory-lock.
+На SQLite индекс создаёт create_all (таблицы там всегда новые).
+
+Использование:
+    python migrate_add_order_unique_index.py
+"""
+import os
+import sys
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Добавляем корень проекта в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import db
+from sqlalchemy import text
+
+# Ключ pg_advisory_xact_lock: одна миграция на все стартующие процессы
+_MIGRATION_LOCK_KEY = 0x6F72646572  # 'order'
+
+
+def run_migration():
+    """Убирает дубли и создаёт индекс uq_orders_user_date_active."""
+    if db.engine.dialect.name != 'postgresql':
+        return True
+    try:
+        with db.get_session() as session:
+            session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {'key': _MIGRATION_LOCK_KEY})
+            result = session.execute(text("""
+                SELECT indexname FROM pg_indexes
+                WHERE tablename = 'orders' AND indexname = 'uq_orders_user_date_active'
+            """))
+            if result.fetchone():
+                logger.info("✅ Индекс uq_orders_user_date_active уже существует")
+                return True
+
+            # NULL в флагах не попадает под условие индекса — приводим к false
+            session.execute(text("UPDATE orders SET is_cancelled = FALSE WHERE is_cancelled IS NULL"))
+            session.execute(text("UPDATE orders SET is_from_bitrix = FALSE WHERE is_from_bitrix IS NULL"))
+
+            result = session.execute(text("""
+                UPDATE orders SET is_cancelled = TRUE, updated_at = now()
+                WHERE id IN (
+                    SELECT id FROM (
+                        SELECT id, ROW_NUMBER() OVER (
+                            PARTITION BY user_id, target_date
+                            ORDER BY (bitrix_order_id IS NULL), id
+                        ) AS rn
+                        FROM orders
+                        WHERE is_cancelled = FALSE AND is_from_bitrix = FALSE
+                    ) d
+                    WHERE d.rn > 1
+                )
+            """))
+            if result.rowcount:
+                logger.warning(f"⚠️ Отменено дублирующихся заказов: {result.rowcount}")
+
+            logger.info("➕ Создаём индекс uq_orders_user_date_active...")
+            session.execute(text("""
+                CREATE UNIQUE INDEX uq_orders_user_date_active
+                ON orders (user_id, target_date)
+                WHERE is_cancelled = false AND is_from_bitrix = false
+            """))
+            logger.info("✅ Индекс создан")
+
+        logger.info("✅ Миграция завершена успешно")
+        return True
+
+    except Exception as e:
+        logger.error(f"❌ Ошибка миграции: {e}")
+        return False
+
+
+if __name__ == '__main__':
+    success = run_migration()
+    sys.exit(0 if success else 1)
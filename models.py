@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, UniqueConstraint, CheckConstraint, BigInteger
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, UniqueConstraint, CheckConstraint, BigInteger, Index, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -67,6 +67,17 @@ class Order(Base):
     
     user = relationship("User")
 
+    __table_args__ = (
+        # Не больше одного активного заказа бота на пользователя и дату
+        # (заказы из Битрикс могут дублироваться). Цель ON CONFLICT в order_service.
+        Index(
+            'uq_orders_user_date_active', 'user_id', 'target_date',
+            unique=True,
+            postgresql_where=text('is_cancelled = false AND is_from_bitrix = false'),
+            sqlite_where=text('is_cancelled = 0 AND is_from_bitrix = 0'),
+        ),
+    )
+
 class Holiday(Base):
     __tablename__ = 'holidays'
     
@@ -80,6 +91,15 @@ class Holiday(Base):
         UniqueConstraint('date', 'name', name='uq_holiday_date_name'),
     )
 
+class ProductionCalendarDay(Base):
+    """День производственного календаря РФ (загружается годами из isdayoff.ru)"""
+    __tablename__ = 'production_calendar'
+
+    day = Column(Date, primary_key=True)
+    is_workday = Column(Boolean, nullable=False)
+    source = Column(String(50), nullable=False, default='isdayoff')
+    loaded_at = Column(DateTime, server_default=func.now())
+
 class Menu(Base):
     __tablename__ = 'menu'
     
@@ -122,4 +142,20 @@ class BotSetting(Base):
     id = Column(Integer, primary_key=True)
     setting_name = Column(String(100), unique=True, nullable=False)
     setting_value = Column(Text, nullable=True)
-    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
\ No newline at end of file
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+class SyncRun(Base):
+    """Прогон синхронизации с Bitrix24: длительность этапов, вызовы REST, итог"""
+    __tablename__ = 'sync_runs'
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(32), nullable=False, index=True)  # orders / employees / push
+    status = Column(String(16), nullable=False)             # ok / partial / error
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+    duration_ms = Column(Integer, nullable=False, default=0)
+    stages = Column(Text, nullable=True)      # JSON: этап -> мс
+    api_calls = Column(Text, nullable=True)   # JSON: calls/errors/ms по методам REST
+    retries = Column(Integer, nullable=False, default=0)
+    stats = Column(Text, nullable=True)       # JSON: счётчики прогона
+    error = Column(Text, nullable=True)
@@ -1,7 +1,5 @@
 # ##report_generators.py
-from openpyxl.styles import Font, Border, Side
 from typing import Optional
-import openpyxl
 from datetime import datetime, date
 from telegram import Update
 from telegram.error import Forbidden
@@ -12,6 +10,7 @@ import logging
 import asyncio
 from telegram.error import TimedOut, NetworkError
 
+import metrics
 from database import db
 from config import CONFIG
 from models import User, Order
@@ -37,6 +36,7 @@ from settings import SETTINGS_CONFIG
 
 logger = logging.getLogger(__name__)
 
+@metrics.track_report('telegram_provider_orders')
 async def export_orders_for_provider(
     update: Update,
     context: ContextTypes.DEFAULT_TYPE,
@@ -118,6 +118,7 @@ async def export_orders_for_provider(
             pass
         raise
     
+@metrics.track_report('telegram_accounting')
 async def export_accounting_report(
     update: Update,
     context: ContextTypes.DEFAULT_TYPE,
@@ -157,7 +158,9 @@ async def export_accounting_report(
         report_year = start_date.year
         month_year = f"{month_names[report_month]} {report_year}"
 
-        # Создаем Excel файл
+        # Создаем Excel файл (openpyxl импортируем только при генерации отчёта)
+        import openpyxl
+        from openpyxl.styles import Font
         wb = openpyxl.Workbook()
         ws = wb.active
         ws.title = "Удержания за обеды"
@@ -379,6 +382,7 @@ async def export_accounting_report(
             pass
         raise
     
+@metrics.track_report('telegram_monthly')
 async def export_monthly_report(
     update: Update,
     context: ContextTypes.DEFAULT_TYPE,
@@ -406,6 +410,8 @@ async def export_monthly_report(
 
         reports_dir = ensure_reports_dir('admin')
         
+        import openpyxl
+        from openpyxl.styles import Font, Border, Side
         wb = openpyxl.Workbook()
         
         # Удаляем лист по умолчанию
@@ -0,0 +1,55 @@
+"""
+Восстановление БД из инкрементальной цепочки бекапов.
+
+Разворачивает полный бекап (.sql.gz/.sql.zst/.sql.xz) и по порядку накатывает дельты
+(.json.gz): upsert изменённых строк и удаление строк-tombstone-ов.
+Цепочка проверяется до того, как база будет перезаписана.
+
+Использование:
+    # дельты ищутся рядом с базой (data/backups/<база>.delta_NNN.json.gz)
+    python restore_incremental.py data/backups/lunch_bot_backup_monday_2026-10-19_03-00-00.sql.zst --confirm
+
+    # явный список (например, скачанные с Яндекс.Диска)
+    python restore_incremental.py lunch_bot_backup_monday.sql.zst \\
+        lunch_bot_backup_monday_2026-10-19_03-00-00.delta_001.json.gz \\
+        lunch_bot_backup_monday_2026-10-19_03-00-00.delta_002.json.gz --confirm
+"""
+import os
+import sys
+import asyncio
+import logging
+import argparse
+from pathlib import Path
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Добавляем корень проекта в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+async def run_restore(base_path: Path, delta_paths: list, confirm: bool) -> bool:
+    from backup_manager import backup_manager
+
+    if not delta_paths:
+        delta_paths = backup_manager.find_incremental_chain(base_path)
+    logger.info(f"📦 База: {base_path.name}, дельт: {len(delta_paths)}")
+    for path in delta_paths:
+        logger.info(f"   🧩 {path.name}")
+
+    result = await backup_manager.restore_incremental(base_path, delta_paths, confirm=confirm)
+    logger.info(result['message'])
+    for key, value in result['details'].items():
+        logger.info(f"   {key}: {value}")
+    return result['success']
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Восстановление из полной базы и дельт')
+    parser.add_argument('base', type=Path, help='полный бекап (.sql.gz, .sql.zst или .sql.xz)')
+    parser.add_argument('deltas', type=Path, nargs='*', help='файлы дельт .json.gz (по умолчанию — найти рядом с базой)')
+    parser.add_argument('--confirm', action='store_true', help='подтвердить перезапись ВСЕХ текущих данных')
+    args = parser.parse_args()
+
+    success = asyncio.run(run_restore(args.base, args.deltas, args.confirm))
+    sys.exit(0 if success else 1)
@@ -0,0 +1,185 @@
+"""
+Сэмплирующий профилировщик event loop, включаемый по команде администратора.
+
+Фоновый поток раз в INTERVAL_SEC снимает стек потока event loop
+(sys._current_frames) и считает, в каких функциях он находится:
+- «своё» время — функция на вершине стека;
+- «накопленное» — функция где угодно в стеке (с вложенными вызовами).
+Каждый сэмпл весит столько, сколько прошло с предыдущего: пока код держит GIL,
+поток профилировщика просыпается реже, и счёт по штукам занижал бы занятость.
+
+Накладные расходы малы, код бота не меняется, поэтому профилировать можно
+прямо в проде в часы нагрузки (8:50–9:30). Ожидание в select() event loop
+считается простоем и показывается отдельно.
+
+    path, text = await sampling_profiler.profile_event_loop(30, process='telegram')
+
+Одновременно работает только один профиль на процесс.
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+REPORT_DIR = Path('data') / 'logs'
+INTERVAL_SEC = float(os.getenv('PROFILE_INTERVAL_MS', '5')) / 1000
+MAX_SECONDS = 300
+TOP_FUNCTIONS = 40
+
+# Вершина стека в этих функциях — event loop ждёт событий, а не работает
+_IDLE_FUNCTIONS = {('selectors.py', 'select'), ('selectors.py', '_select')}
+
+_busy = threading.Lock()
+
+
+class ProfilerBusyError(RuntimeError):
+    """Профиль уже снимается"""
+
+
+class SamplingProfiler:
+    """Снимает стек заданного потока с фиксированным интервалом"""
+
+    def __init__(self, thread_id: int, interval: float = INTERVAL_SEC):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = 0
+        self.idle = 0.0
+        self.own = Counter()
+        self.cumulative = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._started = None
+        self.duration = 0.0
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - self._started
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            weight, last = now - last, now
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self._sample(frame, weight)
+
+    def _sample(self, frame, weight):
+        self.samples += 1
+        leaf = _frame_key(frame)
+        if (os.path.basename(leaf[0]), leaf[2]) in _IDLE_FUNCTIONS:
+            self.idle += weight
+            return
+        self.own[leaf] += weight
+        seen = set()
+        while frame is not None:
+            key = _frame_key(frame)
+            if key not in seen:
+                seen.add(key)
+                self.cumulative[key] += weight
+            frame = frame.f_back
+
+    def report(self, top: int = TOP_FUNCTIONS, title: str = '') -> str:
+        busy = sum(self.own.values())
+        lines = [
+            f"Профиль event loop {title}".rstrip(),
+            f"Длительность: {self.duration:.1f} с, интервал {self.interval * 1000:.1f} мс, "
+            f"сэмплов {self.samples}",
+            f"Loop занят: {_percent(busy, self.duration)} ({busy:.2f} с), "
+            f"простаивает в select(): {_percent(self.idle, self.duration)}",
+            "",
+            "Время — оценка по сэмплам. % — от длительности профиля.",
+            "",
+        ]
+        lines += self._table(f"ТОП-{top} ПО НАКОПЛЕННОМУ ВРЕМЕНИ (с вложенными вызовами)", self.cumulative, top)
+        lines.append("")
+        lines += self._table(f"ТОП-{top} ПО СОБСТВЕННОМУ ВРЕМЕНИ", self.own, top)
+        return "\n".join(lines) + "\n"
+
+    def _table(self, header, counter, top):
+        lines = [header, f"{'время, с':>9} {'%':>7}  функция"]
+        for key, seconds in counter.most_common(top):
+            lines.append(f"{seconds:>9.2f} {_percent(seconds, self.duration):>7}  {_describe(key)}")
+        if not counter:
+            lines.append("   (нет сэмплов вне простоя)")
+        return lines
+
+
+def _frame_key(frame):
+    code = frame.f_code
+    return code.co_filename, code.co_firstlineno, code.co_name
+
+
+def _describe(key) -> str:
+    filename, lineno, name = key
+    try:
+        filename = os.path.relpath(filename)
+    except ValueError:
+        pass
+    if filename.startswith('..'):
+        # Библиотеки: путь от site-packages/lib, без префикса окружения
+        parts = Path(filename).parts
+        for marker in ('site-packages', 'dist-packages', 'lib'):
+            if marker in parts:
+                filename = str(Path(*parts[parts.index(marker) + 1:]))
+                break
+    return f"{name}  ({filename}:{lineno})"
+
+
+def _percent(part, whole) -> str:
+    return f"{part / whole * 100:.1f}%" if whole else "0.0%"
+
+
+def is_running() -> bool:
+    return _busy.locked()
+
+
+async def profile_event_loop(seconds: float, process: str = 'bot', interval: float = INTERVAL_SEC,
+                             top: int = TOP_FUNCTIONS):
+    """Профилирует поток текущего event loop seconds секунд.
+
+    Возвращает (путь к отчёту, текст отчёта). ProfilerBusyError — если профиль уже идёт.
+    """
+    seconds = max(1.0, min(float(seconds), MAX_SECONDS))
+    if not _busy.acquire(blocking=False):
+        raise ProfilerBusyError("Профиль уже снимается")
+    try:
+        started_at = datetime.now()
+        profiler = SamplingProfiler(threading.get_ident(), interval)
+        logger.info(f"🔬 Сэмплирующий профиль ({process}) запущен на {seconds:.0f} с")
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.stop()
+
+        text = profiler.report(top, title=f"({process}, {started_at:%d.%m.%Y %H:%M:%S})")
+        path = None
+        try:
+            REPORT_DIR.mkdir(parents=True, exist_ok=True)
+            path = REPORT_DIR / f"profile_{process}_{started_at:%Y%m%d_%H%M%S}.txt"
+            path.write_text(text, encoding='utf-8')
+        except OSError as e:
+            logger.warning(f"⚠️ Не удалось сохранить профиль: {e}")
+        logger.info(
+            f"🔬 Профиль ({process}) готов: {profiler.samples} сэмплов, "
+            f"loop занят {_percent(sum(profiler.own.values()), profiler.duration)}"
+        )
+        return path, text
+    finally:
+        _busy.release()
@@ -0,0 +1,379 @@
+"""
+Production calendar (Russian official workdays/days off).
+
+Whole years are bulk-loaded from isdayoff.ru, persisted in the
+`production_calendar` table and served from an in-memory per-year bitmap,
+so `is_workday` is an O(1) lookup with no network call on the hot path.
+Manual `Holiday` rows (CONFIG.holidays) are merged in at lookup time.
+
+WorkdayIndex precomputes, for a rolling year, everything the bot
+front-ends ask about a date: is it an order day, the next order day and
+the order/modification deadlines.
+"""
+import os
+import asyncio
+import logging
+import threading
+from datetime import date, datetime, timedelta
+from typing import NamedTuple
+
+from time_config import TIME_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Bitmap cell values
+_UNKNOWN, _WORKDAY, _DAY_OFF = 0, 1, 2
+
+
+def _days_in_year(year):
+    return (date(year + 1, 1, 1) - date(year, 1, 1)).days
+
+
+class IsDayOffSource:
+    """Bulk year loader for the isdayoff.ru API (one request per year)."""
+
+    name = 'isdayoff'
+
+    def __init__(self, base_url=None, timeout=10.0):
+        self.base_url = (base_url or os.getenv('PRODUCTION_CALENDAR_URL', 'https://isdayoff.ru')).rstrip('/')
+        self.timeout = timeout
+
+    async def fetch_year(self, year):
+        """Return {date: is_workday} for every day of the year.
+
+        The API answers with one digit per day: 0 — workday, 1 — day off,
+        2 — shortened workday, 4 — workday (special regimes). Error codes
+        (100/101/199) come back as a short string and are raised.
+        """
+        import httpx
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            response = await client.get(f"{self.base_url}/api/getdata", params={'year': year, 'cc': 'ru', 'pre': 1})
+            response.raise_for_status()
+            data = response.text.strip()
+
+        if len(data) != _days_in_year(year):
+            raise ValueError(f"isdayoff.ru returned {data[:10]!r} for {year}")
+
+        start = date(year, 1, 1)
+        return {start + timedelta(days=i): flag != '1' for i, flag in enumerate(data)}
+
+
+class StaticCalendarSource:
+    """In-process fake source: explicit days off, everything else follows the weekday rule."""
+
+    name = 'static'
+
+    def __init__(self, days_off=(), workdays=(), fail_years=()):
+        self.days_off = set(days_off)
+        self.workdays = set(workdays)
+        self.fail_years = set(fail_years)
+        self.calls = []
+
+    async def fetch_year(self, year):
+        self.calls.append(year)
+        if year in self.fail_years:
+            raise ConnectionError(f"calendar for {year} unavailable")
+        start = date(year, 1, 1)
+        result = {}
+        for i in range(_days_in_year(year)):
+            day = start + timedelta(days=i)
+            if day in self.days_off:
+                result[day] = False
+            elif day in self.workdays:
+                result[day] = True
+            else:
+                result[day] = day.weekday() not in TIME_CONFIG.WEEKEND_DAYS
+        return result
+
+
+class ProductionCalendar:
+    """Year-bitmap production calendar backed by the `production_calendar` table."""
+
+    def __init__(self, source=None):
+        self.source = source or IsDayOffSource()
+        self._years = {}  # year -> bytearray, index = day of year - 1
+        self._db_loaded = False
+        self._db_load_attempted = False
+        self._lock = asyncio.Lock()
+        # Bumped whenever a year is (re)loaded — lets WorkdayIndex notice changes
+        self.version = 0
+
+    # ---------- lookups ----------
+
+    def _cell(self, day):
+        bits = self._years.get(day.year)
+        if bits is None:
+            return _UNKNOWN
+        return bits[day.timetuple().tm_yday - 1]
+
+    def has_year(self, year):
+        return year in self._years
+
+    def is_workday(self, target_date, holidays=None):
+        """O(1): manual holidays, then the loaded calendar, then the weekday rule."""
+        if isinstance(target_date, datetime):
+            target_date = target_date.date()
+        if holidays and target_date.strftime("%Y-%m-%d") in holidays:
+            return False
+
+        if not self._db_load_attempted:
+            self.load_from_db()
+
+        cell = self._cell(target_date)
+        if cell == _UNKNOWN:
+            # Year not loaded (API down, not yet published) — fall back to the weekday rule
+            return target_date.weekday() not in TIME_CONFIG.WEEKEND_DAYS
+        return cell == _WORKDAY
+
+    def get_next_workday(self, from_date, holidays=None):
+        """First workday strictly after from_date (keeps datetime/date type of the argument)."""
+        candidate = from_date + timedelta(days=1)
+        # A year has no run of days off longer than a few weeks; cap the scan anyway
+        for _ in range(366):
+            if self.is_workday(candidate, holidays):
+                return candidate
+            candidate += timedelta(days=1)
+        return candidate
+
+    # ---------- persistence ----------
+
+    def _set_year(self, year, days):
+        bits = bytearray(_days_in_year(year))
+        for day, is_work in days.items():
+            bits[day.timetuple().tm_yday - 1] = _WORKDAY if is_work else _DAY_OFF
+        # Replace the whole year at once — readers never see a half-filled bitmap
+        self._years[year] = bits
+        self.version += 1
+
+    def load_from_db(self):
+        """Load every persisted year into memory."""
+        from database import db
+        from models import ProductionCalendarDay
+
+        self._db_load_attempted = True
+        years = {}
+        try:
+            with db.get_session() as session:
+                rows = session.query(ProductionCalendarDay.day, ProductionCalendarDay.is_workday).all()
+        except Exception as e:
+            logger.warning(f"Failed to read production calendar from DB: {e}")
+            return
+        for day, is_work in rows:
+            years.setdefault(day.year, {})[day] = is_work
+        for year, days in years.items():
+            self._set_year(year, days)
+        self._db_loaded = True
+        if years:
+            logger.info(f"Production calendar loaded from DB: {sorted(years)}")
+
+    def _save_year(self, year, days):
+        from sqlalchemy import delete, insert
+        from database import db
+        from models import ProductionCalendarDay
+
+        with db.get_session() as session:
+            session.execute(delete(ProductionCalendarDay).where(
+                ProductionCalendarDay.day.between(date(year, 1, 1), date(year, 12, 31))
+            ))
+            session.execute(insert(ProductionCalendarDay), [
+                {'day': day, 'is_workday': is_work, 'source': self.source.name}
+                for day, is_work in sorted(days.items())
+            ])
+            # Other processes reload the calendar from DB once this commits
+            from config_notify import notify_config_changed
+            notify_config_changed('calendar', session=session)
+
+    async def refresh_year(self, year):
+        """Bulk-load one year from the source, persist it and swap it into memory."""
+        days = await self.source.fetch_year(year)
+        await asyncio.to_thread(self._save_year, year, days)
+        self._set_year(year, days)
+        off = sum(1 for is_work in days.values() if not is_work)
+        logger.info(f"Production calendar {year} loaded: {off} days off")
+
+    async def ensure_loaded(self, today=None, force=False):
+        """Make sure the current and next year are available (DB first, then the source).
+
+        The next year is usually published in autumn; until then it stays on
+        the weekday rule and is retried on the next refresh.
+        """
+        today = today or datetime.now(TIME_CONFIG.TIMEZONE).date()
+        async with self._lock:
+            if not self._db_loaded:
+                await asyncio.to_thread(self.load_from_db)
+            for year in (today.year, today.year + 1):
+                if self.has_year(year) and not force:
+                    continue
+                try:
+                    await self.refresh_year(year)
+                except Exception as e:
+                    level = logging.WARNING if year == today.year else logging.INFO
+                    logger.log(level, f"Production calendar {year} not loaded: {e}")
+
+
+production_calendar = ProductionCalendar()
+
+
+class CalendarDay(NamedTuple):
+    """Precomputed facts about one date."""
+    date: date
+    is_workday: bool          # production calendar + manual holidays
+    is_order_day: bool        # workday that is not in TIME_CONFIG.WEEKEND_DAYS
+    next_order_day: date      # first order day strictly after `date`
+    order_deadline: datetime  # tz-aware, TIME_CONFIG.ORDER_DEADLINE on `date`
+    modification_deadline: datetime  # tz-aware, TIME_CONFIG.MODIFICATION_DEADLINE on `date`
+
+
+_NO_HOLIDAYS = {}
+
+
+def _default_holidays():
+    from config import CONFIG
+    # CONFIG is None when config failed to load — fall back to a stable empty mapping
+    return CONFIG.holidays if CONFIG is not None else _NO_HOLIDAYS
+
+
+def _default_holidays_version():
+    from config import CONFIG
+    return CONFIG.section_version('holidays') if CONFIG is not None else 0
+
+
+class WorkdayIndex:
+    """Rolling-year date index rebuilt atomically when its inputs change.
+
+    Inputs are today's date, the holidays section version from CONFIG (or the
+    mapping's contents for a custom provider), the production calendar
+    version and the TIME_CONFIG deadlines/weekend days. Each lookup compares
+    a cheap fingerprint of them; on mismatch a complete new dict is built and
+    swapped in with one assignment, so concurrent readers see either the old
+    or the new index, never a mix.
+    """
+
+    PAST_DAYS = 7
+    FUTURE_DAYS = 366
+
+    def __init__(self, calendar=None, holidays_provider=None, holidays_version=None):
+        self.calendar = calendar or production_calendar
+        if holidays_provider is None:
+            holidays_provider = _default_holidays
+            holidays_version = holidays_version or _default_holidays_version
+        self.holidays_provider = holidays_provider
+        # Without a version source the holidays mapping is fingerprinted by content
+        self.holidays_version = holidays_version
+        self._days = {}
+        self._fingerprint = None
+        self._build_lock = threading.Lock()
+
+    @staticmethod
+    def _time_config_key():
+        return (
+            TIME_CONFIG.ORDER_DEADLINE,
+            TIME_CONFIG.MODIFICATION_DEADLINE,
+            tuple(TIME_CONFIG.WEEKEND_DAYS),
+            str(TIME_CONFIG.TIMEZONE),
+        )
+
+    def _holidays_key(self, holidays):
+        if self.holidays_version is not None:
+            return self.holidays_version()
+        return frozenset(holidays.items())
+
+    def _current_fingerprint(self, today, holidays):
+        return (today, self._holidays_key(holidays), self.calendar.version, self._time_config_key())
+
+    def _deadline(self, day, at):
+        return TIME_CONFIG.TIMEZONE.localize(datetime.combine(day, at))
+
+    def _build(self, today, holidays):
+        start = today - timedelta(days=self.PAST_DAYS)
+        end = today + timedelta(days=self.FUTURE_DAYS)
+
+        # One extra week past the window so the last days still get a next_order_day
+        flags = {}
+        day = start
+        while day <= end + timedelta(days=14):
+            is_work = self.calendar.is_workday(day, holidays)
+            flags[day] = (is_work, is_work and day.weekday() not in TIME_CONFIG.WEEKEND_DAYS)
+            day += timedelta(days=1)
+
+        days = {}
+        next_order_day = end + timedelta(days=15)
+        day = end + timedelta(days=14)
+        while day >= start:
+            is_work, is_order_day = flags[day]
+            if day <= end:
+                days[day] = CalendarDay(
+                    date=day,
+                    is_workday=is_work,
+                    is_order_day=is_order_day,
+                    next_order_day=next_order_day,
+                    order_deadline=self._deadline(day, TIME_CONFIG.ORDER_DEADLINE),
+                    modification_deadline=self._deadline(day, TIME_CONFIG.MODIFICATION_DEADLINE),
+                )
+            if is_order_day:
+                next_order_day = day
+            day -= timedelta(days=1)
+        return days
+
+    def rebuild(self, today=None):
+        """Force a rebuild (e.g. right after holidays were edited)."""
+        self._fingerprint = None
+        self._ensure_fresh(today)
+
+    def _ensure_fresh(self, today=None):
+        today = today or datetime.now(TIME_CONFIG.TIMEZONE).date()
+        holidays = self.holidays_provider()
+        fingerprint = self._current_fingerprint(today, holidays)
+        if fingerprint == self._fingerprint:
+            return
+        with self._build_lock:
+            if fingerprint == self._fingerprint:
+                return
+            days = self._build(today, holidays)
+            # Publish the data before the fingerprint that marks it fresh
+            self._days = days
+            self._fingerprint = fingerprint
+            logger.debug(f"Workday index rebuilt for {today}: {len(days)} days")
+
+    def get(self, target_date):
+        """CalendarDay for target_date (date, datetime or 'YYYY-MM-DD')."""
+        if isinstance(target_date, str):
+            target_date = datetime.strptime(target_date, "%Y-%m-%d").date()
+        elif isinstance(target_date, datetime):
+            target_date = target_date.date()
+
+        self._ensure_fresh()
+        entry = self._days.get(target_date)
+        if entry is None:
+            # Outside the rolling window — compute just this day
+            entry = self._build_single(target_date)
+        return entry
+
+    def _build_single(self, target_date):
+        holidays = self.holidays_provider()
+        is_work = self.calendar.is_workday(target_date, holidays)
+        next_day = target_date + timedelta(days=1)
+        for _ in range(366):
+            if self.calendar.is_workday(next_day, holidays) and next_day.weekday() not in TIME_CONFIG.WEEKEND_DAYS:
+                break
+            next_day += timedelta(days=1)
+        return CalendarDay(
+            date=target_date,
+            is_workday=is_work,
+            is_order_day=is_work and target_date.weekday() not in TIME_CONFIG.WEEKEND_DAYS,
+            next_order_day=next_day,
+            order_deadline=self._deadline(target_date, TIME_CONFIG.ORDER_DEADLINE),
+            modification_deadline=self._deadline(target_date, TIME_CONFIG.MODIFICATION_DEADLINE),
+        )
+
+    def can_modify_order(self, target_date, now=None):
+        """Order for target_date can still be created/changed/cancelled."""
+        try:
+            entry = self.get(target_date)
+        except ValueError:
+            return False
+        now = now or datetime.now(TIME_CONFIG.TIMEZONE)
+        return entry.is_order_day and now < entry.modification_deadline
+
+
+workday_index = WorkdayIndex()
@@ -71,3 +71,42 @@ def get_week_menus(config):
         })
 
     return result
+
+
+def get_week_view(user_db_id, config, session, orders_enabled=None):
+    """
+    Week screen data shared by all bot front-ends: get_week_menus() plus
+    the user's order for each day, loaded with a single range query.
+
+    Each day dict additionally gets:
+        {has_order, quantity, is_for_inspector, can_modify}
+    orders_enabled defaults to config.are_orders_accepted_now().
+    """
+    from services.order_service import get_orders_in_range
+    from services.time_service import can_modify_order
+
+    week = get_week_menus(config)
+    if orders_enabled is None:
+        orders_enabled = config.are_orders_accepted_now()
+
+    orders = {}
+    if user_db_id:
+        orders = get_orders_in_range(
+            user_db_id, week[0]['target_date'], week[-1]['target_date'], session
+        )
+
+    for day in week:
+        order = orders.get(day['target_date'])
+        day['has_order'] = order is not None
+        day['quantity'] = order.quantity if order else 0
+        day['is_for_inspector'] = bool(order and order.is_for_inspector)
+        day['can_modify'] = can_modify_order(day['target_date'], orders_enabled)
+
+    return week
+
+
+async def get_week_view_async(user_db_id, config, session, orders_enabled=None):
+    """get_week_view() for AsyncSession (db.get_async_session())."""
+    return await session.run_sync(
+        lambda s: get_week_view(user_db_id, config, s, orders_enabled=orders_enabled)
+    )
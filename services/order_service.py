@@ -2,9 +2,15 @@
 Order-related business logic: create, cancel, modify, list.
 Messenger-agnostic — used by both Telegram and Max bots.
 """
+import copy
 import logging
+import threading
+import time
 from datetime import datetime, date, timedelta
-from models import Order
+from sqlalchemy import event, func, case, and_, select, update, exists, literal, true
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from models import Order, User
 from time_config import TIME_CONFIG
 
 logger = logging.getLogger(__name__)
@@ -32,10 +38,47 @@ def get_active_orders(user_db_id, from_date, session):
     ).order_by(Order.target_date).all()
 
 
-def create_order(user_db_id, target_date, session, is_preliminary=False):
+def get_orders_in_range(user_db_id, start_date, end_date, session):
+    """
+    Get the user's active orders for a date range in one query.
+    Returns dict {target_date: row} with row.quantity, row.is_for_inspector,
+    row.is_preliminary, row.is_from_bitrix.
+    """
+    rows = session.query(
+        Order.target_date,
+        Order.quantity,
+        Order.is_for_inspector,
+        Order.is_preliminary,
+        Order.is_from_bitrix,
+    ).filter(
+        Order.user_id == user_db_id,
+        Order.is_cancelled == False,
+        Order.target_date >= start_date,
+        Order.target_date <= end_date,
+    ).all()
+    return {row.target_date: row for row in rows}
+
+
+def _active_order_filter(user_db_id, target_date):
+    return and_(
+        Order.user_id == user_db_id,
+        Order.target_date == target_date,
+        Order.is_cancelled == False,
+    )
+
+
+# Bot-created active orders: at most one per (user_id, target_date),
+# enforced by the partial unique index uq_orders_user_date_active.
+_BOT_ACTIVE_WHERE = and_(Order.is_cancelled == False, Order.is_from_bitrix == False)
+
+
+def create_order(user_db_id, target_date, session, is_preliminary=False, is_for_inspector=False):
     """
     Create a new order. Does NOT commit.
 
+    Single statement: INSERT ... SELECT ... WHERE NOT EXISTS ... ON CONFLICT DO NOTHING,
+    so concurrent double-taps cannot create duplicates.
+
     Returns (order, error_message). If error, order is None.
     """
     now = datetime.now(TIME_CONFIG.TIMEZONE)
@@ -44,109 +87,300 @@ def create_order(user_db_id, target_date, session, is_preliminary=False):
     if target_date.weekday() in TIME_CONFIG.WEEKEND_DAYS:
         return None, "Заказы на выходные не принимаются"
 
-    # Check existing order
-    existing = get_order_for_date(user_db_id, target_date, session)
-    if existing:
-        return None, f"У вас уже заказано {existing.quantity} порций"
-
     quantity = 1
-    order = Order(
-        user_id=user_db_id,
-        target_date=target_date,
-        order_time=now.strftime("%H:%M:%S"),
-        quantity=quantity,
-        bitrix_quantity_id=QUANTITY_MAP[quantity],
-        is_active=True,
-        is_preliminary=is_preliminary,
-        created_at=now.replace(tzinfo=None),
+    values = {
+        'user_id': user_db_id,
+        'target_date': target_date,
+        'order_time': now.strftime("%H:%M:%S"),
+        'quantity': quantity,
+        'bitrix_quantity_id': QUANTITY_MAP[quantity],
+        'is_active': True,
+        'is_cancelled': False,
+        'is_from_bitrix': False,
+        'is_sent_to_bitrix': False,
+        'is_preliminary': is_preliminary,
+        'is_for_inspector': is_for_inspector,
+        'created_at': now.replace(tzinfo=None),
+    }
+    source = select(*[literal(v, type_=Order.__table__.c[k].type) for k, v in values.items()]).where(
+        ~exists().where(_active_order_filter(user_db_id, target_date))
     )
-    session.add(order)
+    stmt = pg_insert(Order).from_select(list(values), source).on_conflict_do_nothing(
+        index_elements=[Order.user_id, Order.target_date],
+        index_where=_BOT_ACTIVE_WHERE,
+    ).returning(Order)
+
+    order = session.scalars(stmt).first()
+    if order is None:
+        # Lost to an existing (or concurrently inserted) order
+        existing = get_order_for_date(user_db_id, target_date, session)
+        quantity = existing.quantity if existing else 1
+        return None, f"У вас уже заказано {quantity} порций"
+
+    invalidate_user_stats(user_db_id, session)
     return order, None
 
 
-def cancel_order(user_db_id, target_date, session):
+def cancel_order(user_db_id, target_date, session, allow_bitrix=False):
     """
     Cancel an order. Does NOT commit.
 
+    Single statement: UPDATE ... RETURNING. Orders from Bitrix are not touched
+    unless allow_bitrix (the Telegram bot lets users cancel them).
+
     Returns (order, error_message). If error, order is None.
     """
     now = datetime.now(TIME_CONFIG.TIMEZONE)
 
-    order = get_order_for_date(user_db_id, target_date, session)
-    if not order:
-        return None, "Заказ не найден"
+    stmt = update(Order).where(
+        _active_order_filter(user_db_id, target_date),
+        true() if allow_bitrix else Order.is_from_bitrix.isnot(True),
+    ).values(
+        is_cancelled=True,
+        order_time=now.strftime("%H:%M:%S"),
+    ).returning(Order)
 
-    if order.is_from_bitrix == 1:
-        return None, "Заказ создан в Битрикс, отмена невозможна"
+    order = session.scalars(stmt, execution_options={"populate_existing": True}).first()
+    if order is None:
+        if get_order_for_date(user_db_id, target_date, session):
+            return None, "Заказ создан в Битрикс, отмена невозможна"
+        return None, "Заказ не найден"
 
-    order.is_cancelled = True
-    order.order_time = now.strftime("%H:%M:%S")
+    invalidate_user_stats(user_db_id, session)
     return order, None
 
 
-def modify_quantity(user_db_id, target_date, delta, session):
+def modify_quantity(user_db_id, target_date, delta, session, allow_bitrix=False):
     """
     Change order quantity by delta (+1 or -1).
     Does NOT commit.
 
+    Single statement: UPDATE ... SET quantity = quantity + delta ... RETURNING,
+    guarded by the 1..MAX_PORTIONS range in the WHERE clause.
+    Orders from Bitrix are only changed with allow_bitrix.
+
     Returns (new_quantity, order, error_message).
     If quantity would go below 1, returns (0, order, None) — caller should cancel.
     """
+    new_qty_expr = Order.quantity + delta
+    stmt = update(Order).where(
+        _active_order_filter(user_db_id, target_date),
+        true() if allow_bitrix else Order.is_from_bitrix.isnot(True),
+        new_qty_expr >= 1,
+        new_qty_expr <= TIME_CONFIG.MAX_PORTIONS,
+    ).values(
+        quantity=new_qty_expr,
+        bitrix_quantity_id=case(
+            *[(new_qty_expr == qty, qty_id) for qty, qty_id in QUANTITY_MAP.items()],
+            else_='821',
+        ),
+        updated_at=datetime.now(),
+    ).returning(Order)
+
+    order = session.scalars(stmt, execution_options={"populate_existing": True}).first()
+    if order is not None:
+        invalidate_user_stats(user_db_id, session)
+        return order.quantity, order, None
+
+    # Nothing updated — find out why
     order = get_order_for_date(user_db_id, target_date, session)
     if not order:
         return None, None, "Заказ не найден"
 
-    if order.is_from_bitrix == 1:
+    if order.is_from_bitrix == 1 and not allow_bitrix:
         return None, None, "Заказ создан в Битрикс, изменение невозможно"
 
-    new_qty = order.quantity + delta
-
-    if new_qty < 1:
+    if order.quantity + delta < 1:
+        invalidate_user_stats(user_db_id, session)
         return 0, order, None  # Signal to cancel
 
-    if new_qty > TIME_CONFIG.MAX_PORTIONS:
-        return None, None, f"Максимум {TIME_CONFIG.MAX_PORTIONS} порций"
+    return None, None, f"Максимум {TIME_CONFIG.MAX_PORTIONS} порций"
+
+
+# Short-lived per-user stats cache.
+# Key: (user_db_id, start_date, end_date, today, by_week, by_location) -> (expires_at, stats)
+STATS_CACHE_TTL = 30  # seconds
+STATS_CACHE_MAX = 1024  # entries; expired ones are pruned first, then the oldest
+_stats_cache = {}
+_stats_lock = threading.Lock()
 
-    order.quantity = new_qty
-    order.bitrix_quantity_id = QUANTITY_MAP.get(new_qty, '821')
-    order.updated_at = datetime.now()
-    return new_qty, order, None
 
+def _drop_user_stats(user_ids):
+    with _stats_lock:
+        for key in [k for k in _stats_cache if k[0] in user_ids]:
+            del _stats_cache[key]
 
-def get_user_monthly_stats(user_db_id, start_date, end_date, session):
+
+def _store_user_stats(cache_key, stats):
+    now = time.monotonic()
+    with _stats_lock:
+        if len(_stats_cache) >= STATS_CACHE_MAX:
+            for key in [k for k, (expires_at, _) in _stats_cache.items() if expires_at <= now]:
+                del _stats_cache[key]
+            # Still full: evict in insertion order (oldest first)
+            for key in list(_stats_cache)[:len(_stats_cache) - STATS_CACHE_MAX + 1]:
+                del _stats_cache[key]
+        _stats_cache[cache_key] = (now + STATS_CACHE_TTL, stats)
+
+
+def invalidate_user_stats(user_db_id, session=None):
     """
-    Get user's order statistics for a period.
-    Returns dict with counts.
+    Drop cached stats for a user. Called after every order mutation.
+
+    Mutations do not commit, so a concurrent reader could re-cache the
+    pre-commit numbers in between. With session, the user's entries are
+    dropped again when that transaction commits or rolls back.
     """
-    from sqlalchemy import func
+    _drop_user_stats({user_db_id})
+    if session is not None:
+        session.info.setdefault('stats_invalidate', set()).add(user_db_id)
 
-    now = datetime.now(TIME_CONFIG.TIMEZONE).date()
 
-    total = session.query(func.sum(Order.quantity)).filter(
-        Order.user_id == user_db_id,
-        Order.is_cancelled == False,
-        Order.target_date >= start_date,
-        Order.target_date <= end_date
-    ).scalar() or 0
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def _invalidate_on_transaction_end(session):
+    pending = session.info.pop('stats_invalidate', None)
+    if pending:
+        _drop_user_stats(pending)
 
-    completed = session.query(func.sum(Order.quantity)).filter(
-        Order.user_id == user_db_id,
-        Order.is_cancelled == False,
-        Order.target_date >= start_date,
-        Order.target_date <= end_date,
-        Order.target_date < now
-    ).scalar() or 0
 
-    upcoming = session.query(func.sum(Order.quantity)).filter(
+def get_user_monthly_stats(user_db_id, start_date, end_date, session,
+                           by_week=False, by_location=False, use_cache=True):
+    """
+    Get user's order statistics for a period in a single query.
+
+    Returns dict with portion counts:
+        total      — all active orders in the period
+        completed  — active orders before today
+        today      — active orders for today
+        upcoming   — active orders from today onwards
+        cancelled  — cancelled orders
+        future_orders   — number of active orders after today
+        next_order_date — nearest active order date after today (or None)
+    Optional breakdowns (same bucket keys per entry):
+        by_week=True     -> stats['weeks']: {(iso_year, iso_week): {...}}
+        by_location=True -> stats['locations']: {location: {...}}
+    """
+    today = datetime.now(TIME_CONFIG.TIMEZONE).date()
+    cache_key = (user_db_id, start_date, end_date, today, by_week, by_location)
+
+    if use_cache:
+        cached = _stats_cache.get(cache_key)
+        if cached and cached[0] > time.monotonic():
+            # Callers may modify the result — never hand out the cached object
+            return copy.deepcopy(cached[1])
+
+    active = Order.is_cancelled == False
+    qty = Order.quantity
+
+    def _bucket(condition, value=qty):
+        return func.coalesce(func.sum(case((condition, value), else_=0)), 0)
+
+    group_cols = []
+    if by_week:
+        group_cols.append(Order.target_date)
+    if by_location:
+        group_cols.append(User.location)
+
+    query = session.query(
+        *group_cols,
+        _bucket(active).label('total'),
+        _bucket(and_(active, Order.target_date < today)).label('completed'),
+        _bucket(and_(active, Order.target_date == today)).label('today'),
+        _bucket(and_(active, Order.target_date >= today)).label('upcoming'),
+        _bucket(Order.is_cancelled == True).label('cancelled'),
+        _bucket(and_(active, Order.target_date > today), 1).label('future_orders'),
+        func.min(case((and_(active, Order.target_date > today), Order.target_date))).label('next_order_date'),
+    )
+    if by_location:
+        query = query.join(User, User.id == Order.user_id)
+    query = query.filter(
         Order.user_id == user_db_id,
-        Order.is_cancelled == False,
         Order.target_date >= start_date,
         Order.target_date <= end_date,
-        Order.target_date >= now
-    ).scalar() or 0
-
+    )
+    if group_cols:
+        query = query.group_by(*group_cols)
+
+    stats = _empty_stats()
+    weeks = {}
+    locations = {}
+    for row in query.all():
+        _add_stats(stats, row)
+        if by_week:
+            iso = row.target_date.isocalendar()
+            _add_stats(weeks.setdefault((iso[0], iso[1]), _empty_stats()), row)
+        if by_location:
+            _add_stats(locations.setdefault(row.location or "Не указана", _empty_stats()), row)
+
+    if by_week:
+        stats['weeks'] = weeks
+    if by_location:
+        stats['locations'] = locations
+
+    if use_cache:
+        _store_user_stats(cache_key, copy.deepcopy(stats))
+    return stats
+
+
+def _empty_stats():
     return {
-        'total': total,
-        'completed': completed,
-        'upcoming': upcoming,
+        'total': 0,
+        'completed': 0,
+        'today': 0,
+        'upcoming': 0,
+        'cancelled': 0,
+        'future_orders': 0,
+        'next_order_date': None,
     }
+
+
+def _add_stats(acc, row):
+    """Accumulate one aggregated row into a stats dict."""
+    for key in ('total', 'completed', 'today', 'upcoming', 'cancelled', 'future_orders'):
+        acc[key] += int(getattr(row, key) or 0)
+    if row.next_order_date and (acc['next_order_date'] is None or row.next_order_date < acc['next_order_date']):
+        acc['next_order_date'] = row.next_order_date
+
+
+# ------------------------------------------------------------------
+# Async variants for AsyncSession (db.get_async_session()).
+# The same statements run through AsyncSession.run_sync(), so IO goes
+# through asyncpg without blocking the event loop.
+# ------------------------------------------------------------------
+
+async def get_order_for_date_async(user_db_id, target_date, session):
+    return await session.run_sync(lambda s: get_order_for_date(user_db_id, target_date, s))
+
+
+async def get_active_orders_async(user_db_id, from_date, session):
+    return await session.run_sync(lambda s: get_active_orders(user_db_id, from_date, s))
+
+
+async def get_orders_in_range_async(user_db_id, start_date, end_date, session):
+    return await session.run_sync(lambda s: get_orders_in_range(user_db_id, start_date, end_date, s))
+
+
+async def create_order_async(user_db_id, target_date, session, is_preliminary=False, is_for_inspector=False):
+    return await session.run_sync(
+        lambda s: create_order(user_db_id, target_date, s,
+                               is_preliminary=is_preliminary, is_for_inspector=is_for_inspector)
+    )
+
+
+async def cancel_order_async(user_db_id, target_date, session, allow_bitrix=False):
+    return await session.run_sync(lambda s: cancel_order(user_db_id, target_date, s, allow_bitrix=allow_bitrix))
+
+
+async def modify_quantity_async(user_db_id, target_date, delta, session, allow_bitrix=False):
+    return await session.run_sync(
+        lambda s: modify_quantity(user_db_id, target_date, delta, s, allow_bitrix=allow_bitrix)
+    )
+
+
+async def get_user_monthly_stats_async(user_db_id, start_date, end_date, session,
+                                       by_week=False, by_location=False, use_cache=True):
+    return await session.run_sync(
+        lambda s: get_user_monthly_stats(user_db_id, start_date, end_date, s,
+                                         by_week=by_week, by_location=by_location, use_cache=use_cache)
+    )
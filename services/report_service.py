@@ -7,10 +7,9 @@ import logging
 from datetime import datetime, date
 from typing import Optional
 
-import openpyxl
-from openpyxl.styles import Font
 from sqlalchemy import text
 
+import metrics
 from config import CONFIG
 from database import db
 from report_utils import ensure_reports_dir
@@ -24,6 +23,7 @@ MONTH_NAMES = {
 }
 
 
+@metrics.track_report('provider_text')
 def generate_provider_report_text(start_date, end_date, session):
     """
     Generate provider text report (location-based order summary).
@@ -74,6 +74,7 @@ def generate_provider_report_text(start_date, end_date, session):
     return "\n".join(lines), total_portions
 
 
+@metrics.track_report('accounting_file')
 def generate_accounting_report_file(start_date, end_date, session):
     """
     Generate accounting Excel report (salary deductions).
@@ -101,6 +102,7 @@ def generate_accounting_report_file(start_date, end_date, session):
     report_year = start_date.year
     month_year = f"{MONTH_NAMES[report_month]} {report_year}"
 
+    import openpyxl  # deferred: only report generation needs it
     wb = openpyxl.Workbook()
     ws = wb.active
     ws.title = "Удержания за обеды"
@@ -230,6 +232,7 @@ def generate_accounting_report_file(start_date, end_date, session):
     return file_path, file_name, caption
 
 
+@metrics.track_report('admin_file')
 def generate_admin_report_file(start_date, end_date, session, is_daily=False):
     """
     Generate admin Excel report (orders by location).
@@ -277,6 +280,8 @@ def generate_admin_report_file(start_date, end_date, session, is_daily=False):
                        else f"{start_date.strftime('%d.%m.%Y')} - {end_date.strftime('%d.%m.%Y')}")
         return None, None, f"📊 На период {period_desc} заказов нет"
 
+    import openpyxl
+    from openpyxl.styles import Font
     wb = openpyxl.Workbook()
     if 'Sheet' in wb.sheetnames:
         del wb['Sheet']
@@ -385,6 +390,7 @@ def _format_hire_date(hire_date):
 
 def _apply_accounting_styles(ws):
     """Apply formatting to accounting report worksheet."""
+    from openpyxl.styles import Font
     bold_font = Font(bold=True)
     money_format = '# ##0.00'
 
@@ -1,22 +1,22 @@
 """
 Time-related business logic: order deadlines, workday calculations.
 Messenger-agnostic — used by both Telegram and Max bots.
+
+Per-date answers come from the precomputed WorkdayIndex, which already
+accounts for weekends, manual holidays and the production calendar.
 """
 from datetime import datetime, date, timedelta
 from time_config import TIME_CONFIG
+from services.calendar_service import workday_index
 
 
 def get_next_workday(from_date=None):
-    """Returns the next working day after from_date."""
+    """Returns the next working (order) day after from_date, same type as from_date."""
     if from_date is None:
         from_date = datetime.now(TIME_CONFIG.TIMEZONE)
 
-    days_to_add = 1
-    if from_date.weekday() == 4:  # Friday -> Monday
-        days_to_add = 3
-    elif from_date.weekday() == 5:  # Saturday -> Monday
-        days_to_add = 2
-
+    day = from_date.date() if isinstance(from_date, datetime) else from_date
+    days_to_add = (workday_index.get(day).next_order_day - day).days
     return from_date + timedelta(days=days_to_add)
 
 
@@ -27,11 +27,17 @@ def is_weekend(target_date):
     return target_date.weekday() in TIME_CONFIG.WEEKEND_DAYS
 
 
-def is_holiday(target_date, holidays):
-    """Check if target_date is a holiday."""
+def is_holiday(target_date, holidays=None):
+    """Check if target_date is a holiday.
+
+    With an explicit holidays mapping only that mapping is consulted;
+    otherwise the workday index (manual holidays + production calendar) is used.
+    """
     if isinstance(target_date, datetime):
         target_date = target_date.date()
-    return target_date.strftime("%Y-%m-%d") in holidays
+    if holidays is not None:
+        return target_date.strftime("%Y-%m-%d") in holidays
+    return not workday_index.get(target_date).is_workday and not is_weekend(target_date)
 
 
 def can_modify_order(target_date, orders_enabled=True):
@@ -49,29 +55,6 @@ def can_modify_order(target_date, orders_enabled=True):
     if not orders_enabled:
         return False
 
-    now = datetime.now(TIME_CONFIG.TIMEZONE)
-
-    # Parse string dates
-    if isinstance(target_date, str):
-        try:
-            target_date = datetime.strptime(target_date, "%Y-%m-%d").date()
-        except ValueError:
-            return False
-
-    if isinstance(target_date, datetime):
-        target_date = target_date.date()
-
-    # No orders on weekends
-    if target_date.weekday() in TIME_CONFIG.WEEKEND_DAYS:
-        return False
-
-    # Future dates (pre-orders) — always allowed
-    if target_date > now.date():
-        return True
-
-    # Today — only before MODIFICATION_DEADLINE
-    if target_date == now.date():
-        return now.time() < TIME_CONFIG.MODIFICATION_DEADLINE
-
-    # Past dates — never
-    return False
+    # Order day (not a weekend/holiday) and before its modification deadline;
+    # future dates pass the deadline check trivially, past dates never do
+    return workday_index.can_modify_order(target_date)
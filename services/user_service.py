@@ -153,54 +153,95 @@ def set_user_location(user, location):
     user.is_verified = True
 
 
+def _get_config_role(messenger_id, messenger_type, config):
+    """Role from config ID lists (no DB). Returns role or None."""
+    if messenger_type == MESSENGER_TELEGRAM:
+        if messenger_id in config.admin_ids:
+            return 'admin'
+        if messenger_id in config.provider_ids:
+            return 'provider'
+        if messenger_id in config.accounting_ids:
+            return 'accountant'
+    elif messenger_type == MESSENGER_MAX:
+        if messenger_id in getattr(config, 'max_admin_ids', []):
+            return 'admin'
+        if messenger_id in getattr(config, 'max_provider_ids', []):
+            return 'provider'
+        if messenger_id in getattr(config, 'max_accounting_ids', []):
+            return 'accountant'
+    elif messenger_type == MESSENGER_VK:
+        if messenger_id in getattr(config, 'vk_admin_ids', []):
+            return 'admin'
+        if messenger_id in getattr(config, 'vk_provider_ids', []):
+            return 'provider'
+        if messenger_id in getattr(config, 'vk_accounting_ids', []):
+            return 'accountant'
+    elif messenger_type == MESSENGER_BITRIX24:
+        if messenger_id in getattr(config, 'b24_admin_ids', []):
+            return 'admin'
+        if messenger_id in getattr(config, 'b24_provider_ids', []):
+            return 'provider'
+        if messenger_id in getattr(config, 'b24_accounting_ids', []):
+            return 'accountant'
+    return None
+
+
+def _is_active_employee(messenger_id, messenger_type, session):
+    """Check that the messenger ID belongs to a non-deleted employee."""
+    col = _get_messenger_column(messenger_type)
+    return session.query(User.id).filter(
+        col == messenger_id,
+        User.is_employee == True,
+        User.is_deleted == False
+    ).first() is not None
+
+
 def get_user_role(messenger_id, messenger_type, config):
     """
     Determine user role by messenger ID and config lists.
     Returns 'admin', 'provider', 'accountant', 'employee', or None.
     """
     try:
-        if messenger_type == MESSENGER_TELEGRAM:
-            if messenger_id in config.admin_ids:
-                return 'admin'
-            if messenger_id in config.provider_ids:
-                return 'provider'
-            if messenger_id in config.accounting_ids:
-                return 'accountant'
-        elif messenger_type == MESSENGER_MAX:
-            if messenger_id in getattr(config, 'max_admin_ids', []):
-                return 'admin'
-            if messenger_id in getattr(config, 'max_provider_ids', []):
-                return 'provider'
-            if messenger_id in getattr(config, 'max_accounting_ids', []):
-                return 'accountant'
-        elif messenger_type == MESSENGER_VK:
-            if messenger_id in getattr(config, 'vk_admin_ids', []):
-                return 'admin'
-            if messenger_id in getattr(config, 'vk_provider_ids', []):
-                return 'provider'
-            if messenger_id in getattr(config, 'vk_accounting_ids', []):
-                return 'accountant'
-        elif messenger_type == MESSENGER_BITRIX24:
-            if messenger_id in getattr(config, 'b24_admin_ids', []):
-                return 'admin'
-            if messenger_id in getattr(config, 'b24_provider_ids', []):
-                return 'provider'
-            if messenger_id in getattr(config, 'b24_accounting_ids', []):
-                return 'accountant'
+        role = _get_config_role(messenger_id, messenger_type, config)
+        if role:
+            return role
 
         # Check DB for employee status
         from database import db
-        col = _get_messenger_column(messenger_type)
-        user = db.session.query(User).filter(
-            col == messenger_id,
-            User.is_employee == True,
-            User.is_deleted == False
-        ).first()
-
-        if user:
+        if _is_active_employee(messenger_id, messenger_type, db.session):
             return 'employee'
 
         return None
     except Exception as e:
         logger.error(f"Error determining role for {messenger_type}:{messenger_id}: {e}")
         return None
+
+
+# ------------------------------------------------------------------
+# Async variants for AsyncSession (db.get_async_session()).
+# ------------------------------------------------------------------
+
+async def get_user_by_messenger_async(messenger_id, messenger_type, session):
+    return await session.run_sync(lambda s: get_user_by_messenger(messenger_id, messenger_type, s))
+
+
+async def get_verified_user_async(messenger_id, messenger_type, session):
+    return await session.run_sync(lambda s: get_verified_user(messenger_id, messenger_type, s))
+
+
+async def get_user_role_async(messenger_id, messenger_type, config):
+    """get_user_role() without blocking the event loop on the DB check."""
+    try:
+        role = _get_config_role(messenger_id, messenger_type, config)
+        if role:
+            return role
+
+        from database import db
+        async with db.get_async_session() as session:
+            is_employee = await session.run_sync(
+                lambda s: _is_active_employee(messenger_id, messenger_type, s)
+            )
+        return 'employee' if is_employee else None
+    except Exception as e:
+        logger.error(f"Error determining role for {messenger_type}:{messenger_id}: {e}")
+        return None
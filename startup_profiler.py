@@ -0,0 +1,158 @@
+"""
+Профилировщик старта процессов бота (--profile-startup).
+
+Включается флагом командной строки --profile-startup или переменной
+окружения PROFILE_STARTUP=1 и должен быть включён до остальных импортов:
+
+    import startup_profiler
+    startup_profiler.enable_from_argv('telegram')
+
+Что записывается:
+- время импорта каждого модуля (собственное и вместе с вложенными импортами);
+- длительность этапов инициализации (startup_profiler.checkpoint('...'));
+- время от старта процесса до первого обработанного апдейта.
+
+При первом апдейте отчёт выводится в лог, а JSON сохраняется в
+data/logs/startup_profile_<процесс>.json — его удобно сравнивать между коммитами.
+Без флага все функции модуля ничего не делают.
+"""
+import os
+import sys
+import json
+import time
+import builtins
+import logging
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+FLAG = '--profile-startup'
+REPORT_DIR = Path('data') / 'logs'
+TOP_MODULES = 25
+
+_enabled = False
+_process_name = 'bot'
+_started = None
+_original_import = None
+_local = threading.local()
+_imports = {}   # модуль -> [собственное время, общее время]
+_phases = []    # (этап, начало от старта, длительность)
+_last_checkpoint = 0.0
+_first_update = None
+_reported = False
+
+
+def _profiled_import(name, globals=None, locals=None, fromlist=(), level=0):
+    # Уже загруженные модули не интересны — меряем только первый импорт
+    if level or name in sys.modules:
+        return _original_import(name, globals, locals, fromlist, level)
+
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    stack.append(0.0)
+    started = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        elapsed = time.perf_counter() - started
+        nested = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        stats = _imports.setdefault(name, [0.0, 0.0])
+        stats[0] += elapsed - nested
+        stats[1] += elapsed
+
+
+def enable(process_name='bot'):
+    """Включает профилирование: перехватывает импорты и запоминает время старта"""
+    global _enabled, _process_name, _started, _original_import
+    if _enabled:
+        return
+    _enabled = True
+    _process_name = process_name
+    _started = time.perf_counter()
+    _original_import = builtins.__import__
+    builtins.__import__ = _profiled_import
+
+
+def enable_from_argv(process_name='bot'):
+    """Включает профилирование по --profile-startup (флаг убирается из argv) или PROFILE_STARTUP=1"""
+    requested = os.getenv('PROFILE_STARTUP', '').lower() in ('1', 'true', 'yes')
+    if FLAG in sys.argv:
+        sys.argv.remove(FLAG)
+        requested = True
+    if requested:
+        enable(process_name)
+    return requested
+
+
+def is_enabled():
+    return _enabled
+
+
+def checkpoint(name):
+    """Отмечает конец этапа инициализации: этап длится от предыдущей отметки до этой"""
+    global _last_checkpoint
+    if not _enabled:
+        return
+    now = time.perf_counter() - _started
+    _phases.append((name, _last_checkpoint, now - _last_checkpoint))
+    _last_checkpoint = now
+
+
+def mark_first_update():
+    """Вызывается при каждом апдейте; срабатывает один раз — на первом"""
+    global _first_update
+    if not _enabled or _first_update is not None:
+        return
+    _first_update = time.perf_counter() - _started
+    report()
+
+
+def _build_report():
+    modules = sorted(_imports.items(), key=lambda item: item[1][1], reverse=True)
+    return {
+        'process': _process_name,
+        'first_update_sec': round(_first_update, 3) if _first_update is not None else None,
+        'total_import_sec': round(sum(stats[0] for stats in _imports.values()), 3),
+        'phases': [
+            {'name': name, 'start_sec': round(start, 3), 'duration_sec': round(duration, 3)}
+            for name, start, duration in _phases
+        ],
+        'modules': [
+            {'module': name, 'self_ms': round(stats[0] * 1000, 1), 'cumulative_ms': round(stats[1] * 1000, 1)}
+            for name, stats in modules
+        ],
+    }
+
+
+def report():
+    """Пишет отчёт в лог и в JSON, отключает перехват импортов"""
+    global _reported
+    if not _enabled or _reported:
+        return None
+    _reported = True
+    builtins.__import__ = _original_import
+
+    data = _build_report()
+    lines = [f"⏱️ Профиль старта ({_process_name}):"]
+    if data['first_update_sec'] is not None:
+        lines.append(f"   до первого апдейта: {data['first_update_sec']:.2f} с")
+    lines.append(f"   импорты (собственное время): {data['total_import_sec']:.2f} с")
+    for item in data['phases']:
+        lines.append(f"   этап {item['name']}: {item['duration_sec']:.3f} с (с {item['start_sec']:.2f} с)")
+    lines.append(f"   топ-{TOP_MODULES} модулей по времени импорта (вместе с вложенными):")
+    for item in data['modules'][:TOP_MODULES]:
+        lines.append(f"      {item['cumulative_ms']:8.1f} мс  (своё {item['self_ms']:7.1f})  {item['module']}")
+    logger.info("\n".join(lines))
+
+    try:
+        REPORT_DIR.mkdir(parents=True, exist_ok=True)
+        path = REPORT_DIR / f"startup_profile_{_process_name}.json"
+        path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding='utf-8')
+        logger.info(f"⏱️ Профиль старта сохранён: {path}")
+    except OSError as e:
+        logger.warning(f"⚠️ Не удалось сохранить профиль старта: {e}")
+    return data
@@ -0,0 +1,213 @@
+"""
+Приём апдейтов Telegram через webhook вместо long polling.
+
+Включается переменной TELEGRAM_WEBHOOK_URL — публичный HTTPS-адрес, на который
+Telegram будет слать апдейты (обычно балансировщик перед репликами бота):
+
+    TELEGRAM_WEBHOOK_URL=https://bot.example.com/telegram/webhook
+    TELEGRAM_WEBHOOK_SECRET=<1-256 символов A-Z a-z 0-9 _ ->   (обязательно)
+    TELEGRAM_WEBHOOK_PORT=8443          порт локального сервера
+    TELEGRAM_WEBHOOK_HOST=0.0.0.0
+    TELEGRAM_WEBHOOK_PATH=/telegram/webhook   (по умолчанию — путь из URL)
+    TELEGRAM_WEBHOOK_QUEUE_MAX=1000     выше — 503, Telegram повторит позже
+    TELEGRAM_WEBHOOK_WITH_B24=1         тот же сервер обслуживает и Bitrix24-бота
+
+Сервер — FastAPI/uvicorn внутри event loop бота. Обработчик проверяет заголовок
+X-Telegram-Bot-Api-Secret-Token, разбирает Update и кладёт его во внутреннюю
+очередь Application.update_queue, сразу отвечая 200: обработка идёт тем же
+путём, что и при polling (process_update, сессия БД на апдейт, метрики).
+
+Несколько реплик за балансировщиком:
+- планировщик (напоминания, отчёты, бекап, синхронизация и отправка заказов
+  в Bitrix24) должен работать ровно на одной — остальным TELEGRAM_SCHEDULER=0,
+  иначе напоминания и push заказов уйдут по разу с каждой реплики;
+- порядок апдейтов одного пользователя (update_ordering.py) гарантируется
+  только внутри реплики: балансировщик может развести соседние апдейты по
+  разным процессам. Если порядок важен — одна реплика или липкая маршрутизация.
+
+Локальная проверка без Telegram — fake_telegram_poster.py.
+"""
+import os
+import re
+import json
+import asyncio
+import logging
+import secrets
+import contextlib
+from urllib.parse import urlparse
+
+import uvicorn
+from fastapi import APIRouter, FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+DEFAULT_PATH = '/telegram/webhook'
+_SECRET_RE = re.compile(r'^[A-Za-z0-9_-]{1,256}$')
+
+
+class WebhookSettings:
+    """Настройки webhook из окружения; enabled == False — работаем через polling"""
+
+    def __init__(self, url: str = '', secret: str = '', host: str = '0.0.0.0', port: int = 8443,
+                 path: str = None, queue_max: int = 1000, with_bitrix24: bool = False):
+        self.url = url
+        self.secret = secret
+        self.host = host
+        self.port = port
+        self.path = path or urlparse(url).path or DEFAULT_PATH
+        self.queue_max = queue_max
+        self.with_bitrix24 = with_bitrix24
+
+    @classmethod
+    def from_env(cls) -> "WebhookSettings":
+        return cls(
+            url=os.getenv('TELEGRAM_WEBHOOK_URL', ''),
+            secret=os.getenv('TELEGRAM_WEBHOOK_SECRET', ''),
+            host=os.getenv('TELEGRAM_WEBHOOK_HOST', '0.0.0.0'),
+            port=int(os.getenv('TELEGRAM_WEBHOOK_PORT', '8443')),
+            path=os.getenv('TELEGRAM_WEBHOOK_PATH') or None,
+            queue_max=int(os.getenv('TELEGRAM_WEBHOOK_QUEUE_MAX', '1000')),
+            with_bitrix24=os.getenv('TELEGRAM_WEBHOOK_WITH_B24', '').lower() in ('1', 'true', 'yes'),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.url)
+
+    def validate(self):
+        if not self.url.startswith('https://'):
+            raise ValueError("TELEGRAM_WEBHOOK_URL должен быть https://")
+        if not _SECRET_RE.match(self.secret):
+            raise ValueError("TELEGRAM_WEBHOOK_SECRET обязателен: 1-256 символов A-Z, a-z, 0-9, _ и -")
+
+
+class _EmbeddedServer(uvicorn.Server):
+    """uvicorn внутри event loop бота: сигналы остаются за main.py"""
+
+    @contextlib.contextmanager
+    def capture_signals(self):
+        yield
+
+    def install_signal_handlers(self):
+        pass
+
+
+class TelegramWebhook:
+    """Принимает апдейты по HTTP и кладёт их в application.update_queue"""
+
+    def __init__(self, application, settings: WebhookSettings):
+        self.application = application
+        self.settings = settings
+        self._secret = settings.secret.encode()
+        self._server = None
+        self._task = None
+        self._overflow = False
+        self._queue_depth = metrics.UPDATE_QUEUE_DEPTH.labels('telegram')
+
+    def _count(self, result: str):
+        metrics.WEBHOOK_UPDATES.labels('telegram', result).inc()
+
+    async def handle(self, request: Request):
+        received = request.headers.get(SECRET_HEADER, '').encode()
+        if not secrets.compare_digest(self._secret, received):
+            self._count('forbidden')
+            client = request.client.host if request.client else '?'
+            logger.warning(f"⛔ Webhook Telegram: неверный секрет, IP={client}")
+            return JSONResponse(status_code=403, content={'error': 'Forbidden'})
+
+        queue = self.application.update_queue
+        self._queue_depth.set(queue.qsize())
+        if queue.qsize() >= self.settings.queue_max:
+            # Telegram повторит доставку сам — не раздуваем очередь
+            self._count('queue_full')
+            if not self._overflow:
+                self._overflow = True
+                logger.warning(f"⚠️ Webhook Telegram: очередь переполнена ({queue.qsize()}), отвечаем 503")
+            return JSONResponse(status_code=503, content={'error': 'Queue is full'})
+        if self._overflow:
+            self._overflow = False
+            logger.info(f"✅ Webhook Telegram: очередь разгрузилась ({queue.qsize()})")
+
+        try:
+            from telegram import Update
+            data = json.loads(await request.body())
+            update = Update.de_json(data, self.application.bot)
+        except Exception as e:
+            self._count('bad_request')
+            logger.warning(f"⚠️ Webhook Telegram: не удалось разобрать апдейт: {e}")
+            return JSONResponse(status_code=400, content={'error': 'Bad update'})
+        if update is None:
+            self._count('bad_request')
+            return JSONResponse(status_code=400, content={'error': 'Bad update'})
+
+        await queue.put(update)
+        self._queue_depth.set(queue.qsize())
+        self._count('accepted')
+        return Response(status_code=200)
+
+    def router(self) -> APIRouter:
+        router = APIRouter()
+        router.add_api_route(self.settings.path, self.handle, methods=['POST'], include_in_schema=False)
+        return router
+
+    def create_app(self) -> FastAPI:
+        app = FastAPI(title='Telegram webhook', docs_url=None, redoc_url=None, openapi_url=None)
+        app.include_router(self.router())
+
+        @app.get('/health')
+        async def health():
+            import health as health_checks
+            report = await asyncio.to_thread(health_checks.collect, 'telegram')
+            return JSONResponse(content=report, status_code=health_checks.http_status(report))
+
+        if self.settings.with_bitrix24:
+            # Один порт на оба бота: всё, кроме webhook Telegram и /health, — Bitrix24-боту
+            from bitrix24_bot.main import app as bitrix24_app
+            app.mount('/', bitrix24_app)
+        return app
+
+    async def start(self):
+        """Поднимает сервер, затем регистрирует webhook в Telegram"""
+        self.settings.validate()
+        if self.settings.with_bitrix24:
+            # Mount не запускает startup-хуки вложенного приложения
+            from bitrix24_bot.main import on_startup as bitrix24_startup
+            await bitrix24_startup()
+
+        config = uvicorn.Config(
+            self.create_app(), host=self.settings.host, port=self.settings.port,
+            log_level='warning', access_log=False, lifespan='off',
+        )
+        self._server = _EmbeddedServer(config)
+        self._task = asyncio.create_task(self._server.serve(), name='telegram-webhook-server')
+        while not self._server.started:
+            if self._task.done():
+                self._task.result()  # порт занят и т.п. — пробрасываем ошибку
+                raise RuntimeError("Сервер webhook остановился при запуске")
+            await asyncio.sleep(0.05)
+
+        # Несколько реплик за балансировщиком ставят один и тот же URL — это безопасно
+        await self.application.bot.set_webhook(
+            url=self.settings.url,
+            secret_token=self.settings.secret,
+            allowed_updates=None,
+            drop_pending_updates=False,
+        )
+        logger.info(
+            f"🌐 Webhook Telegram: {self.settings.url} → "
+            f"{self.settings.host}:{self.settings.port}{self.settings.path}"
+            + (" (+ Bitrix24-бот)" if self.settings.with_bitrix24 else "")
+        )
+
+    async def stop(self):
+        # Webhook в Telegram не снимаем: другие реплики продолжают принимать апдейты
+        if self._server is not None:
+            self._server.should_exit = True
+        if self._task is not None:
+            with contextlib.suppress(Exception):
+                await self._task
+        self._server = self._task = None
@@ -0,0 +1,113 @@
+"""
+Параллельная обработка апдейтов с сохранением порядка для каждого пользователя.
+
+PTB с concurrent_updates запускает каждый апдейт отдельной задачей, и без
+дополнительных мер два нажатия одного сотрудника могут обработаться в обратном
+порядке или одновременно (гонки в user_data, ConversationHandler, заказах).
+UpdateSerializer перед обработкой берёт блокировки по ключам апдейта —
+пользователь и чат, — а затем слот общего лимита:
+
+- апдейты одного пользователя (и одного чата) идут строго по очереди —
+  asyncio.Lock будит ожидающих в порядке прихода;
+- апдейты разных пользователей обрабатываются параллельно, не больше
+  max_concurrent одновременно;
+- слот лимита занимается только после блокировок, поэтому очередь апдейтов
+  одного пользователя не занимает слоты и не тормозит остальных.
+
+Очереди живут в памяти процесса: с несколькими репликами за webhook
+порядок гарантируется только для апдейтов, попавших в одну реплику.
+
+Блокировки всегда берутся в порядке «пользователь, потом чат», поэтому
+взаимных блокировок нет. Ожидание блокировок и слота пишется в
+bot_update_lock_wait_seconds{lock="user"|"chat"|"global"}.
+
+    serializer = UpdateSerializer('telegram', max_concurrent=8)
+    async with serializer.hold(user_id, chat_id):
+        await handle(update)
+"""
+import time
+import asyncio
+from contextlib import asynccontextmanager, AsyncExitStack
+
+import metrics
+
+
+class KeyedLocks:
+    """asyncio.Lock на ключ; запись удаляется, когда блокировку никто не держит и не ждёт"""
+
+    def __init__(self):
+        self._locks = {}  # ключ -> [Lock, число держащих и ожидающих]
+
+    def __len__(self):
+        return len(self._locks)
+
+    @asynccontextmanager
+    async def hold(self, key):
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    def locked(self, key) -> bool:
+        entry = self._locks.get(key)
+        return entry is not None and entry[0].locked()
+
+
+class UpdateSerializer:
+    """Порядок апдейтов внутри пользователя и чата + общий лимит параллельности"""
+
+    def __init__(self, transport: str, max_concurrent: int):
+        self.transport = transport
+        self.max_concurrent = max(1, max_concurrent)
+        self.user_locks = KeyedLocks()
+        self.chat_locks = KeyedLocks()
+        self._slots = asyncio.Semaphore(self.max_concurrent)
+        self._wait = {
+            lock: metrics.UPDATE_LOCK_WAIT_SECONDS.labels(transport, lock)
+            for lock in ('user', 'chat', 'global')
+        }
+        self._waiting = metrics.UPDATES_IN_PROGRESS.labels(transport, 'waiting')
+        self._running = metrics.UPDATES_IN_PROGRESS.labels(transport, 'running')
+
+    async def _acquire(self, stack: AsyncExitStack, lock: str, holder):
+        started = time.perf_counter()
+        await stack.enter_async_context(holder)
+        self._wait[lock].observe(time.perf_counter() - started)
+
+    @asynccontextmanager
+    async def hold(self, user_id=None, chat_id=None):
+        """Ждёт своей очереди по user_id/chat_id (None — без блокировки) и слота лимита"""
+        self._waiting.inc()
+        waiting = True
+        try:
+            async with AsyncExitStack() as stack:
+                if user_id is not None:
+                    await self._acquire(stack, 'user', self.user_locks.hold(user_id))
+                # В личном чате chat_id совпадает с user_id — вторая блокировка не нужна
+                if chat_id is not None and chat_id != user_id:
+                    await self._acquire(stack, 'chat', self.chat_locks.hold(chat_id))
+                await self._acquire(stack, 'global', self._slots)
+                self._waiting.dec()
+                waiting = False
+                self._running.inc()
+                try:
+                    yield
+                finally:
+                    self._running.dec()
+        finally:
+            if waiting:
+                self._waiting.dec()
+
+    def snapshot(self) -> dict:
+        return {
+            'max_concurrent': self.max_concurrent,
+            'users_locked': len(self.user_locks),
+            'chats_locked': len(self.chat_locks),
+        }
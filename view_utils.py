@@ -2,26 +2,28 @@
 import logging
 from telegram import InlineKeyboardButton, Update, InlineKeyboardMarkup
 from datetime import datetime, timedelta
+from sqlalchemy import select
 
-from database import db
+from database import db, traced_operation
 from config import CONFIG
 from models import User, Order
 from handlers.common import show_main_menu
 from utils import can_modify_order
+from services.order_service import get_orders_in_range_async
 
 logger = logging.getLogger(__name__)
 
-def _can_order_for_inspector_by_bitrix_id(user_db_id: int) -> bool:
+async def _can_order_for_inspector_by_bitrix_id(user_db_id: int, session) -> bool:
     """Проверяет по bitrix_id пользователя, может ли он заказывать для инспектора"""
     try:
-        with db.get_session() as session:
-            user = session.query(User.bitrix_id).filter(User.id == user_db_id).first()
-            if user and user.bitrix_id:
-                return user.bitrix_id in CONFIG.inspector_allowed_bitrix_ids
+        bitrix_id = await session.scalar(select(User.bitrix_id).where(User.id == user_db_id))
+        if bitrix_id:
+            return bitrix_id in CONFIG.inspector_allowed_bitrix_ids
     except Exception as e:
         logger.error(f"Ошибка проверки прав инспектора: {e}")
     return False
     
+@traced_operation('refresh_day_view')
 async def refresh_day_view(query, day_offset, user_db_id, now, is_order=False):
     """
     Обновляет интерфейс меню дня с информацией о заказе.
@@ -51,18 +53,18 @@ async def refresh_day_view(query, day_offset, user_db_id, now, is_order=False):
                 f"3. 🥗 Салат: {menu['salad']}"
             )
 
-        # Проверяем заказ пользователя
-        with db.get_session() as session:
-            order = session.query(Order.quantity, Order.is_preliminary, Order.is_for_inspector).filter(
-                Order.user_id == user_db_id,
-                Order.target_date == target_date.isoformat(),
-                Order.is_cancelled == False
-            ).first()
+        # Проверяем заказ пользователя (AsyncSession — не блокирует event loop)
+        async with db.get_async_session() as session:
+            orders = await get_orders_in_range_async(user_db_id, target_date, target_date, session)
+            order = orders.get(target_date)
+            can_order_for_inspector = (
+                order is None and await _can_order_for_inspector_by_bitrix_id(user_db_id, session)
+            )
 
         # Добавляем информацию о заказе
         keyboard = []
         if order:
-            qty, is_preliminary, is_for_inspector = order
+            qty, is_preliminary, is_for_inspector = order.quantity, order.is_preliminary, order.is_for_inspector
             order_type = "Предзаказ" if is_preliminary else "Заказ"
             if is_for_inspector:
                 order_type = "🕵️ Заказ для инспектора"
@@ -76,7 +78,7 @@ async def refresh_day_view(query, day_offset, user_db_id, now, is_order=False):
         elif can_modify_order(target_date):
             keyboard.append([InlineKeyboardButton("✅ Заказать", callback_data=f"order_{day_offset}")])
             # 🔥 Кнопка для заказа инспектору (проверка по bitrix_id)
-            if _can_order_for_inspector_by_bitrix_id(user_db_id):
+            if can_order_for_inspector:
                 keyboard.append([InlineKeyboardButton("🕵️ Заказать инспектору", callback_data=f"inspector_{day_offset}")])
         else:
             response_text += "\n⏳ Приём заказов завершён"
@@ -8,22 +8,24 @@ from vkbottle import GroupEventType
 from database import db
 from config import CONFIG
 from time_config import TIME_CONFIG
-from services.order_service import create_order, cancel_order, modify_quantity, get_order_for_date
+from services.order_service import (
+    create_order_async, cancel_order_async, modify_quantity_async, get_order_for_date_async,
+)
 from services.time_service import can_modify_order
 from services.menu_service import get_menu_for_day, format_menu_text, DAYS_RU
-from services.user_service import get_verified_user, MESSENGER_VK
+from services.user_service import get_verified_user_async, MESSENGER_VK
 from vk_bot.keyboards import order_buttons, quantity_buttons
 
 logger = logging.getLogger(__name__)
 orders_labeler = BotLabeler()
 
 
-def _get_user_db_id(vk_user_id, session):
-    user = get_verified_user(vk_user_id, MESSENGER_VK, session)
+async def _get_user_db_id(vk_user_id, session):
+    user = await get_verified_user_async(vk_user_id, MESSENGER_VK, session)
     return user.id if user else None
 
 
-def _build_day_view(day_offset, user_db_id, session):
+async def _build_day_view(day_offset, user_db_id, session):
     """Build menu text and keyboard for a day. Returns (text, keyboard) or (None, None)."""
     now = datetime.now(TIME_CONFIG.TIMEZONE)
     target_date = (now + timedelta(days=day_offset)).date()
@@ -33,7 +35,7 @@ def _build_day_view(day_offset, user_db_id, session):
         return f"На {day_name} меню не предусмотрено.", None
 
     text = format_menu_text(menu, day_name, target_date)
-    order = get_order_for_date(user_db_id, target_date, session)
+    order = await get_order_for_date_async(user_db_id, target_date, session)
     has_order = order is not None
     can_mod = can_modify_order(target_date, CONFIG.are_orders_accepted_now())
 
@@ -45,7 +47,7 @@ def _build_day_view(day_offset, user_db_id, session):
 
 async def _refresh_day_view(api, peer_id, day_offset, user_db_id, session):
     """Send updated menu view as a NEW message."""
-    text, keyboard = _build_day_view(day_offset, user_db_id, session)
+    text, keyboard = await _build_day_view(day_offset, user_db_id, session)
     kwargs = {"peer_id": peer_id, "message": text, "random_id": 0}
     if keyboard:
         kwargs["keyboard"] = keyboard
@@ -54,7 +56,7 @@ async def _refresh_day_view(api, peer_id, day_offset, user_db_id, session):
 
 async def _edit_day_view(event, day_offset, user_db_id, session):
     """Edit the current message with updated menu view."""
-    text, keyboard = _build_day_view(day_offset, user_db_id, session)
+    text, keyboard = await _build_day_view(day_offset, user_db_id, session)
     if keyboard:
         await event.edit_message(text, keyboard=keyboard)
     else:
@@ -80,18 +82,18 @@ async def quick_order(message: Message):
         )
         return
 
-    with db.get_session() as session:
-        user_db_id = _get_user_db_id(user_id, session)
+    async with db.get_async_session() as session:
+        user_db_id = await _get_user_db_id(user_id, session)
         if not user_db_id:
             await message.answer("❌ Вы не зарегистрированы. Напишите /start")
             return
 
-        order, error = create_order(user_db_id, target_date, session)
+        order, error = await create_order_async(user_db_id, target_date, session)
         if error:
             await message.answer(f"ℹ️ {error}")
             return
 
-        session.commit()
+        await session.commit()
         await message.answer("✅ Заказ на сегодня оформлен (1 порция)")
         await _refresh_day_view(message.ctx_api, message.peer_id, 0, user_db_id, session)
 
@@ -130,18 +132,18 @@ async def on_order_callback(event: MessageEvent):
             await event.show_snackbar(f"Приём заказов завершён в {TIME_CONFIG.ORDER_DEADLINE.strftime('%H:%M')}")
             return
 
-        with db.get_session() as session:
-            user_db_id = _get_user_db_id(user_id, session)
+        async with db.get_async_session() as session:
+            user_db_id = await _get_user_db_id(user_id, session)
             if not user_db_id:
                 await event.show_snackbar("Вы не зарегистрированы")
                 return
 
-            order, error = create_order(user_db_id, target_date, session, is_preliminary=(day_offset > 0))
+            order, error = await create_order_async(user_db_id, target_date, session, is_preliminary=(day_offset > 0))
             if error:
                 await event.show_snackbar(error[:90])
                 return
 
-            session.commit()
+            await session.commit()
             await event.show_snackbar("✅ Заказ оформлен")
             await _edit_day_view(event, day_offset, user_db_id, session)
         return
@@ -152,12 +154,12 @@ async def on_order_callback(event: MessageEvent):
             await event.show_snackbar(f"Изменение невозможно после {TIME_CONFIG.MODIFICATION_DEADLINE.strftime('%H:%M')}")
             return
 
-        with db.get_session() as session:
-            user_db_id = _get_user_db_id(user_id, session)
+        async with db.get_async_session() as session:
+            user_db_id = await _get_user_db_id(user_id, session)
             if not user_db_id:
                 return
 
-            order = get_order_for_date(user_db_id, target_date, session)
+            order = await get_order_for_date_async(user_db_id, target_date, session)
             if not order:
                 await event.show_snackbar("Заказ не найден")
                 return
@@ -182,12 +184,12 @@ async def on_order_callback(event: MessageEvent):
             await event.show_snackbar(f"Изменение невозможно после {TIME_CONFIG.MODIFICATION_DEADLINE.strftime('%H:%M')}")
             return
 
-        with db.get_session() as session:
-            user_db_id = _get_user_db_id(user_id, session)
+        async with db.get_async_session() as session:
+            user_db_id = await _get_user_db_id(user_id, session)
             if not user_db_id:
                 return
 
-            new_qty, order, error = modify_quantity(user_db_id, target_date, delta, session)
+            new_qty, order, error = await modify_quantity_async(user_db_id, target_date, delta, session)
 
             if error:
                 await event.show_snackbar(error[:90])
@@ -196,12 +198,12 @@ async def on_order_callback(event: MessageEvent):
             if new_qty == 0:
                 order.is_cancelled = True
                 order.order_time = now.strftime("%H:%M:%S")
-                session.commit()
+                await session.commit()
                 await event.show_snackbar("✅ Заказ отменён")
                 await _edit_day_view(event, day_offset, user_db_id, session)
                 return
 
-            session.commit()
+            await session.commit()
             await event.show_snackbar(f"Установлено: {new_qty} порции")
 
             day_name = DAYS_RU[target_date.weekday()]
@@ -218,17 +220,17 @@ async def on_order_callback(event: MessageEvent):
             await event.show_snackbar(f"Отмена невозможна после {TIME_CONFIG.MODIFICATION_DEADLINE.strftime('%H:%M')}")
             return
 
-        with db.get_session() as session:
-            user_db_id = _get_user_db_id(user_id, session)
+        async with db.get_async_session() as session:
+            user_db_id = await _get_user_db_id(user_id, session)
             if not user_db_id:
                 return
 
-            order, error = cancel_order(user_db_id, target_date, session)
+            order, error = await cancel_order_async(user_db_id, target_date, session)
             if error:
                 await event.show_snackbar(error[:90])
                 return
 
-            session.commit()
+            await session.commit()
 
             try:
                 from bitrix.sync import BitrixSync
@@ -243,8 +245,8 @@ async def on_order_callback(event: MessageEvent):
 
     # --- CONFIRM ---
     if cmd == "confirm":
-        with db.get_session() as session:
-            user_db_id = _get_user_db_id(user_id, session)
+        async with db.get_async_session() as session:
+            user_db_id = await _get_user_db_id(user_id, session)
             if not user_db_id:
                 return
             await _edit_day_view(event, day_offset, user_db_id, session)
@@ -266,17 +268,17 @@ async def on_order_callback(event: MessageEvent):
             await event.show_snackbar(f"Отмена невозможна после {TIME_CONFIG.MODIFICATION_DEADLINE.strftime('%H:%M')}")
             return
 
-        with db.get_session() as session:
-            user_db_id = _get_user_db_id(user_id, session)
+        async with db.get_async_session() as session:
+            user_db_id = await _get_user_db_id(user_id, session)
             if not user_db_id:
                 return
 
-            order, error = cancel_order(user_db_id, target_date, session)
+            order, error = await cancel_order_async(user_db_id, target_date, session)
             if error:
                 await event.show_snackbar(error[:90])
                 return
 
-            session.commit()
+            await session.commit()
             await event.show_snackbar("✅ Заказ отменён")
             await event.edit_message("✅ Заказ отменён")
         return
@@ -8,7 +8,7 @@ from vkbottle.tools import DocMessagesUploader
 
 from database import db
 from config import CONFIG
-from services.user_service import get_user_role, MESSENGER_VK
+from services.user_service import get_user_role_async, MESSENGER_VK
 from services.report_service import (
     generate_provider_report_text,
     generate_accounting_report_file,
@@ -24,7 +24,7 @@ reports_labeler = BotLabeler()
 async def daily_report(message: Message):
     """Generate and send daily report."""
     user_id = message.from_id
-    role = get_user_role(user_id, MESSENGER_VK, CONFIG)
+    role = await get_user_role_async(user_id, MESSENGER_VK, CONFIG)
 
     if role not in ('admin', 'provider', 'accountant'):
         await message.answer("❌ У вас нет прав для просмотра отчетов.")
@@ -54,7 +54,7 @@ async def daily_report(message: Message):
 async def monthly_report_menu(message: Message):
     """Show month selection."""
     user_id = message.from_id
-    role = get_user_role(user_id, MESSENGER_VK, CONFIG)
+    role = await get_user_role_async(user_id, MESSENGER_VK, CONFIG)
 
     if role not in ('admin', 'provider', 'accountant'):
         await message.answer("❌ У вас нет прав для просмотра отчетов.")
@@ -78,7 +78,7 @@ async def on_report_callback(event: MessageEvent):
     user_id = event.object.peer_id
 
     if cmd == "month":
-        role = get_user_role(user_id, MESSENGER_VK, CONFIG)
+        role = await get_user_role_async(user_id, MESSENGER_VK, CONFIG)
         if role not in ('admin', 'provider', 'accountant'):
             await event.show_snackbar("Нет прав")
             return
@@ -121,7 +121,7 @@ async def on_report_callback(event: MessageEvent):
         return
 
     if cmd == "report":
-        role = get_user_role(user_id, MESSENGER_VK, CONFIG)
+        role = await get_user_role_async(user_id, MESSENGER_VK, CONFIG)
         if role != 'admin':
             await event.show_snackbar("Нет прав")
             return
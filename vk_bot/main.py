@@ -2,6 +2,7 @@
 VK messenger bot entry point.
 Shares the same PostgreSQL database and business logic with the Telegram bot.
 """
+import functools
 import logging
 import os
 import sys
@@ -10,6 +11,10 @@ from pathlib import Path
 # Add project root to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+# Startup profiling (--profile-startup / PROFILE_STARTUP=1) must start before heavy imports
+import startup_profiler
+startup_profiler.enable_from_argv('vk')
+
 from logging.handlers import RotatingFileHandler
 
 
@@ -57,6 +62,12 @@ def main():
         except Exception as e:
             logger.warning(f"Migration check: {e}")
 
+        # Partial unique index behind ON CONFLICT in order_service
+        from migrate_add_order_unique_index import run_migration as migrate_order_index
+        if not migrate_order_index():
+            logger.error("Индекс uq_orders_user_date_active не создан — заказы не будут работать")
+            sys.exit(1)
+
         token = os.getenv('VK_BOT_TOKEN')
         if not token:
             logger.error("VK_BOT_TOKEN not set in environment")
@@ -71,7 +82,29 @@ def main():
             def restore_server_ts(self, server):
                 return server
 
+        import metrics
+
+        def scoped_dispatch(view):
+            """Run every event handled by the view inside its own DB session scope.
+
+            Wrapping handle_event gives a real ``with`` block around the whole
+            dispatch (middlewares and handlers), so the session and its ContextVar
+            are released even when a handler raises or a middleware stops the event.
+            """
+            handle_event = view.handle_event
+
+            @functools.wraps(handle_event)
+            async def handle_event_scoped(event, *args, **kwargs):
+                label = metrics.vk_handler_label(event)
+                with metrics.track_handler("vk", label), db.request_scope(f"vk:{label}"):
+                    await handle_event(event, *args, **kwargs)
+                startup_profiler.mark_first_update()
+
+            view.handle_event = handle_event_scoped
+
         labeler = BotLabeler()
+        scoped_dispatch(labeler.message_view)
+        scoped_dispatch(labeler.raw_event_view)
         state_dispenser = BuiltinStateDispenser()
 
         # Share state_dispenser with handlers via vk_bot package
@@ -84,7 +117,27 @@ def main():
 
         global bot
         bot = Bot(token=token, labeler=labeler, state_dispenser=state_dispenser, polling=NoopPolling())
+        metrics.instrument_vk_api(bot.api)
+
+        # Config changes made by the other bots (LISTEN config_changed)
+        from config_notify import start_config_listener
+        start_config_listener()
+
+        # /metrics and /health on a side HTTP server (VK_METRICS_PORT)
+        metrics.start_metrics_server("vk")
+
+        # The loop only exists inside run_forever: register it for /health and
+        # start the event-loop watchdog (bot_event_loop_*) from there
+        async def on_loop_started():
+            import asyncio
+            import health
+            import loop_watchdog
+            health.register_loop(asyncio.get_running_loop())
+            loop_watchdog.start("vk")
+
+        bot.loop_wrapper.on_startup.append(on_loop_started())
 
+        startup_profiler.checkpoint('vk setup')
         logger.info("=== VK bot starting ===")
         bot.run_forever()
 
@@ -6,6 +6,8 @@ import os
 import logging
 import random
 
+import metrics
+
 logger = logging.getLogger(__name__)
 
 _vk_api = None
@@ -24,7 +26,7 @@ def get_vk_api():
 
     try:
         from vkbottle import API
-        _vk_api = API(token=token)
+        _vk_api = metrics.instrument_vk_api(API(token=token))
         logger.info("VK API client initialized for notifications")
         return _vk_api
     except ImportError:
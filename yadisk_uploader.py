@@ -0,0 +1,252 @@
+"""
+Асинхронная загрузка бекапов на Яндекс.Диск через REST API.
+
+- файл отправляется частями (PUT с Content-Range), event loop не блокируется;
+- после обрыва загрузка продолжается с последней подтверждённой части,
+  прогресс переживает и перезапуск процесса (<файл>.upload.json);
+- скорость ограничивается YANDEX_UPLOAD_MAX_KBPS;
+- после загрузки md5/sha256 на Диске сверяются с локальными, и только
+  затем временный файл переименовывается в целевой — старый бекап не
+  удаляется, пока новый не проверен.
+
+Для локальной проверки: python fake_yadisk_server.py и
+YANDEX_DISK_API_URL=http://127.0.0.1:8765/v1/disk
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from pathlib import Path
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_API_URL = 'https://cloud-api.yandex.net/v1/disk'
+
+
+class UploadError(Exception):
+    """Загрузка не удалась после всех попыток"""
+
+
+class _RangeNotSupported(Exception):
+    """Сервер загрузки не принял PUT с Content-Range"""
+
+
+class _UploadExpired(Exception):
+    """Ссылка на загрузку устарела — нужна новая"""
+
+
+class YandexDiskUploader:
+    """Загрузчик файлов на Яндекс.Диск с докачкой, лимитом скорости и проверкой хеша"""
+
+    def __init__(self, token: str, api_url: Optional[str] = None,
+                 chunk_size: Optional[int] = None, max_kbps: Optional[int] = None,
+                 max_retries: int = 5, timeout: float = 60.0):
+        self.token = token
+        self.api_url = (api_url or os.getenv('YANDEX_DISK_API_URL', DEFAULT_API_URL)).rstrip('/')
+        self.chunk_size = chunk_size or int(os.getenv('YANDEX_UPLOAD_CHUNK_MB', '8')) * 1024 * 1024
+        # 0 — без ограничения
+        self.max_kbps = max_kbps if max_kbps is not None else int(os.getenv('YANDEX_UPLOAD_MAX_KBPS', '0'))
+        self.max_retries = max_retries
+        self.timeout = timeout
+
+    # ---------- вспомогательное ----------
+
+    @staticmethod
+    def file_hashes(file_path: Path) -> dict:
+        """md5 и sha256 файла (оба отдаёт Яндекс.Диск в метаданных)"""
+        md5 = hashlib.md5()
+        sha256 = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                md5.update(block)
+                sha256.update(block)
+        return {'md5': md5.hexdigest(), 'sha256': sha256.hexdigest()}
+
+    @staticmethod
+    def _state_path(file_path: Path) -> Path:
+        return file_path.with_name(file_path.name + '.upload.json')
+
+    def _load_state(self, file_path: Path, remote_path: str, hashes: dict) -> Optional[dict]:
+        try:
+            state = json.loads(self._state_path(file_path).read_text(encoding='utf-8'))
+        except (FileNotFoundError, ValueError):
+            return None
+        # Докачиваем только тот же файл в то же место
+        if state.get('remote_path') != remote_path or state.get('sha256') != hashes['sha256']:
+            return None
+        return state
+
+    def _save_state(self, file_path: Path, state: dict):
+        self._state_path(file_path).write_text(json.dumps(state), encoding='utf-8')
+
+    def _clear_state(self, file_path: Path):
+        self._state_path(file_path).unlink(missing_ok=True)
+
+    async def _throttled_body(self, f, start: int, length: int):
+        """Отдаёт байты части блоками по 64 КБ, не превышая max_kbps"""
+        f.seek(start)
+        sent = 0
+        started = time.monotonic()
+        rate = self.max_kbps * 1024
+        while sent < length:
+            block = await asyncio.to_thread(f.read, min(64 * 1024, length - sent))
+            if not block:
+                break
+            sent += len(block)
+            yield block
+            if rate:
+                ahead = sent / rate - (time.monotonic() - started)
+                if ahead > 0:
+                    await asyncio.sleep(ahead)
+
+    async def _api(self, client: httpx.AsyncClient, method: str, resource: str, **params) -> httpx.Response:
+        return await client.request(
+            method, f"{self.api_url}{resource}",
+            params=params,
+            headers={'Authorization': f'OAuth {self.token}'},
+        )
+
+    # ---------- шаги загрузки ----------
+
+    async def ensure_folder(self, client: httpx.AsyncClient, folder: str):
+        response = await self._api(client, 'PUT', '/resources', path=folder)
+        # 409 — папка уже есть
+        if response.status_code not in (201, 409):
+            response.raise_for_status()
+
+    async def _get_upload_href(self, client: httpx.AsyncClient, remote_path: str) -> str:
+        response = await self._api(client, 'GET', '/resources/upload', path=remote_path, overwrite='true')
+        response.raise_for_status()
+        return response.json()['href']
+
+    async def _put_chunk(self, client: httpx.AsyncClient, href: str, f, offset: int, total: int):
+        length = min(self.chunk_size, total - offset)
+        headers = {
+            'Content-Length': str(length),
+            'Content-Range': f'bytes {offset}-{offset + length - 1}/{total}',
+        }
+        response = await client.put(href, content=self._throttled_body(f, offset, length), headers=headers)
+        if response.status_code in (404, 410):
+            raise _UploadExpired(f"HTTP {response.status_code}")
+        if offset == 0 and length < total and response.status_code in (400, 411, 416, 501):
+            raise _RangeNotSupported()
+        response.raise_for_status()
+        return offset + length
+
+    async def _put_whole(self, client: httpx.AsyncClient, href: str, f, total: int):
+        response = await client.put(
+            href, content=self._throttled_body(f, 0, total), headers={'Content-Length': str(total)}
+        )
+        if response.status_code in (404, 410):
+            raise _UploadExpired(f"HTTP {response.status_code}")
+        response.raise_for_status()
+
+    async def _verify(self, client: httpx.AsyncClient, remote_path: str, total: int, hashes: dict):
+        """Сверяет размер и хеши загруженного файла с локальными"""
+        # Диск считает хеши асинхронно — даём ему немного времени
+        for attempt in range(5):
+            response = await self._api(client, 'GET', '/resources', path=remote_path, fields='size,md5,sha256')
+            response.raise_for_status()
+            meta = response.json()
+            if meta.get('sha256') or meta.get('md5'):
+                break
+            await asyncio.sleep(2 ** attempt)
+
+        if meta.get('size') != total:
+            raise UploadError(f"Размер на Диске {meta.get('size')} ≠ локальному {total}")
+        for algo in ('sha256', 'md5'):
+            if meta.get(algo) and meta[algo] != hashes[algo]:
+                raise UploadError(f"{algo} на Диске не совпадает с локальным")
+        if not (meta.get('sha256') or meta.get('md5')):
+            raise UploadError("Диск не вернул контрольную сумму файла")
+
+    async def _move(self, client: httpx.AsyncClient, src: str, dst: str):
+        response = await self._api(client, 'POST', '/resources/move', **{'from': src, 'path': dst, 'overwrite': 'true'})
+        if response.status_code not in (201, 202):
+            response.raise_for_status()
+
+    # ---------- публичный интерфейс ----------
+
+    async def upload(self, file_path: Path, folder: str, remote_name: str) -> str:
+        """Загружает file_path в folder/remote_name. Возвращает путь на Диске.
+
+        Файл сначала пишется в remote_name.part, проверяется по хешу и только
+        потом переименовывается поверх существующего.
+        """
+        remote_path = f"{folder}/{remote_name}"
+        part_path = f"{remote_path}.part"
+        total = file_path.stat().st_size
+        hashes = await asyncio.to_thread(self.file_hashes, file_path)
+
+        state = self._load_state(file_path, part_path, hashes) or {
+            'remote_path': part_path, 'sha256': hashes['sha256'], 'href': None, 'offset': 0, 'ranged': True,
+        }
+        if state['offset']:
+            logger.info(f"☁️ Продолжаем загрузку {remote_name} с {state['offset'] / 1024 / 1024:.1f} МБ")
+
+        started = time.monotonic()
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            await self.ensure_folder(client, folder)
+
+            attempt = 0
+            while True:
+                try:
+                    if not state['href']:
+                        state['href'] = await self._get_upload_href(client, part_path)
+                        state['offset'] = 0
+                        self._save_state(file_path, state)
+
+                    with open(file_path, 'rb') as f:
+                        if state['ranged'] and total > self.chunk_size:
+                            while state['offset'] < total:
+                                state['offset'] = await self._put_chunk(client, state['href'], f, state['offset'], total)
+                                self._save_state(file_path, state)
+                                attempt = 0  # лимит повторов — на обрывы подряд, а не на весь файл
+                        else:
+                            await self._put_whole(client, state['href'], f, total)
+                            state['offset'] = total
+                    break
+
+                except _RangeNotSupported:
+                    logger.info("☁️ Сервер не поддерживает Content-Range — загружаем файл целиком")
+                    state.update(ranged=False)
+                except _UploadExpired as e:
+                    # Постоянный 404/410 не должен крутить цикл без конца — считаем как обрыв
+                    attempt += 1
+                    if attempt > self.max_retries:
+                        raise UploadError(f"Загрузка {remote_name} не удалась: ссылка отклоняется ({e})") from e
+                    delay = min(2 ** attempt, 60)
+                    logger.info(
+                        f"☁️ Ссылка на загрузку устарела — запрашиваем новую, "
+                        f"повтор {attempt}/{self.max_retries} через {delay} с"
+                    )
+                    state.update(href=None, offset=0)
+                    await asyncio.sleep(delay)
+                except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                    attempt += 1
+                    if attempt > self.max_retries:
+                        raise UploadError(f"Загрузка {remote_name} не удалась: {e}") from e
+                    delay = min(2 ** attempt, 60)
+                    logger.warning(
+                        f"⚠️ Обрыв загрузки {remote_name} на {state['offset'] / 1024 / 1024:.1f} МБ "
+                        f"({e}), повтор {attempt}/{self.max_retries} через {delay} с"
+                    )
+                    if not state['ranged']:
+                        state['offset'] = 0
+                    await asyncio.sleep(delay)
+
+            await self._verify(client, part_path, total, hashes)
+            await self._move(client, part_path, remote_path)
+
+        self._clear_state(file_path)
+        elapsed = time.monotonic() - started
+        logger.info(
+            f"✅ Загружено {total / 1024 / 1024:.2f} МБ за {elapsed:.1f} с, "
+            f"sha256 совпадает: {remote_path}"
+        )
+        return remote_path